@@ -1,12 +1,13 @@
 import shutil, asyncio
 from pathlib import Path
 from datetime import date
-from typing import List, Optional
+from typing import Callable, List, Optional
 
 from sqlalchemy import select, delete
 from sqlalchemy.orm import selectinload
 
 from .models import async_session, StorageCell, CellStorage
+from .outbox import enqueue_notifications
 
 
 async def get_cells() -> List[StorageCell]:
@@ -80,9 +81,13 @@ async def save_or_update_cell_storage(
     scheduled_month: date,
     meta_data: dict,
     action_type: str = "handover",  # handover (сдача) или pickup (получение)
-    confirmation_status: str = "pending"
+    confirmation_status: str = "pending",
+    notifications: Callable[[CellStorage], list[dict]] | None = None
 ) -> CellStorage:
-    """Обновляет или создает запись в cell_storages"""
+    """
+    Обновляет или создает запись в cell_storages.
+    notifications строит уведомления по сохранённой записи (нужен её id) — они пишутся в outbox той же транзакцией.
+    """
     async with async_session() as session:
         # Проверяем, есть ли уже запись для этой ячейки
         stmt = select(CellStorage).where(CellStorage.cell_id == cell_id)
@@ -115,7 +120,11 @@ async def save_or_update_cell_storage(
                 confirmation_status=confirmation_status
             )
             session.add(cell_storage)
-        
+
+        if notifications:
+            await session.flush()
+            enqueue_notifications(session, notifications(cell_storage))
+
         await session.commit()
         await session.refresh(cell_storage)
         return cell_storage
@@ -160,8 +169,8 @@ async def update_scheduled_month(cell_id: int, new_month: date) -> bool:
         return False
 
 
-async def update_confirmation_status(cell_storage_id: int, status: str) -> bool:
-    """Обновляет статус подтверждения"""
+async def update_confirmation_status(cell_storage_id: int, status: str, notifications: list[dict] | None = None) -> bool:
+    """Обновляет статус подтверждения; уведомления пишутся в outbox той же транзакцией"""
     async with async_session() as session:
         stmt = select(CellStorage).where(CellStorage.id == cell_storage_id)
         result = await session.execute(stmt)
@@ -169,6 +178,7 @@ async def update_confirmation_status(cell_storage_id: int, status: str) -> bool:
         
         if cell_storage:
             cell_storage.confirmation_status = status
+            enqueue_notifications(session, notifications or [])
             await session.commit()
             return True
         return False
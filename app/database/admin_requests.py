@@ -1,69 +1,48 @@
 from app.database.models import async_session, Promotion
 from app.database.models import User, UserBonusBalance, PurchaseHistory, BonusSystem, RoleHistory, Review, VipClient
-from sqlalchemy import select, func, distinct, update, or_, delete
+from sqlalchemy import select, func, update, or_, and_, delete, Select, literal_column
 from sqlalchemy.orm import selectinload
 from datetime import datetime, timedelta
 
 from app.database.requests import get_promo_by_id
+from app.database.rollup import get_period_totals
+from app.utils.cache import invalidate_role, bonus_settings_cache
 
 
 async def get_statistics(period: str = "all"):
     async with async_session() as session:
         if period == "day":
             start_date = datetime.now() - timedelta(days=1)
-            period_filter = PurchaseHistory.transaction_date >= start_date
             period_label = "за последний день"
         elif period == "week":
             start_date = datetime.now() - timedelta(weeks=1)
-            period_filter = PurchaseHistory.transaction_date >= start_date
             period_label = "за последнюю неделю"
         elif period == "month":
             start_date = datetime.now() - timedelta(days=30)
-            period_filter = PurchaseHistory.transaction_date >= start_date
             period_label = "за последний месяц"
         else:
-            period_filter = True
+            start_date = None
             period_label = "за всё время"
 
-        # Подсчёт общего количества пользователей
-        total_users_query = select(func.count(User.user_id))
-        total_users = (await session.execute(total_users_query)).scalar() or 0
+        # Итоги за период собираются из daily_rollup (O(дней)), количество пользователей
+        # и сумма балансов — одним запросом со скалярными подзапросами
+        totals = await get_period_totals(session, start=start_date)
 
-        # Подсчёт общей суммы покупок
-        total_amount_query = select(func.sum(PurchaseHistory.amount)).where(period_filter)
-        total_amount = (await session.execute(total_amount_query)).scalar() or 0.0
-
-        # Подсчёт общей суммы выданных бонусов
-        total_bonus_amount_query = select(func.sum(PurchaseHistory.bonus_amount)).where(
-            PurchaseHistory.transaction_type == "Пополнение",
-            period_filter
+        users_query = select(
+            select(func.count(User.user_id)).scalar_subquery().label("total_users"),
+            select(func.sum(UserBonusBalance.balance)).scalar_subquery().label("total_bonus_balance"),
         )
-        total_bonus_amount = (await session.execute(total_bonus_amount_query)).scalar() or 0.0
-
-        # Подсчёт общего количества транзакций
-        total_transactions_query = select(func.count(PurchaseHistory.id)).where(period_filter)
-        total_transactions = (await session.execute(total_transactions_query)).scalar() or 0
-
-        # Подсчёт средней суммы покупки
-        average_purchase_amount_query = select(func.avg(PurchaseHistory.amount)).where(period_filter)
-        average_purchase_amount = (await session.execute(average_purchase_amount_query)).scalar() or 0.0
-
-        # Подсчёт количества активных пользователей
-        active_users_query = select(func.count(distinct(PurchaseHistory.user_id))).where(period_filter)
-        active_users = (await session.execute(active_users_query)).scalar() or 0
-
-        # Подсчёт общей суммы бонусов на балансах
-        total_bonus_balance_query = select(func.sum(UserBonusBalance.balance))
-        total_bonus_balance = (await session.execute(total_bonus_balance_query)).scalar() or 0.0
+        users_row = (await session.execute(users_query)).one()
 
         return {
-            "total_users": total_users,
-            "total_amount": total_amount,
-            "total_bonus_amount": total_bonus_amount,
-            "total_transactions": total_transactions,
-            "average_purchase_amount": average_purchase_amount,
-            "active_users": active_users,
-            "total_bonus_balance": total_bonus_balance,
+            "total_users": users_row.total_users or 0,
+            "total_amount": totals["amount"],
+            "total_bonus_amount": totals["bonus_added"],
+            "total_transactions": totals["transactions"],
+            "average_purchase_amount": totals["amount"] / totals["transactions"] if totals["transactions"] else 0.0,
+            "active_users": totals["active_users"],
+            "active_users_approximate": totals["active_users_approximate"],
+            "total_bonus_balance": users_row.total_bonus_balance or 0.0,
             "period_label": period_label,
         }
 
@@ -91,6 +70,8 @@ async def set_bonus_system_settings(amount: int, setting_type: str):
 
         await session.commit()
 
+    await bonus_settings_cache.bump()
+
 
 async def change_user_role(user_id, new_role) -> bool:
     async with async_session() as session:
@@ -109,7 +90,8 @@ async def change_user_role(user_id, new_role) -> bool:
         await session.execute(update_query)
         await session.commit()
 
-        return True
+    await invalidate_role(user_id)
+    return True
 
 
 async def add_role_history(admin_id, user_id, role):
@@ -141,18 +123,15 @@ async def get_worker_statistics(worker_id, period: str = "all"):
     async with async_session() as session:
         if period == "day":
             start_date = datetime.now() - timedelta(days=1)
-            period_filter = PurchaseHistory.transaction_date >= start_date
             period_label = "за последний день"
         elif period == "week":
             start_date = datetime.now() - timedelta(weeks=1)
-            period_filter = PurchaseHistory.transaction_date >= start_date
             period_label = "за последнюю неделю"
         elif period == "month":
             start_date = datetime.now() - timedelta(days=30)
-            period_filter = PurchaseHistory.transaction_date >= start_date
             period_label = "за последний месяц"
         else:
-            period_filter = True
+            start_date = None
             period_label = "за всё время"
 
         # Получаем информацию о работнике
@@ -171,35 +150,7 @@ async def get_worker_statistics(worker_id, period: str = "all"):
         )
         role_assigned_date = (await session.execute(role_query)).scalar() or "Неизвестно"
 
-        # Подсчёт количества транзакций
-        total_transactions_query = select(func.count(PurchaseHistory.id)).where(
-            PurchaseHistory.worker_id == worker_id,
-            period_filter
-        )
-        total_transactions = (await session.execute(total_transactions_query)).scalar() or 0
-
-        # Подсчёт общей суммы всех операций
-        total_amount_query = select(func.sum(PurchaseHistory.amount)).where(
-            PurchaseHistory.worker_id == worker_id,
-            period_filter
-        )
-        total_amount = (await session.execute(total_amount_query)).scalar() or 0.0
-
-        # Подсчёт суммы зачисления бонусов
-        total_add_query = select(func.sum(PurchaseHistory.bonus_amount)).where(
-            PurchaseHistory.worker_id == worker_id,
-            PurchaseHistory.transaction_type == "Пополнение",
-            period_filter
-        )
-        total_add = (await session.execute(total_add_query)).scalar() or 0.0
-
-        # Подсчёт суммы списания бонусов
-        total_remove_query = select(func.sum(PurchaseHistory.bonus_amount)).where(
-            PurchaseHistory.worker_id == worker_id,
-            PurchaseHistory.transaction_type == "Списание",
-            period_filter
-        )
-        total_remove = (await session.execute(total_remove_query)).scalar() or 0.0
+        totals = await get_period_totals(session, start=start_date, worker_id=worker_id)
 
         # Подсчёт количества оценок
         total_ratings_query = select(func.count(Review.id)).where(Review.worker_id == worker_id)
@@ -209,24 +160,29 @@ async def get_worker_statistics(worker_id, period: str = "all"):
             "name": worker.name,
             "user_id": worker.user_id,
             "role_assigned_date": role_assigned_date,
-            "total_transactions": total_transactions,
-            "total_amount": total_amount,
-            "total_add": total_add,
-            "total_remove": total_remove,
+            "total_transactions": totals["transactions"],
+            "total_amount": totals["amount"],
+            "total_add": totals["bonus_added"],
+            "total_remove": totals["bonus_spent"],
             "total_ratings": total_ratings,
             "period_label": period_label,
         }
 
 
+def balance_bucket_filter(balance_input):
+    if balance_input == 1000:
+        return UserBonusBalance.balance.between(1000, 5000)
+    elif balance_input == 5000:
+        return UserBonusBalance.balance.between(5001, 10000)
+    elif balance_input == 10000:
+        return UserBonusBalance.balance > 10000
+    return None
+
+
 async def get_users_by_balance(balance_input):
     async with async_session() as session:
-        if balance_input == 1000:
-            balance_filter = UserBonusBalance.balance.between(1000, 5000)
-        elif balance_input == 5000:
-            balance_filter = UserBonusBalance.balance.between(5001, 10000)
-        elif balance_input == 10000:
-            balance_filter = UserBonusBalance.balance > 10000
-        else:
+        balance_filter = balance_bucket_filter(balance_input)
+        if balance_filter is None:
             return {}
 
         query = select(User).join(UserBonusBalance).where(balance_filter).options(selectinload(User.bonus_balance))
@@ -278,12 +234,59 @@ async def get_worker_reviews(worker_id: str) -> list[dict]:
         ]
 
 
+# Аудитории рассылок: в FSM хранится только описание {"audience", "segment", "value"},
+# получатели выбираются запросом при отправке
+MAILING_AUDIENCES = {
+    "mailing": ('Пользователь', 'Работник'),
+    "users": ('Пользователь',),
+}
+
+# Совпадает с выражением индекса ix_users_birthday_month — иначе SQLite его не использует
+BIRTHDAY_MONTH = func.strftime(literal_column("'%m'"), User.birthday_date)
+
+
+def mailing_segment_filter(segment: str, value=None):
+    """
+    SQL-условие сегмента аудитории. Каждое опирается на индекс, поэтому подсчёт аудитории
+    не сканирует таблицы целиком. None — сегмент «все».
+    """
+    if segment == "balance":
+        return User.user_id.in_(select(UserBonusBalance.user_id).where(balance_bucket_filter(int(value))))
+    if segment == "purchase_days":
+        since = datetime.now() - timedelta(days=int(value))
+        return User.user_id.in_(select(PurchaseHistory.user_id).where(PurchaseHistory.transaction_date >= since))
+    if segment == "vip":
+        return User.id.in_(select(VipClient.user_id))
+    if segment == "cohort":
+        start = datetime.strptime(value, "%Y-%m")
+        end = (start + timedelta(days=32)).replace(day=1)
+        return and_(User.registration_date >= start, User.registration_date < end)
+    if segment == "birthday_month":
+        return BIRTHDAY_MONTH == f"{int(value):02d}"
+    return None
+
+
+def mailing_audience_query(descriptor: dict) -> Select:
+    """SELECT user_id получателей рассылки по её описанию."""
+    roles = MAILING_AUDIENCES[descriptor.get("audience", "mailing")]
+    query = select(User.user_id).where(User.role.in_(roles), User.bot_blocked_at.is_(None))
+
+    segment_filter = mailing_segment_filter(descriptor.get("segment", "all"), descriptor.get("value"))
+    if segment_filter is not None:
+        query = query.where(segment_filter)
+    return query
+
+
+async def count_mailing_audience(descriptor: dict) -> int:
+    async with async_session() as session:
+        return await session.scalar(
+            select(func.count()).select_from(mailing_audience_query(descriptor).subquery())
+        ) or 0
+
+
 async def get_tg_id_mailing():
     async with async_session() as session:
-        users = await session.scalars(
-            select(User.user_id)
-            .where(or_(User.role == 'Пользователь', User.role == 'Работник'))
-        )
+        users = await session.scalars(mailing_audience_query({"audience": "mailing"}))
         result = users.all()
 
         return result
@@ -293,7 +296,7 @@ async def get_tg_id_users():
     async with async_session() as session:
         users = await session.scalars(
             select(User.user_id)
-            .where(User.role == 'Пользователь')
+            .where(User.role == 'Пользователь', User.bot_blocked_at.is_(None))
         )
         result = users.all()
 
@@ -408,4 +411,4 @@ async def delete_promotion(promo_id):
             return result.rowcount > 0
         except Exception as e:
             await session.rollback()
-            return False
\ No newline at end of file
+            return False
@@ -0,0 +1,144 @@
+from datetime import datetime
+
+from sqlalchemy import select, update, insert, func, literal, cast, String, Select
+
+from .models import async_session, BroadcastJob, BroadcastRecipient
+from .suppression import suppress_chats
+
+
+async def create_broadcast_job(
+    admin_chat_id,
+    text: str,
+    photo: str | None,
+    recipients: Select,
+    media: list[str] | None = None
+) -> BroadcastJob:
+    """
+    Сохраняет рассылку и её получателей в статусе pending — с этого момента она переживает перезапуск.
+    recipients — SELECT одной колонки с chat_id; получатели переносятся одним INSERT ... SELECT внутри БД.
+    """
+    async with async_session() as session:
+        job = BroadcastJob(
+            admin_chat_id=str(admin_chat_id),
+            text=text,
+            photo=photo,
+            media=media,
+            status="running",
+            total=0,
+            created_at=datetime.now(),
+        )
+        session.add(job)
+        await session.flush()
+
+        source = recipients.subquery()
+        result = await session.execute(
+            insert(BroadcastRecipient).from_select(
+                ["job_id", "chat_id", "status"],
+                select(literal(job.id), cast(source.c[0], String), literal("pending"))
+            )
+        )
+        job.total = result.rowcount
+
+        await session.commit()
+        return job
+
+
+async def get_broadcast_job(job_id: int) -> BroadcastJob | None:
+    async with async_session() as session:
+        return await session.get(BroadcastJob, job_id)
+
+
+async def set_broadcast_status_message(job_id: int, message_id: int) -> None:
+    async with async_session() as session:
+        await session.execute(
+            update(BroadcastJob).where(BroadcastJob.id == job_id).values(status_message_id=message_id)
+        )
+        await session.commit()
+
+
+async def set_broadcast_job_status(
+    job_id: int,
+    status: str,
+    allowed_from: tuple[str, ...],
+    last_error: str | None = None
+) -> bool:
+    """
+    Меняет статус рассылки, только если текущий входит в allowed_from. Возвращает True, если статус изменён.
+    last_error — причина остановки; любая другая смена статуса её сбрасывает.
+    """
+    values = {"status": status, "last_error": last_error}
+    if status in ("cancelled", "done"):
+        values["finished_at"] = datetime.now()
+
+    async with async_session() as session:
+        result = await session.execute(
+            update(BroadcastJob)
+            .where(BroadcastJob.id == job_id, BroadcastJob.status.in_(allowed_from))
+            .values(**values)
+        )
+        await session.commit()
+        return result.rowcount > 0
+
+
+async def get_broadcast_job_ids(status: str) -> list[int]:
+    async with async_session() as session:
+        result = await session.scalars(
+            select(BroadcastJob.id).where(BroadcastJob.status == status).order_by(BroadcastJob.id)
+        )
+        return result.all()
+
+
+async def get_pending_recipients(job_id: int, after_id: int = 0, limit: int = 50) -> list[tuple[int, str]]:
+    """Следующая пачка недоставленных получателей после курсора after_id (keyset-пагинация по id)."""
+    async with async_session() as session:
+        result = await session.execute(
+            select(BroadcastRecipient.id, BroadcastRecipient.chat_id)
+            .where(
+                BroadcastRecipient.job_id == job_id,
+                BroadcastRecipient.status == "pending",
+                BroadcastRecipient.id > after_id
+            )
+            .order_by(BroadcastRecipient.id)
+            .limit(limit)
+        )
+        return [tuple(row) for row in result.all()]
+
+
+async def save_recipient_results(job_id: int, results: list[dict]) -> None:
+    """
+    Сохраняет исходы отправки пачки получателей и одновременно увеличивает счётчики рассылки.
+    results — словари {"id", "chat_id", "status", "error"} со статусом sent/blocked/failed.
+    Заблокировавшие бота чаты тут же попадают в список подавления.
+    """
+    if not results:
+        return
+
+    counts = {"sent": 0, "blocked": 0, "failed": 0}
+    for item in results:
+        counts[item["status"]] += 1
+
+    async with async_session() as session:
+        await session.execute(update(BroadcastRecipient), results)
+        await session.execute(
+            update(BroadcastJob)
+            .where(BroadcastJob.id == job_id)
+            .values(
+                sent=BroadcastJob.sent + counts["sent"],
+                blocked=BroadcastJob.blocked + counts["blocked"],
+                failed=BroadcastJob.failed + counts["failed"],
+            )
+        )
+        await suppress_chats(session, (item["chat_id"] for item in results if item["status"] == "blocked"))
+        await session.commit()
+
+
+async def get_broadcast_errors(job_id: int, limit: int = 10) -> tuple[list[str], int]:
+    """Первые limit ошибок рассылки и их общее количество."""
+    failed = (BroadcastRecipient.job_id == job_id, BroadcastRecipient.status.in_(("blocked", "failed")))
+
+    async with async_session() as session:
+        errors = await session.scalars(
+            select(BroadcastRecipient.error).where(*failed).order_by(BroadcastRecipient.id).limit(limit)
+        )
+        total = await session.scalar(select(func.count(BroadcastRecipient.id)).where(*failed))
+        return errors.all(), total or 0
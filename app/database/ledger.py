@@ -0,0 +1,124 @@
+from datetime import datetime
+
+import pandas as pd
+from sqlalchemy import select, insert, func, literal, text, bindparam, Integer, String, TIMESTAMP
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .models import async_session, BonusLedger, BalanceSnapshot, UserBonusBalance
+
+# Последний снимок каждого пользователя — база, к которой прибавляется хвост журнала
+LAST_SNAPSHOTS_CTE = """
+    last AS (
+        SELECT user_id, MAX(ledger_id) AS ledger_id FROM balance_snapshots GROUP BY user_id
+    ),
+    base AS (
+        SELECT s.user_id, s.ledger_id, s.balance
+        FROM balance_snapshots AS s
+        JOIN last ON last.user_id = s.user_id AND last.ledger_id = s.ledger_id
+    )
+"""
+
+
+async def add_ledger_entry(
+    session: AsyncSession,
+    user_id,
+    delta,
+    reason: str,
+    purchase_id: int | None = None
+):
+    """
+    Добавляет запись в журнал бонусов. delta может быть SQL-выражением от UserBonusBalance.balance —
+    оно вычисляется в том же INSERT ... SELECT, что и запись, поэтому фактическое списание точно.
+    Возвращает строку (id, delta) или None, если у пользователя нет баланса.
+    """
+    source = (
+        select(
+            UserBonusBalance.user_id,
+            literal(purchase_id, Integer),
+            delta,
+            literal(reason, String),
+            literal(datetime.now(), TIMESTAMP),
+        )
+        .where(UserBonusBalance.user_id == str(user_id))
+        .limit(1)
+    )
+    result = await session.execute(
+        insert(BonusLedger)
+        .from_select(["user_id", "purchase_id", "delta", "reason", "created_at"], source)
+        .returning(BonusLedger.id, BonusLedger.delta)
+    )
+    return result.first()
+
+
+async def take_balance_snapshots() -> int:
+    """Фиксирует снимки балансов для всех, у кого после прошлого снимка были операции."""
+    async with async_session() as session:
+        result = await session.execute(
+            text(
+                "INSERT INTO balance_snapshots (user_id, ledger_id, balance, created_at) "
+                f"WITH {LAST_SNAPSHOTS_CTE} "
+                "SELECT l.user_id, MAX(l.id), COALESCE(b.balance, 0) + SUM(l.delta), :now "
+                "FROM bonus_ledger AS l "
+                "LEFT JOIN base AS b ON b.user_id = l.user_id "
+                "WHERE l.id > COALESCE(b.ledger_id, 0) "
+                "GROUP BY l.user_id"
+            ).bindparams(bindparam("now", type_=TIMESTAMP)),
+            {"now": datetime.now()}
+        )
+        await session.commit()
+        return result.rowcount
+
+
+async def get_balance_at(user_id, moment: datetime) -> float:
+    """Баланс пользователя на момент времени: последний снимок до него плюс хвост журнала."""
+    async with async_session() as session:
+        snapshot = (await session.execute(
+            select(BalanceSnapshot.ledger_id, BalanceSnapshot.balance)
+            .where(BalanceSnapshot.user_id == str(user_id), BalanceSnapshot.created_at <= moment)
+            .order_by(BalanceSnapshot.ledger_id.desc())
+            .limit(1)
+        )).first()
+
+        tail = await session.scalar(
+            select(func.coalesce(func.sum(BonusLedger.delta), 0.0))
+            .where(
+                BonusLedger.user_id == str(user_id),
+                BonusLedger.id > (snapshot.ledger_id if snapshot else 0),
+                BonusLedger.created_at <= moment
+            )
+        )
+        return (snapshot.balance if snapshot else 0.0) + tail
+
+
+async def reconcile_balances(tolerance: float = 0.005) -> pd.DataFrame:
+    """
+    Сверяет user_bonus_balance с балансами, выведенными из снимков и журнала.
+    Суммы хвостов считает SQLite, сравнение — векторно в pandas. Возвращает расхождения.
+    """
+    async with async_session() as session:
+        base = (await session.execute(
+            text(f"WITH {LAST_SNAPSHOTS_CTE} SELECT user_id, balance FROM base")
+        )).all()
+        tail = (await session.execute(
+            text(
+                f"WITH {LAST_SNAPSHOTS_CTE} "
+                "SELECT l.user_id, SUM(l.delta) "
+                "FROM bonus_ledger AS l "
+                "LEFT JOIN base AS b ON b.user_id = l.user_id "
+                "WHERE l.id > COALESCE(b.ledger_id, 0) "
+                "GROUP BY l.user_id"
+            )
+        )).all()
+        actual = (await session.execute(
+            select(UserBonusBalance.user_id, UserBonusBalance.balance)
+        )).all()
+
+    expected = (
+        pd.Series(dict(base), dtype="float64")
+        .add(pd.Series(dict(tail), dtype="float64"), fill_value=0.0)
+        .rename("expected")
+    )
+    report = pd.concat([pd.Series(dict(actual), dtype="float64").rename("actual"), expected], axis=1).fillna(0.0)
+    report["difference"] = report["actual"] - report["expected"]
+
+    return report[report["difference"].abs() > tolerance]
@@ -0,0 +1,33 @@
+from datetime import datetime
+
+from sqlalchemy import select, delete
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from .models import async_session, MediaAsset
+
+
+async def get_media_asset(path: str) -> MediaAsset | None:
+    async with async_session() as session:
+        return await session.scalar(select(MediaAsset).where(MediaAsset.path == path))
+
+
+async def save_media_asset(path: str, fingerprint: str, file_id: str, file_unique_id: str) -> None:
+    """Запоминает file_id загруженного файла; повторная загрузка того же пути перезаписывает запись."""
+    values = {
+        "path": path,
+        "fingerprint": fingerprint,
+        "file_id": file_id,
+        "file_unique_id": file_unique_id,
+        "uploaded_at": datetime.now(),
+    }
+    async with async_session() as session:
+        await session.execute(
+            sqlite_insert(MediaAsset).values(**values).on_conflict_do_update(index_elements=[MediaAsset.path], set_=values)
+        )
+        await session.commit()
+
+
+async def delete_media_asset(path: str) -> None:
+    async with async_session() as session:
+        await session.execute(delete(MediaAsset).where(MediaAsset.path == path))
+        await session.commit()
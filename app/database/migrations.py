@@ -0,0 +1,197 @@
+from datetime import datetime
+from typing import Awaitable, Callable
+
+from sqlalchemy import text, bindparam, TIMESTAMP
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from .models import engine
+from .rollup import rebuild_daily_rollup_on
+
+Migration = Callable[[AsyncConnection], Awaitable[None]]
+
+# (версия, описание, функция) — версии применяются строго по возрастанию и только один раз
+MIGRATIONS: list[tuple[int, str, Migration]] = []
+
+
+def migration(version: int, description: str):
+    def decorator(func: Migration) -> Migration:
+        MIGRATIONS.append((version, description, func))
+        return func
+    return decorator
+
+
+async def get_column_names(conn: AsyncConnection, table: str) -> set[str]:
+    result = await conn.execute(text(f"PRAGMA table_info({table})"))
+    return {row[1] for row in result.fetchall()}
+
+
+@migration(1, "cell_storages: поля confirmation_status и action_type")
+async def add_cell_storage_confirmation_fields(conn: AsyncConnection) -> None:
+    columns = await get_column_names(conn, "cell_storages")
+
+    if "confirmation_status" not in columns:
+        await conn.execute(text("ALTER TABLE cell_storages ADD COLUMN confirmation_status VARCHAR DEFAULT 'confirmed'"))
+        await conn.execute(text("UPDATE cell_storages SET confirmation_status = 'confirmed' WHERE confirmation_status IS NULL"))
+
+    if "action_type" not in columns:
+        await conn.execute(text("ALTER TABLE cell_storages ADD COLUMN action_type VARCHAR"))
+
+
+@migration(2, "вторичные индексы для частых выборок")
+async def add_hot_path_indexes(conn: AsyncConnection) -> None:
+    statements = [
+        "CREATE INDEX IF NOT EXISTS ix_purchase_history_user_id_transaction_date "
+        "ON purchase_history (user_id, transaction_date)",
+        "CREATE INDEX IF NOT EXISTS ix_reviews_worker_id_review_date ON reviews (worker_id, review_date)",
+        "CREATE INDEX IF NOT EXISTS ix_qr_codes_phone_number_created_at ON qr_codes (phone_number, created_at)",
+        "CREATE INDEX IF NOT EXISTS ix_appointments_date_time ON appointments (date_time)",
+        "CREATE INDEX IF NOT EXISTS ix_cell_storages_cell_id ON cell_storages (cell_id)",
+        "CREATE INDEX IF NOT EXISTS ix_cell_storages_user_id ON cell_storages (user_id)",
+    ]
+    for statement in statements:
+        await conn.execute(text(statement))
+
+
+@migration(3, "users: индексируемый суффикс телефона")
+async def add_user_phone_suffix(conn: AsyncConnection) -> None:
+    if "phone_suffix" not in await get_column_names(conn, "users"):
+        await conn.execute(text("ALTER TABLE users ADD COLUMN phone_suffix VARCHAR(4)"))
+
+    await conn.execute(text(
+        "UPDATE users SET phone_suffix = substr(mobile_phone, -4) "
+        "WHERE mobile_phone IS NOT NULL AND phone_suffix IS NULL"
+    ))
+    await conn.execute(text("CREATE INDEX IF NOT EXISTS ix_users_phone_suffix ON users (phone_suffix)"))
+
+
+@migration(4, "daily_rollup: заполнение агрегатов по истории покупок")
+async def backfill_daily_rollup(conn: AsyncConnection) -> None:
+    await conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_purchase_history_transaction_date ON purchase_history (transaction_date)"
+    ))
+    await rebuild_daily_rollup_on(conn)
+
+
+@migration(5, "bonus_ledger: начальные записи по текущим балансам")
+async def open_bonus_ledger(conn: AsyncConnection) -> None:
+    await conn.execute(
+        text(
+            "INSERT INTO bonus_ledger (user_id, delta, reason, created_at) "
+            "SELECT b.user_id, b.balance, 'opening', :now "
+            "FROM user_bonus_balance AS b "
+            "WHERE NOT EXISTS (SELECT 1 FROM bonus_ledger AS l WHERE l.user_id = b.user_id)"
+        ).bindparams(bindparam("now", type_=TIMESTAMP)),
+        {"now": datetime.now()}
+    )
+
+
+@migration(6, "purchase_history: ключ идемпотентности транзакции")
+async def add_purchase_idempotency_key(conn: AsyncConnection) -> None:
+    if "idempotency_key" not in await get_column_names(conn, "purchase_history"):
+        await conn.execute(text("ALTER TABLE purchase_history ADD COLUMN idempotency_key VARCHAR"))
+
+    await conn.execute(text(
+        "CREATE UNIQUE INDEX IF NOT EXISTS ix_purchase_history_idempotency_key ON purchase_history (idempotency_key)"
+    ))
+
+
+@migration(7, "qr_codes: таблица заменена подписанными QR-токенами")
+async def drop_qr_codes(conn: AsyncConnection) -> None:
+    await conn.execute(text("DROP TABLE IF EXISTS qr_codes"))
+
+
+
+@migration(8, "users: отметка о блокировке бота для исключения из рассылок")
+async def add_user_bot_blocked_at(conn: AsyncConnection) -> None:
+    if "bot_blocked_at" not in await get_column_names(conn, "users"):
+        await conn.execute(text("ALTER TABLE users ADD COLUMN bot_blocked_at TIMESTAMP"))
+
+    await conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_users_role_reachable ON users (role) WHERE bot_blocked_at IS NULL"
+    ))
+
+
+
+@migration(9, "broadcast_jobs: альбомы в рассылках")
+async def add_broadcast_media(conn: AsyncConnection) -> None:
+    if "media" not in await get_column_names(conn, "broadcast_jobs"):
+        await conn.execute(text("ALTER TABLE broadcast_jobs ADD COLUMN media JSON"))
+
+
+
+@migration(10, "индексы для сегментов аудитории рассылок")
+async def add_mailing_segment_indexes(conn: AsyncConnection) -> None:
+    statements = [
+        "CREATE INDEX IF NOT EXISTS ix_user_bonus_balance_balance_user_id ON user_bonus_balance (balance, user_id)",
+        "CREATE INDEX IF NOT EXISTS ix_vip_clients_user_id ON vip_clients (user_id)",
+        "CREATE INDEX IF NOT EXISTS ix_users_registration_date ON users (registration_date)",
+        "CREATE INDEX IF NOT EXISTS ix_users_birthday_month ON users (strftime('%m', birthday_date))",
+    ]
+    for statement in statements:
+        await conn.execute(text(statement))
+
+
+@migration(11, "qr_codes: индекс из миграции 2 и таблица больше не нужны")
+async def drop_qr_codes_index(conn: AsyncConnection) -> None:
+    await conn.execute(text("DROP INDEX IF EXISTS ix_qr_codes_phone_number_created_at"))
+    await conn.execute(text("DROP TABLE IF EXISTS qr_codes"))
+
+
+@migration(12, "broadcast_jobs: причина остановки рассылки из-за ошибки")
+async def add_broadcast_last_error(conn: AsyncConnection) -> None:
+    if "last_error" not in await get_column_names(conn, "broadcast_jobs"):
+        await conn.execute(text("ALTER TABLE broadcast_jobs ADD COLUMN last_error VARCHAR"))
+
+
+@migration(13, "users: индекс для сегмента когорты рассылок вместо ix_users_role_reachable")
+async def add_cohort_segment_index(conn: AsyncConnection) -> None:
+    await conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_users_role_registration_reachable "
+        "ON users (role, registration_date) WHERE bot_blocked_at IS NULL"
+    ))
+    # Прежний индекс по role с тем же условием — префикс нового и больше не нужен
+    await conn.execute(text("DROP INDEX IF EXISTS ix_users_role_reachable"))
+
+
+async def get_applied_versions() -> set[int]:
+    async with engine.begin() as conn:
+        await conn.execute(text(
+            "CREATE TABLE IF NOT EXISTS schema_migrations ("
+            "version INTEGER PRIMARY KEY, "
+            "description VARCHAR NOT NULL, "
+            "applied_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP)"
+        ))
+        result = await conn.execute(text("SELECT version FROM schema_migrations"))
+        return {row[0] for row in result.fetchall()}
+
+
+async def run_migrations(fresh_schema: bool = False) -> None:
+    """
+    Применяет все ещё не применённые миграции, каждую в отдельной транзакции.
+    fresh_schema — база только что создана по моделям (см. async_main): схема уже актуальна,
+    поэтому миграции лишь отмечаются применёнными, как если бы база прошла их все.
+    """
+    applied = await get_applied_versions()
+
+    if fresh_schema:
+        async with engine.begin() as conn:
+            for version, description, _ in sorted(MIGRATIONS, key=lambda m: m[0]):
+                if version not in applied:
+                    await conn.execute(
+                        text("INSERT INTO schema_migrations (version, description) VALUES (:version, :description)"),
+                        {"version": version, "description": description}
+                    )
+        print("✅ Новая база создана по моделям, миграции отмечены применёнными")
+        return
+
+    for version, description, func in sorted(MIGRATIONS, key=lambda m: m[0]):
+        if version in applied:
+            continue
+
+        async with engine.begin() as conn:
+            await func(conn)
+            await conn.execute(
+                text("INSERT INTO schema_migrations (version, description) VALUES (:version, :description)"),
+                {"version": version, "description": description}
+            )
+        print(f"✅ Применена миграция {version}: {description}")
@@ -1,35 +1,73 @@
-from sqlalchemy import Float, String, TIMESTAMP, Date, Integer, ForeignKey, Boolean, func, JSON
+from sqlalchemy import Float, String, TIMESTAMP, Date, Integer, ForeignKey, Boolean, func, JSON, Index, LargeBinary, UniqueConstraint, event, text, inspect
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
 from sqlalchemy.ext.asyncio import AsyncAttrs, async_sessionmaker, create_async_engine
 import datetime
 
-engine = create_async_engine(url='sqlite+aiosqlite:///db.sqlite3', echo=False)
+from config import DATABASE_URL, SQLITE_PROFILE
+
+# Профили PRAGMA, применяемые к каждому новому соединению SQLite
+SQLITE_PROFILES = {
+    "default": {},
+    "tuned": {
+        "journal_mode": "WAL",          # читатели не блокируют писателя
+        "synchronous": "NORMAL",        # в WAL безопасно и без fsync на каждый коммит
+        "busy_timeout": 5000,           # ждём блокировку до 5 с вместо "database is locked"
+        "cache_size": -64000,           # ~64 МБ страничного кэша
+        "mmap_size": 268435456,         # 256 МБ memory-mapped I/O
+        "temp_store": "MEMORY",
+    },
+}
+
+engine = create_async_engine(url=DATABASE_URL, echo=False)
 async_session = async_sessionmaker(engine, expire_on_commit=False)
 
+
+@event.listens_for(engine.sync_engine, "connect")
+def apply_sqlite_pragmas(dbapi_connection, connection_record):
+    if engine.dialect.name != "sqlite":
+        return
+
+    pragmas = SQLITE_PROFILES.get(SQLITE_PROFILE, SQLITE_PROFILES["default"])
+    cursor = dbapi_connection.cursor()
+    for name, value in pragmas.items():
+        cursor.execute(f"PRAGMA {name}={value}")
+    cursor.close()
+
 class Base(AsyncAttrs, DeclarativeBase):
     pass
 
 class User(Base):
     __tablename__ = 'users'
+    __table_args__ = (
+        Index('ix_users_role_registration_reachable', 'role', 'registration_date', sqlite_where=text('bot_blocked_at IS NULL')),
+        Index('ix_users_registration_date', 'registration_date'),
+        Index('ix_users_birthday_month', text("strftime('%m', birthday_date)")),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)
     user_id: Mapped[str] = mapped_column(String, unique=True, nullable=False)
     registration_date: Mapped[datetime.datetime] = mapped_column(TIMESTAMP, nullable=False)
     name: Mapped[str] = mapped_column(String)
     mobile_phone: Mapped[str] = mapped_column(String, unique=True, nullable=True)
+    phone_suffix: Mapped[str] = mapped_column(String(4), index=True, nullable=True)  # Последние 4 цифры телефона
     birthday_date: Mapped[datetime.date] = mapped_column(Date, nullable=True)
     role: Mapped[str] = mapped_column(String)  # Пользователь/Работник/Администратор
+    bot_blocked_at: Mapped[datetime.datetime] = mapped_column(TIMESTAMP, nullable=True)  # Когда рассылка получила отказ «бот заблокирован»
 
     purchase_history = relationship("PurchaseHistory", back_populates="user", lazy="dynamic")
     bonus_balance = relationship("UserBonusBalance", uselist=False, back_populates="user")
     reviews = relationship("Review", back_populates="user", lazy="dynamic")
     appointments = relationship("Appointment", back_populates="user", lazy="dynamic")
-    qr_codes = relationship("QRCode", back_populates="user")
     vote_history = relationship("VoteHistory", back_populates="user")
     vip_client = relationship("VipClient", back_populates="user", uselist=False)
 
 class PurchaseHistory(Base):
     __tablename__ = 'purchase_history'
+    __table_args__ = (
+        Index('ix_purchase_history_user_id_transaction_date', 'user_id', 'transaction_date'),
+        Index('ix_purchase_history_transaction_date', 'transaction_date'),
+        Index('ix_purchase_history_idempotency_key', 'idempotency_key', unique=True),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)
     user_id: Mapped[str] = mapped_column(ForeignKey('users.user_id'), nullable=False)
@@ -38,12 +76,31 @@ class PurchaseHistory(Base):
     transaction_type: Mapped[str] = mapped_column(String, nullable=False)  # Пополнение/Списание
     amount: Mapped[float] = mapped_column(Float, nullable=False)  # Сумма покупки
     bonus_amount: Mapped[float] = mapped_column(Float, nullable=False)  # Количество бонусов
+    idempotency_key: Mapped[str] = mapped_column(String, nullable=True)  # Ключ сценария проведения, защита от повторов
 
     user = relationship("User", back_populates="purchase_history")
     reviews = relationship("Review", back_populates="purchase", lazy="dynamic")
 
+class DailyRollup(Base):
+    __tablename__ = 'daily_rollup'
+    __table_args__ = (
+        UniqueConstraint('date', 'worker_id', 'transaction_type', name='uq_daily_rollup_key'),
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    date: Mapped[datetime.date] = mapped_column(Date, nullable=False)
+    worker_id: Mapped[str] = mapped_column(String, nullable=False)
+    transaction_type: Mapped[str] = mapped_column(String, nullable=False)  # Пополнение/Списание
+    transactions_count: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    amount_sum: Mapped[float] = mapped_column(Float, default=0, nullable=False)
+    bonus_amount_sum: Mapped[float] = mapped_column(Float, default=0, nullable=False)
+    users_sketch: Mapped[bytes] = mapped_column(LargeBinary, nullable=False)  # HyperLogLog по user_id
+
 class UserBonusBalance(Base):
     __tablename__ = 'user_bonus_balance'
+    __table_args__ = (
+        Index('ix_user_bonus_balance_balance_user_id', 'balance', 'user_id'),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)
     user_id: Mapped[str] = mapped_column(ForeignKey('users.user_id'), nullable=False)
@@ -51,6 +108,31 @@ class UserBonusBalance(Base):
 
     user = relationship("User", back_populates="bonus_balance")
 
+class BonusLedger(Base):
+    __tablename__ = 'bonus_ledger'
+    __table_args__ = (
+        Index('ix_bonus_ledger_user_id_id', 'user_id', 'id'),
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    user_id: Mapped[str] = mapped_column(ForeignKey('users.user_id'), nullable=False)
+    purchase_id: Mapped[int] = mapped_column(ForeignKey('purchase_history.id'), nullable=True)
+    delta: Mapped[float] = mapped_column(Float, nullable=False)  # Фактическое изменение баланса (+/-)
+    reason: Mapped[str] = mapped_column(String, nullable=False)  # purchase/debit/voting/admin/welcome/opening
+    created_at: Mapped[datetime.datetime] = mapped_column(TIMESTAMP, nullable=False)
+
+class BalanceSnapshot(Base):
+    __tablename__ = 'balance_snapshots'
+    __table_args__ = (
+        Index('ix_balance_snapshots_user_id_ledger_id', 'user_id', 'ledger_id'),
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    user_id: Mapped[str] = mapped_column(String, nullable=False)
+    ledger_id: Mapped[int] = mapped_column(Integer, nullable=False)  # Последняя учтённая запись журнала
+    balance: Mapped[float] = mapped_column(Float, nullable=False)
+    created_at: Mapped[datetime.datetime] = mapped_column(TIMESTAMP, nullable=False)
+
 class BonusSystem(Base):
     __tablename__ = 'bonus_system'
 
@@ -72,6 +154,9 @@ class RoleHistory(Base):
 
 class Review(Base):
     __tablename__ = 'reviews'
+    __table_args__ = (
+        Index('ix_reviews_worker_id_review_date', 'worker_id', 'review_date'),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)
     user_id: Mapped[str] = mapped_column(ForeignKey('users.user_id'), nullable=False)
@@ -86,6 +171,9 @@ class Review(Base):
 
 class Appointment(Base):
     __tablename__ = 'appointments'
+    __table_args__ = (
+        Index('ix_appointments_date_time', 'date_time'),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)
     user_id: Mapped[str] = mapped_column(ForeignKey('users.user_id'), nullable=False)  # Связь с users.user_id
@@ -102,16 +190,6 @@ class Settings(Base):
     id: Mapped[int] = mapped_column(primary_key=True)
     daily_message_id: Mapped[int] = mapped_column(Integer, nullable=True)
 
-class QRCode(Base):
-    __tablename__ = 'qr_codes'
-
-    id: Mapped[int] = mapped_column(Integer, primary_key=True)
-    user_id: Mapped[int] = mapped_column(Integer, ForeignKey('users.id'), nullable=False)
-    phone_number = mapped_column(String, nullable=False)
-    created_at = mapped_column(TIMESTAMP, nullable=False)
-
-    user = relationship("User", back_populates="qr_codes")
-
 class VoteHistory(Base):
     __tablename__ = 'vote_history'
 
@@ -123,6 +201,9 @@ class VoteHistory(Base):
 
 class VipClient(Base):
     __tablename__ = "vip_clients"
+    __table_args__ = (
+        Index("ix_vip_clients_user_id", "user_id"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     user_id: Mapped[int] = mapped_column(Integer, ForeignKey("users.id"), nullable=False)
@@ -184,6 +265,10 @@ class StorageCell(Base):
 
 class CellStorage(Base):
     __tablename__ = "cell_storages"
+    __table_args__ = (
+        Index("ix_cell_storages_cell_id", "cell_id"),
+        Index("ix_cell_storages_user_id", "user_id"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     cell_id: Mapped[int] = mapped_column(ForeignKey("storage_cells.id"), nullable=False)
@@ -200,7 +285,70 @@ class CellStorage(Base):
 
     storage_cell = relationship("StorageCell", back_populates="cell_storage")
 
+class NotificationOutbox(Base):
+    __tablename__ = 'notification_outbox'
+    __table_args__ = (
+        Index('ix_notification_outbox_status_next_attempt_at', 'status', 'next_attempt_at'),
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    chat_id: Mapped[str] = mapped_column(String, nullable=False)
+    method: Mapped[str] = mapped_column(String, nullable=False)  # send_message/send_document
+    payload: Mapped[dict] = mapped_column(JSON, nullable=False)  # Аргументы метода, клавиатура — в виде dict
+    status: Mapped[str] = mapped_column(String, default="pending", nullable=False)  # pending/sent/failed
+    attempts: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    last_error: Mapped[str] = mapped_column(String, nullable=True)
+    created_at: Mapped[datetime.datetime] = mapped_column(TIMESTAMP, nullable=False)
+    next_attempt_at: Mapped[datetime.datetime] = mapped_column(TIMESTAMP, nullable=False)
+    sent_at: Mapped[datetime.datetime] = mapped_column(TIMESTAMP, nullable=True)
+
+
+class BroadcastJob(Base):
+    __tablename__ = 'broadcast_jobs'
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    admin_chat_id: Mapped[str] = mapped_column(String, nullable=False)
+    status_message_id: Mapped[int] = mapped_column(Integer, nullable=True)  # Сообщение с прогрессом и кнопками управления
+    text: Mapped[str] = mapped_column(String, nullable=False)
+    photo: Mapped[str] = mapped_column(String, nullable=True)  # file_id фотографии
+    media: Mapped[list] = mapped_column(JSON, nullable=True)  # file_id фотографий альбома
+    status: Mapped[str] = mapped_column(String, default="running", nullable=False)  # running/paused/cancelled/done
+    total: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    sent: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    blocked: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    failed: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    created_at: Mapped[datetime.datetime] = mapped_column(TIMESTAMP, nullable=False)
+    finished_at: Mapped[datetime.datetime] = mapped_column(TIMESTAMP, nullable=True)
+    last_error: Mapped[str] = mapped_column(String, nullable=True)  # Почему рассылку остановила ошибка
+
+
+class BroadcastRecipient(Base):
+    __tablename__ = 'broadcast_recipients'
+    __table_args__ = (
+        Index('ix_broadcast_recipients_job_status_id', 'job_id', 'status', 'id'),
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    job_id: Mapped[int] = mapped_column(ForeignKey('broadcast_jobs.id', ondelete='CASCADE'), nullable=False)
+    chat_id: Mapped[str] = mapped_column(String, nullable=False)
+    status: Mapped[str] = mapped_column(String, default="pending", nullable=False)  # pending/sent/blocked/failed
+    error: Mapped[str] = mapped_column(String, nullable=True)
+
+
+class MediaAsset(Base):
+    __tablename__ = 'media_assets'
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    path: Mapped[str] = mapped_column(String, unique=True, nullable=False)  # Путь к файлу на диске
+    fingerprint: Mapped[str] = mapped_column(String, nullable=False)  # mtime и размер файла на момент загрузки
+    file_id: Mapped[str] = mapped_column(String, nullable=False)
+    file_unique_id: Mapped[str] = mapped_column(String, nullable=False)
+    uploaded_at: Mapped[datetime.datetime] = mapped_column(TIMESTAMP, nullable=False)
+
 
-async def async_main():
+async def async_main() -> bool:
+    """Создаёт недостающие таблицы. Возвращает True, если база новая и схема целиком создана по моделям."""
     async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
\ No newline at end of file
+        created = not await conn.run_sync(lambda sync_conn: inspect(sync_conn).has_table(User.__tablename__))
+        await conn.run_sync(Base.metadata.create_all)
+    return created
@@ -0,0 +1,126 @@
+import asyncio
+from datetime import datetime, timedelta
+from typing import Iterable
+
+from sqlalchemy import select, update, delete, func, case, event
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from .models import async_session, NotificationOutbox
+from .suppression import suppress_chats
+
+# Сколько секунд взятая в работу запись недоступна другим обработчикам очереди
+OUTBOX_LEASE = timedelta(seconds=60)
+
+# Будит диспетчер сразу после коммита с новыми уведомлениями, не дожидаясь очередного опроса
+outbox_wakeup = asyncio.Event()
+
+
+def notification(chat_id, text: str | None = None, *, method: str = "send_message", reply_markup=None, **params) -> dict:
+    """Описание уведомления для очереди: метод бота и его аргументы в сериализуемом виде."""
+    payload = dict(params)
+    if text is not None:
+        payload["text"] = text
+    if reply_markup is not None:
+        payload["reply_markup"] = reply_markup.model_dump(exclude_none=True)
+    return {"chat_id": str(chat_id), "method": method, "payload": payload}
+
+
+def enqueue_notifications(session: AsyncSession, notifications: Iterable[dict]) -> None:
+    """Кладёт уведомления в outbox в рамках транзакции вызывающего — они уйдут только после её коммита."""
+    now = datetime.now()
+    rows = [
+        NotificationOutbox(
+            chat_id=item["chat_id"],
+            method=item["method"],
+            payload=item["payload"],
+            status="pending",
+            attempts=0,
+            created_at=now,
+            next_attempt_at=now,
+        )
+        for item in notifications
+    ]
+    if rows:
+        session.add_all(rows)
+        session.info["outbox_pending"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def wake_outbox_dispatcher(session: Session) -> None:
+    if session.info.pop("outbox_pending", False):
+        outbox_wakeup.set()
+
+
+@event.listens_for(Session, "after_rollback")
+def forget_outbox_notifications(session: Session) -> None:
+    session.info.pop("outbox_pending", None)
+
+
+async def claim_due_notifications(limit: int = 50) -> list[NotificationOutbox]:
+    """
+    Забирает пачку готовых к отправке уведомлений, сдвигая их next_attempt_at на время аренды.
+    Если процесс упадёт во время отправки, записи вернутся в очередь по истечении аренды.
+    """
+    now = datetime.now()
+    due = (
+        select(NotificationOutbox.id)
+        .where(NotificationOutbox.status == "pending", NotificationOutbox.next_attempt_at <= now)
+        .order_by(NotificationOutbox.id)
+        .limit(limit)
+    )
+    async with async_session() as session:
+        result = await session.execute(
+            update(NotificationOutbox)
+            .where(NotificationOutbox.id.in_(due.scalar_subquery()))
+            .values(next_attempt_at=now + OUTBOX_LEASE)
+            .returning(NotificationOutbox)
+            .execution_options(synchronize_session=False)
+        )
+        rows = result.scalars().all()
+        await session.commit()
+        return sorted(rows, key=lambda row: row.id)
+
+
+async def save_delivery_results(results: list[dict], blocked_chats: Iterable = ()) -> None:
+    """
+    Сохраняет итоги отправки пачки одним обновлением по первичному ключу.
+    Заблокировавшие бота чаты в той же транзакции попадают в список подавления, как при рассылке.
+    """
+    if not results:
+        return
+    async with async_session() as session:
+        await session.execute(update(NotificationOutbox), results)
+        await suppress_chats(session, blocked_chats)
+        await session.commit()
+
+
+async def get_outbox_depth() -> dict:
+    """Глубина очереди: ожидающие и окончательно неотправленные уведомления, возраст самого старого."""
+    async with async_session() as session:
+        row = (await session.execute(
+            select(
+                func.count(case((NotificationOutbox.status == "pending", 1))),
+                func.count(case((NotificationOutbox.status == "failed", 1))),
+                func.min(case((NotificationOutbox.status == "pending", NotificationOutbox.created_at))),
+            ).where(NotificationOutbox.status.in_(("pending", "failed")))
+        )).one()
+
+    pending, failed, oldest = row
+    return {
+        "pending": pending,
+        "failed": failed,
+        "oldest_pending_age": round((datetime.now() - oldest).total_seconds(), 1) if oldest else 0.0,
+    }
+
+
+async def purge_sent_notifications(older_than: timedelta = timedelta(days=7)) -> int:
+    async with async_session() as session:
+        result = await session.execute(
+            delete(NotificationOutbox).where(
+                NotificationOutbox.status == "sent",
+                NotificationOutbox.sent_at < datetime.now() - older_than
+            )
+        )
+        await session.commit()
+        return result.rowcount
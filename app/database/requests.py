@@ -1,13 +1,27 @@
-from sqlalchemy import select, desc, func, case
+import asyncio
+from sqlalchemy import select, update, desc, func, case, literal, exists, Float
+from sqlalchemy.orm import aliased
 from datetime import datetime, timedelta
 import pytz
 from app.database.models import async_session
-from app.database.models import User, UserBonusBalance, PurchaseHistory, BonusSystem, Review, Appointment, Settings, QRCode, VoteHistory, VipClient, Promotion
+from app.database.models import User, UserBonusBalance, BonusLedger, PurchaseHistory, BonusSystem, Review, Appointment, Settings, VoteHistory, VipClient, Promotion
+from app.database.rollup import add_to_daily_rollup, get_period_totals
+from app.database.ledger import add_ledger_entry
+from app.database.outbox import enqueue_notifications
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import joinedload
-from config import ADMIN_ID
+from config import ADMIN_ID, redis_client
+from app.utils.cache import invalidate_role, bonus_settings_cache
 
 EKATERINBURG_TZ = pytz.timezone('Asia/Yekaterinburg')
 
+# Сколько Redis помнит ключ идемпотентности проведённой транзакции
+IDEMPOTENCY_TTL = 24 * 60 * 60
+
+# SQLite пускает одного писателя. Транзакции с балансом встают в очередь здесь, в порядке прихода,
+# а не крутятся в busy-handler, где неудачливый писатель может прождать дольше busy_timeout
+_balance_write_lock = asyncio.Lock()
+
 async def set_user(user_id, date_today, name, mobile_phone, birthday, bonus_balance):
     async with async_session() as session:
         user = await session.scalar(select(User).where(User.user_id == user_id))
@@ -19,6 +33,7 @@ async def set_user(user_id, date_today, name, mobile_phone, birthday, bonus_bala
                 registration_date=date_today,
                 name=name,
                 mobile_phone=mobile_phone,
+                phone_suffix=mobile_phone[-4:] if mobile_phone else None,
                 birthday_date=birthday,
                 role=role
             )
@@ -31,8 +46,15 @@ async def set_user(user_id, date_today, name, mobile_phone, birthday, bonus_bala
                 balance=bonus_balance
             )
             session.add(new_balance)
+            session.add(BonusLedger(
+                user_id=new_user.user_id,
+                delta=bonus_balance,
+                reason="welcome",
+                created_at=datetime.now()
+            ))
 
             await session.commit()
+            await invalidate_role(user_id)
 
             return True
         return False
@@ -62,24 +84,33 @@ async def check_user_by_id(user_id) -> bool:
         return result is not None
 
 
-async def get_user_profile(user_id) -> dict:
+async def get_user_profile(user_id) -> dict | None:
+    """Профиль пользователя вместе с балансом — одним запросом."""
     async with async_session() as session:
         result = await session.execute(
-            select(User)
-            .where(User.user_id == user_id)
+            select(
+                User.user_id,
+                User.name,
+                User.registration_date,
+                User.mobile_phone,
+                User.birthday_date,
+                func.coalesce(UserBonusBalance.balance, 0.0).label("bonus_balance")
+            )
+            .outerjoin(UserBonusBalance, UserBonusBalance.user_id == User.user_id)
+            .where(User.user_id == str(user_id))
+            .limit(1)
         )
-        user = result.scalars().first()
+        user = result.first()
 
         if user:
-            profile_data = {
+            return {
                 "user_id": user.user_id,
                 "name": user.name or "Не указано",
                 "registration_date": user.registration_date.strftime('%d-%m-%Y'),
                 "mobile_phone": user.mobile_phone or "Не указан",
                 "birthday_date": user.birthday_date.strftime('%d-%m-%Y') if user.birthday_date else "Не указана",
-                "bonus_balance": await get_bonus_balance(user_id)
+                "bonus_balance": user.bonus_balance
             }
-            return profile_data
 
 
 async def get_bonus_balance(user_id: str) -> float:
@@ -109,8 +140,18 @@ async def get_last_10_transactions(user_id):
 
 
 async def get_phone_numbers_by_suffix(suffix: str):
+    """Номера по последним 4 цифрам, сначала клиенты с самой свежей покупкой."""
     async with async_session() as session:
-        query = select(User.mobile_phone).where(User.mobile_phone.endswith(suffix))
+        last_purchase = (
+            select(func.max(PurchaseHistory.transaction_date))
+            .where(PurchaseHistory.user_id == User.user_id)
+            .scalar_subquery()
+        )
+        query = (
+            select(User.mobile_phone)
+            .where(User.phone_suffix == suffix[-4:])
+            .order_by(last_purchase.desc().nulls_last(), User.id.desc())
+        )
         result = await session.execute(query)
         phone_numbers = result.scalars().all()
         return phone_numbers
@@ -127,42 +168,277 @@ async def get_user_by_phone(phone_number: str):
         return result.scalar()
 
 
-async def set_bonus_balance(user_id, action, amount_bonus, amount_cell, worker_id):
+async def get_transaction_context(phone_number: str, employee_id) -> dict | None:
+    """
+    Всё, что нужно для проведения покупки, одним запросом: пользователь с балансом, VIP-статус,
+    участвовал ли он в акции за отзыв и имя сотрудника. Настройки берутся из кэша.
+    """
+    settings = await get_bonus_system_settings()
+
     async with async_session() as session:
-        query = select(UserBonusBalance).where(UserBonusBalance.user_id == user_id)
-        result = await session.execute(query)
-        bonus_balance = result.scalar()
+        employee = aliased(User)
+        query = (
+            select(
+                User,
+                func.coalesce(UserBonusBalance.balance, 0.0).label("balance"),
+                exists().where(VipClient.user_id == User.id).label("is_vip"),
+                exists().where(VoteHistory.user_id == User.id).label("has_voted"),
+                select(employee.name)
+                .where(employee.user_id == str(employee_id))
+                .scalar_subquery()
+                .label("employee_name")
+            )
+            .outerjoin(UserBonusBalance, UserBonusBalance.user_id == User.user_id)
+            .where(User.mobile_phone == phone_number)
+            .limit(1)
+        )
+        row = (await session.execute(query)).first()
 
-        if not bonus_balance:
-            return False
+        if not row:
+            return None
 
-        if action == 'add':
-            bonus_balance.balance += amount_bonus
-            transaction_type = "Пополнение"
-        elif action == 'remove':
-            if bonus_balance.balance < amount_bonus:
-                bonus_balance.balance = 0
-            else:
-                bonus_balance.balance -= amount_bonus
-            transaction_type = "Списание"
-        else:
-            return False
+        return {
+            "user": row.User,
+            "balance": row.balance,
+            "is_vip": bool(row.is_vip),
+            "can_vote": not row.has_voted,
+            "employee_name": row.employee_name,
+            "settings": settings
+        }
 
-        new_transaction = PurchaseHistory(
-            user_id = user_id,
-            worker_id=worker_id,
-            transaction_date = datetime.now(),
-            transaction_type = transaction_type,
-            amount = amount_cell,
-            bonus_amount = amount_bonus
+
+async def get_batch_transaction_context(suffixes: list[str]) -> dict[str, list[dict]]:
+    """
+    Клиенты для пакетного ввода одним запросом: по каждому суффиксу телефона — все совпавшие пользователи
+    с балансом, VIP-статусом и признаком участия в акции за отзыв.
+    """
+    async with async_session() as session:
+        query = (
+            select(
+                User.user_id,
+                User.name,
+                User.mobile_phone,
+                User.phone_suffix,
+                func.coalesce(UserBonusBalance.balance, 0.0).label("balance"),
+                exists().where(VipClient.user_id == User.id).label("is_vip"),
+                exists().where(VoteHistory.user_id == User.id).label("has_voted")
+            )
+            .outerjoin(UserBonusBalance, UserBonusBalance.user_id == User.user_id)
+            .where(User.phone_suffix.in_(set(suffixes)))
         )
-        session.add(new_transaction)
+        result = await session.execute(query)
 
-        await session.commit()
+        customers = {suffix: [] for suffix in suffixes}
+        for row in result:
+            customers[row.phone_suffix].append({
+                "user_id": row.user_id,
+                "name": row.name,
+                "mobile_phone": row.mobile_phone,
+                "balance": row.balance,
+                "is_vip": bool(row.is_vip),
+                "can_vote": not row.has_voted
+            })
+        return customers
+
+
+async def set_bonus_balance(
+    user_id,
+    action,
+    amount_bonus,
+    amount_cell,
+    worker_id,
+    reason: str | None = None,
+    notifications: list[dict] | None = None,
+    idempotency_key: str | None = None
+):
+    """
+    Проводит начисление/списание; уведомления попадают в outbox в той же транзакции.
+    Возвращает True при успехе, False при ошибке и None, если транзакция с таким idempotency_key уже проведена.
+    """
+    if action not in ('add', 'remove'):
+        return False
+
+    if idempotency_key is not None and not await claim_idempotency_key(idempotency_key):
+        return None
+
+    try:
+        async with _balance_write_lock, async_session() as session:
+            applied = await apply_bonus_transaction(
+                session, user_id, action, amount_bonus, amount_cell, worker_id, reason, idempotency_key
+            )
+            if not applied:
+                await session.rollback()
+                await release_idempotency_key(idempotency_key)
+                return False
+
+            enqueue_notifications(session, notifications or [])
+            await session.commit()
+            return True
+    except IntegrityError:
+        # Ключ уже есть в purchase_history — Redis его не помнил (истёк TTL или был недоступен).
+        # Любое другое нарушение ограничений — настоящая ошибка
+        if idempotency_key is not None and await idempotency_key_exists(idempotency_key):
+            return None
+        await release_idempotency_key(idempotency_key)
+        raise
+    except Exception:
+        await release_idempotency_key(idempotency_key)
+        raise
+
+
+async def set_bonus_balances_batch(
+    transactions: list[dict],
+    worker_id,
+    notifications: list[dict] | None = None,
+    idempotency_key: str | None = None
+):
+    """
+    Проводит пачку транзакций ({user_id, action, amount_bonus, amount}) одной транзакцией БД: все или ни одной.
+    Возвращаемые значения — как у set_bonus_balance.
+    """
+    if any(item["action"] not in ('add', 'remove') for item in transactions):
+        return False
+
+    if idempotency_key is not None and not await claim_idempotency_key(idempotency_key):
+        return None
+
+    try:
+        async with _balance_write_lock, async_session() as session:
+            for index, item in enumerate(transactions):
+                applied = await apply_bonus_transaction(
+                    session,
+                    item["user_id"],
+                    item["action"],
+                    item["amount_bonus"],
+                    item["amount"],
+                    worker_id,
+                    idempotency_key=f"{idempotency_key}:{index}" if idempotency_key else None
+                )
+                if not applied:
+                    await session.rollback()
+                    await release_idempotency_key(idempotency_key)
+                    return False
+
+            enqueue_notifications(session, notifications or [])
+            await session.commit()
+            return True
+    except IntegrityError:
+        # Строки пакета получают ключи вида "{ключ}:{номер}" — достаточно проверить первую
+        if idempotency_key is not None and transactions and await idempotency_key_exists(f"{idempotency_key}:0"):
+            return None
+        await release_idempotency_key(idempotency_key)
+        raise
+    except Exception:
+        await release_idempotency_key(idempotency_key)
+        raise
+
+
+async def apply_bonus_transaction(
+    session,
+    user_id,
+    action,
+    amount_bonus,
+    amount_cell,
+    worker_id,
+    reason: str | None = None,
+    idempotency_key: str | None = None
+) -> bool:
+    """Баланс, покупка, запись журнала и дневной агрегат в рамках переданной сессии. False — у пользователя нет баланса."""
+    # Баланс меняется первым оператором транзакции: UPDATE сразу берёт блокировку на запись
+    balance_row = UserBonusBalance.user_id == str(user_id)
+    if action == 'add':
+        transaction_type = "Пополнение"
+        result = await session.execute(
+            update(UserBonusBalance)
+            .where(balance_row)
+            .values(balance=UserBonusBalance.balance + amount_bonus)
+            .returning(UserBonusBalance.balance)
+            .execution_options(synchronize_session=False)
+        )
+        if result.scalar_one_or_none() is None:
+            return False
+        delta = amount_bonus
+    else:
+        transaction_type = "Списание"
+        result = await session.execute(
+            update(UserBonusBalance)
+            .where(balance_row, UserBonusBalance.balance >= amount_bonus)
+            .values(balance=UserBonusBalance.balance - amount_bonus)
+            .returning(UserBonusBalance.balance)
+            .execution_options(synchronize_session=False)
+        )
+        delta = -amount_bonus
+        if result.scalar_one_or_none() is None:
+            # Баланса не хватает — списываем остаток целиком. Блокировка уже взята UPDATE выше,
+            # поэтому прочитанный остаток не изменится до конца транзакции
+            remainder = await session.scalar(select(UserBonusBalance.balance).where(balance_row))
+            if remainder is None:
+                return False
+            await session.execute(
+                update(UserBonusBalance)
+                .where(balance_row)
+                .values(balance=0)
+                .execution_options(synchronize_session=False)
+            )
+            delta = -remainder
+
+    new_transaction = PurchaseHistory(
+        user_id = user_id,
+        worker_id=worker_id,
+        transaction_date = datetime.now(),
+        transaction_type = transaction_type,
+        amount = amount_cell,
+        bonus_amount = amount_bonus,
+        idempotency_key=idempotency_key
+    )
+    session.add(new_transaction)
+    await session.flush()
+
+    await add_ledger_entry(
+        session,
+        user_id,
+        literal(delta, Float),
+        reason or ("purchase" if action == 'add' else "debit"),
+        purchase_id=new_transaction.id
+    )
+    await add_to_daily_rollup(session, new_transaction)
+    return True
+
+
+async def claim_idempotency_key(key: str) -> bool:
+    """SET NX в Redis: False, если ключ уже занят. Без Redis полагаемся на уникальный индекс в БД."""
+    try:
+        return bool(await redis_client.set(f"idempotency:{key}", 1, nx=True, ex=IDEMPOTENCY_TTL))
+    except Exception as e:
+        print(f"⚠️ Не удалось проверить ключ идемпотентности: {e}")
         return True
 
 
+async def idempotency_key_exists(key: str) -> bool:
+    """Проведена ли уже транзакция с этим ключом — по уникальному индексу purchase_history."""
+    async with async_session() as session:
+        return await session.scalar(
+            select(PurchaseHistory.id).where(PurchaseHistory.idempotency_key == key).limit(1)
+        ) is not None
+
+
+async def release_idempotency_key(key: str | None) -> None:
+    """Освобождает ключ, если транзакция не состоялась, чтобы её можно было повторить."""
+    if key is None:
+        return
+    try:
+        await redis_client.delete(f"idempotency:{key}")
+    except Exception as e:
+        print(f"⚠️ Не удалось освободить ключ идемпотентности: {e}")
+
+
 async def get_bonus_system_settings():
+    """Настройки бонусной системы из кэша процесса; перечитываются при смене версии в Redis."""
+    settings = await bonus_settings_cache.get(load_bonus_system_settings)
+    return dict(settings)
+
+
+async def load_bonus_system_settings():
     async with async_session() as session:
         query = select(BonusSystem.cashback, BonusSystem.max_debit, BonusSystem.start_bonus_balance, BonusSystem.voting_bonus, BonusSystem.vip_cashback)
         result = await session.execute(query)
@@ -199,35 +475,14 @@ async def get_monthly_report(year: int, month: int) -> dict:
         )
         new_users = await session.scalar(new_users_query) or 0
 
-        transactions_query = (
-            select(
-                func.count(PurchaseHistory.id).label("sales_count"),
-                func.sum(PurchaseHistory.amount).label("sales_amount"),
-                func.sum(
-                    case(
-                        (PurchaseHistory.transaction_type == "Пополнение", PurchaseHistory.bonus_amount),
-                        else_=0
-                    )
-                ).label("bonuses_added"),
-                func.sum(
-                    case(
-                        (PurchaseHistory.transaction_type == "Списание", PurchaseHistory.bonus_amount),
-                        else_=0
-                    )
-                ).label("bonuses_spent")
-            )
-            .where(PurchaseHistory.transaction_date >= start_date)
-            .where(PurchaseHistory.transaction_date < end_date)
-        )
-        result = await session.execute(transactions_query)
-        row = result.one()
+        totals = await get_period_totals(session, start=start_date, end=end_date.date())
 
         return {
             "new_users": new_users,
-            "sales_count": row.sales_count or 0,
-            "sales_amount": row.sales_amount or 0.0,
-            "bonuses_added": row.bonuses_added or 0.0,
-            "bonuses_spent": row.bonuses_spent or 0.0
+            "sales_count": totals["transactions"],
+            "sales_amount": totals["amount"],
+            "bonuses_added": totals["bonus_added"],
+            "bonuses_spent": totals["bonus_spent"]
         }
 
 
@@ -373,36 +628,6 @@ async def get_user_role(user_tg_id: int) -> str | None:
         user = result.scalars().first()
         return user.role if user else None
 
-async def get_last_qr_code(user_id: int) -> QRCode | None:
-    async with async_session() as session:
-        result = await session.execute(
-            select(QRCode).where(QRCode.user_id == user_id).order_by(QRCode.created_at.desc())
-        )
-        return result.scalars().first()
-
-async def create_qr_code(user_id: int, phone_number: str) -> bool:
-    async with async_session() as session:
-            new_qr = QRCode(
-                user_id=user_id,
-                phone_number=phone_number,
-                created_at=datetime.now(EKATERINBURG_TZ).astimezone(pytz.UTC)
-            )
-            session.add(new_qr)
-            await session.commit()
-
-async def check_qr_code(phone_number: str) -> QRCode | None:
-    async with async_session() as session:
-        result = await session.execute(
-            select(QRCode).where(QRCode.phone_number == phone_number).order_by(QRCode.created_at.desc())
-        )
-        qr = result.scalars().first()
-        if qr and qr.created_at:
-            now_utc = datetime.now(EKATERINBURG_TZ).astimezone(pytz.UTC)
-            created_at_utc = qr.created_at.replace(tzinfo=pytz.UTC) if qr.created_at.tzinfo is None else qr.created_at
-            if (now_utc - created_at_utc) <= timedelta(minutes=30):
-                return qr
-        return None
-
 async def get_user_by_tg_id(user_tg_id: int) -> User | None:
     async with async_session() as session:
         result = await session.execute(
@@ -486,4 +711,4 @@ async def get_promo_by_id(promo_id):
             select(Promotion)
             .where(Promotion.id == promo_id)
         )
-        return result.scalars().first()
\ No newline at end of file
+        return result.scalars().first()
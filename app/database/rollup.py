@@ -0,0 +1,257 @@
+import asyncio
+import hashlib
+import math
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta
+
+import numpy as np
+from sqlalchemy import select, delete, insert, func, event
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
+
+from .models import engine, DailyRollup, PurchaseHistory
+
+# Скетч уникальных пользователей: пока пользователей немного, хранятся точные 64-битные хэши
+# (формат "S"), при росте — регистры HyperLogLog на 2^10 байт (формат "D", погрешность ~3%)
+SKETCH_PRECISION = 10
+SKETCH_REGISTERS = 1 << SKETCH_PRECISION
+SPARSE_LIMIT = 128
+EMPTY_SKETCH = b"S"
+
+
+def user_hash(user_id) -> int:
+    digest = hashlib.blake2b(str(user_id).encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big")
+
+
+class UserSketch:
+    def __init__(self):
+        self.hashes: set[int] | None = set()
+        self.registers: np.ndarray | None = None
+
+    @classmethod
+    def from_bytes(cls, blob: bytes | None) -> "UserSketch":
+        sketch = cls()
+        if blob and blob[:1] == b"D":
+            sketch.hashes = None
+            sketch.registers = np.frombuffer(blob[1:], dtype=np.uint8).copy()
+        elif blob:
+            sketch.hashes = set(np.frombuffer(blob[1:], dtype=">u8").tolist())
+        return sketch
+
+    def to_bytes(self) -> bytes:
+        if self.hashes is not None and len(self.hashes) <= SPARSE_LIMIT:
+            return b"S" + np.array(sorted(self.hashes), dtype=">u8").tobytes()
+        self.densify()
+        return b"D" + self.registers.tobytes()
+
+    def densify(self) -> None:
+        if self.hashes is None:
+            return
+        self.registers = np.zeros(SKETCH_REGISTERS, dtype=np.uint8)
+        for value in self.hashes:
+            self.add_register(value)
+        self.hashes = None
+
+    def add_register(self, value: int) -> None:
+        index = value >> (64 - SKETCH_PRECISION)
+        rest = value & ((1 << (64 - SKETCH_PRECISION)) - 1)
+        rank = (64 - SKETCH_PRECISION) - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def add(self, user_id) -> None:
+        value = user_hash(user_id)
+        if self.hashes is not None:
+            self.hashes.add(value)
+        else:
+            self.add_register(value)
+
+    def merge(self, other: "UserSketch") -> None:
+        # Точные множества объединяются точно; плотный скетч с любой стороны переводит результат в HLL
+        if self.hashes is not None and other.hashes is not None:
+            self.hashes |= other.hashes
+            return
+        self.densify()
+        if other.hashes is not None:
+            for value in other.hashes:
+                self.add_register(value)
+        else:
+            np.maximum(self.registers, other.registers, out=self.registers)
+
+    def estimate(self) -> int:
+        if self.hashes is not None:
+            return len(self.hashes)
+
+        m = SKETCH_REGISTERS
+        zeros = int(np.count_nonzero(self.registers == 0))
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / float(np.sum(np.exp2(-self.registers.astype(np.float64))))
+        if raw <= 2.5 * m and zeros:
+            return round(m * math.log(m / zeros))
+        return round(raw)
+
+
+def sketch_add(blob: bytes | None, user_id) -> bytes:
+    """SQL-функция sketch_add(скетч, user_id): возвращает скетч с добавленным пользователем."""
+    sketch = UserSketch.from_bytes(blob)
+    sketch.add(user_id)
+    return sketch.to_bytes()
+
+
+@event.listens_for(engine.sync_engine, "connect")
+def register_sketch_functions(dbapi_connection, connection_record):
+    if engine.dialect.name != "sqlite":
+        return
+    dbapi_connection.run_async(
+        lambda connection: connection.create_function("sketch_add", 2, sketch_add, deterministic=True)
+    )
+
+
+async def add_to_daily_rollup(session: AsyncSession, transaction: PurchaseHistory) -> None:
+    """Учитывает транзакцию в daily_rollup в той же транзакции БД, что и сама покупка."""
+    stmt = sqlite_insert(DailyRollup).values(
+        date=transaction.transaction_date.date(),
+        worker_id=str(transaction.worker_id),
+        transaction_type=transaction.transaction_type,
+        transactions_count=1,
+        amount_sum=transaction.amount,
+        bonus_amount_sum=transaction.bonus_amount,
+        users_sketch=func.sketch_add(EMPTY_SKETCH, str(transaction.user_id)),
+    )
+    # Скетч дополняется функцией sketch_add внутри того же upsert — без отдельных SELECT и UPDATE
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["date", "worker_id", "transaction_type"],
+        set_={
+            "transactions_count": DailyRollup.transactions_count + 1,
+            "amount_sum": DailyRollup.amount_sum + stmt.excluded.amount_sum,
+            "bonus_amount_sum": DailyRollup.bonus_amount_sum + stmt.excluded.bonus_amount_sum,
+            "users_sketch": func.sketch_add(DailyRollup.users_sketch, str(transaction.user_id)),
+        },
+    )
+    await session.execute(stmt)
+
+
+async def get_period_totals(
+    session: AsyncSession,
+    start: datetime | None = None,
+    end: date | None = None,
+    worker_id=None,
+) -> dict:
+    """
+    Итоги по транзакциям за [start, end): полные сутки читаются из daily_rollup,
+    неполные первые сутки скользящего окна — из purchase_history.
+    """
+    rollup_filters = []
+    raw_filters = []
+
+    if start is not None:
+        first_day = start.date()
+        if start != datetime.combine(first_day, time.min):
+            first_day += timedelta(days=1)
+            raw_filters = [
+                PurchaseHistory.transaction_date >= start,
+                PurchaseHistory.transaction_date < datetime.combine(first_day, time.min),
+            ]
+        rollup_filters.append(DailyRollup.date >= first_day)
+    if end is not None:
+        rollup_filters.append(DailyRollup.date < end)
+    if worker_id is not None:
+        rollup_filters.append(DailyRollup.worker_id == str(worker_id))
+
+    totals = {"transactions": 0, "amount": 0.0, "bonus_added": 0.0, "bonus_spent": 0.0}
+    users = UserSketch()
+
+    def account(transaction_type, count, amount, bonus_amount):
+        totals["transactions"] += count or 0
+        totals["amount"] += amount or 0.0
+        if transaction_type == "Пополнение":
+            totals["bonus_added"] += bonus_amount or 0.0
+        elif transaction_type == "Списание":
+            totals["bonus_spent"] += bonus_amount or 0.0
+
+    rollup_rows = await session.execute(
+        select(
+            DailyRollup.transaction_type,
+            DailyRollup.transactions_count,
+            DailyRollup.amount_sum,
+            DailyRollup.bonus_amount_sum,
+            DailyRollup.users_sketch,
+        ).where(*rollup_filters)
+    )
+    for row in rollup_rows:
+        account(row.transaction_type, row.transactions_count, row.amount_sum, row.bonus_amount_sum)
+        users.merge(UserSketch.from_bytes(row.users_sketch))
+
+    if raw_filters:
+        if worker_id is not None:
+            raw_filters.append(PurchaseHistory.worker_id == str(worker_id))
+        raw_rows = await session.execute(
+            select(
+                PurchaseHistory.transaction_type,
+                PurchaseHistory.amount,
+                PurchaseHistory.bonus_amount,
+                PurchaseHistory.user_id,
+            ).where(*raw_filters)
+        )
+        for row in raw_rows:
+            account(row.transaction_type, 1, row.amount, row.bonus_amount)
+            users.add(row.user_id)
+
+    totals["active_users"] = users.estimate()
+    # Пока в скетче точные хэши, число точное; после перехода на HyperLogLog — оценка с погрешностью ~3%
+    totals["active_users_approximate"] = users.hashes is None
+    return totals
+
+
+async def rebuild_daily_rollup_on(conn: AsyncConnection) -> int:
+    """Пересобирает daily_rollup по всей истории покупок. Возвращает количество строк."""
+    day = func.date(PurchaseHistory.transaction_date)
+    group = (day, PurchaseHistory.worker_id, PurchaseHistory.transaction_type)
+
+    await conn.execute(delete(DailyRollup))
+
+    sums = await conn.execute(
+        select(
+            *group,
+            func.count(PurchaseHistory.id),
+            func.sum(PurchaseHistory.amount),
+            func.sum(PurchaseHistory.bonus_amount),
+        ).group_by(*group)
+    )
+    rows = {
+        (day_value, str(worker), transaction_type): (count, amount or 0.0, bonus_amount or 0.0)
+        for day_value, worker, transaction_type, count, amount, bonus_amount in sums
+    }
+
+    sketches = defaultdict(UserSketch)
+    users = await conn.stream(select(*group, PurchaseHistory.user_id).distinct())
+    async for day_value, worker, transaction_type, user_id in users:
+        sketches[(day_value, str(worker), transaction_type)].add(user_id)
+
+    values = [
+        {
+            "date": date.fromisoformat(day_value),
+            "worker_id": worker,
+            "transaction_type": transaction_type,
+            "transactions_count": count,
+            "amount_sum": amount,
+            "bonus_amount_sum": bonus_amount,
+            "users_sketch": sketches[(day_value, worker, transaction_type)].to_bytes(),
+        }
+        for (day_value, worker, transaction_type), (count, amount, bonus_amount) in rows.items()
+    ]
+    if values:
+        await conn.execute(insert(DailyRollup), values)
+    return len(values)
+
+
+async def rebuild_daily_rollup() -> int:
+    async with engine.begin() as conn:
+        return await rebuild_daily_rollup_on(conn)
+
+
+if __name__ == "__main__":
+    # python -m app.database.rollup — ручная пересборка агрегатов по истории
+    count = asyncio.run(rebuild_daily_rollup())
+    print(f"✅ daily_rollup пересобран: {count} строк")
@@ -0,0 +1,56 @@
+from datetime import datetime
+from typing import Iterable
+
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .models import async_session, User
+from app.utils.cache import TTLCache
+
+# Источник истины — users.bot_blocked_at. В памяти помним лишь чаты, которые недавно сверили с БД
+# и нашли доступными, чтобы не ходить в БД на каждое входящее сообщение. Пометку, поставленную
+# другим процессом, снимет первое же сообщение после истечения ttl
+_reachable_chats = TTLCache(maxsize=4096, ttl=60)
+
+
+async def suppress_chats(session: AsyncSession, chat_ids: Iterable) -> None:
+    """Помечает чаты, заблокировавшие бота, в транзакции вызывающего. Рассылки их больше не выбирают."""
+    chat_ids = {str(chat_id) for chat_id in chat_ids}
+    if not chat_ids:
+        return
+
+    await session.execute(
+        update(User)
+        .where(User.user_id.in_(chat_ids), User.bot_blocked_at.is_(None))
+        .values(bot_blocked_at=datetime.now())
+    )
+    for chat_id in chat_ids:
+        _reachable_chats.pop(chat_id)
+
+
+async def mark_chat_blocked(chat_id) -> None:
+    async with async_session() as session:
+        await suppress_chats(session, [chat_id])
+        await session.commit()
+
+
+async def unsuppress_chat(chat_id) -> bool:
+    """Снимает пометку, когда пользователь снова пишет боту. Возвращает True, если пометка была."""
+    chat_id = str(chat_id)
+    if _reachable_chats.get(chat_id, False):
+        return False
+
+    async with async_session() as session:
+        # Обычно пометки нет — обходимся чтением и не берём блокировку на запись
+        blocked_at = await session.scalar(select(User.bot_blocked_at).where(User.user_id == chat_id))
+        unsuppressed = False
+        if blocked_at is not None:
+            result = await session.execute(
+                update(User)
+                .where(User.user_id == chat_id, User.bot_blocked_at.is_not(None))
+                .values(bot_blocked_at=None)
+            )
+            await session.commit()
+            unsuppressed = result.rowcount > 0
+    _reachable_chats.set(chat_id, True)
+    return unsuppressed
@@ -57,7 +57,7 @@ async def statistics(callback: CallbackQuery):
         f"━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━\n\n"
         f"💰 <b>Сумма покупок:</b> {stats['total_amount']} ₽\n\n"
         f"🎁 <b>Сумма выданных бонусов:</b> {stats['total_bonus_amount']} ₽\n\n"
-        f"🟢 <b>Количество пользователей с транзакциями:</b> {stats['active_users']}\n\n"
+        f"🟢 <b>Количество пользователей с транзакциями:</b> {'≈' if stats['active_users_approximate'] else ''}{stats['active_users']}\n\n"
         f"🔄 <b>Количество транзакций:</b> {stats['total_transactions']}\n\n",
         parse_mode="HTML",
         reply_markup=kb.time_period
@@ -82,7 +82,7 @@ async def handle_statistics_period(callback: CallbackQuery):
             f"━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━\n\n"
             f"💰 <b>Сумма покупок:</b> {stats['total_amount']} ₽\n\n"
             f"🎁 <b>Сумма выданных бонусов:</b> {stats['total_bonus_amount']} ₽\n\n"
-            f"🟢 <b>Количество пользователей с транзакциями:</b> {stats['active_users']}\n\n"
+            f"🟢 <b>Количество пользователей с транзакциями:</b> {'≈' if stats['active_users_approximate'] else ''}{stats['active_users']}\n\n"
             f"🔄 <b>Количество транзакций:</b> {stats['total_transactions']}\n\n",
             parse_mode="HTML",
             reply_markup=kb.time_period
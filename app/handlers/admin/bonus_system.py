@@ -7,6 +7,7 @@ from app.database.admin_requests import add_vip_client, remove_vip_client
 from app.handlers.main import admin_router
 import app.database.admin_requests as rq
 import app.database.requests as common_rq
+from app.database.outbox import notification
 import app.keyboards.admin.admin as kb
 from app.handlers.admin.admin import cmd_job
 
@@ -265,7 +266,7 @@ async def handle_amount_input(message: Message, state: FSMContext):
         action = data.get("action")
         await state.clear()
 
-        success = await common_rq.set_bonus_balance(user_id, action, amount, 0, "Администратор")
+        success = await common_rq.set_bonus_balance(user_id, action, amount, 0, "Администратор", reason="admin")
         if success:
             text = "Сумма пользователя была "
             text += "увеличена 📈" if action == 'add' else "уменьшена 📉"
@@ -350,22 +351,21 @@ async def process_gift(message: Message, state: FSMContext):
 
         for user_id in users:
             try:
-                result = await common_rq.set_bonus_balance(user_id, "add", amount, 0, "Администратор")
+                # Уведомление уходит через outbox после коммита начисления
+                result = await common_rq.set_bonus_balance(
+                    user_id, "add", amount, 0, "Администратор", reason="admin",
+                    notifications=[notification(
+                        user_id,
+                        (
+                            f"🎁 <b>Вам начислен бонус!</b>\n\n"
+                            f"▫️ Сумма: <b>{amount}</b> бонусов\n"
+                            f"▫️ Причина: Подарок от администратора\n\n"
+                        ),
+                        parse_mode='HTML'
+                    )]
+                )
                 if result:
-                    try:
-                        await message.bot.send_message(
-                            chat_id=user_id,
-                            text=(
-                                f"🎁 <b>Вам начислен бонус!</b>\n\n"
-                                f"▫️ Сумма: <b>{amount}</b> бонусов\n"
-                                f"▫️ Причина: Подарок от администратора\n\n"
-                            ),
-                            parse_mode='HTML'
-                        )
-                        success_count += 1
-                    except Exception as notify_error:
-                        failed_users.append(f"{user_id} (ошибка уведомления: {str(notify_error)})")
-
+                    success_count += 1
                 else:
                     failed_users.append(str(user_id))
 
@@ -2,12 +2,13 @@ import os
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import StatesGroup, State
 from aiogram import F
-from aiogram.types import Message, CallbackQuery, FSInputFile
+from aiogram.types import Message, CallbackQuery
 from app.handlers.main import admin_router
 from app.handlers.admin.admin import cmd_job, show_control_promotions
 import app.keyboards.admin.admin as kb
 import app.database.admin_requests as rq
 import app.database.requests as c_rq
+from app.utils.media import send_photo_asset
 
 class EditPromotionStates(StatesGroup):
     waiting_full_text = State()
@@ -68,9 +69,10 @@ async def start_edit_promotion(callback: CallbackQuery):
         keyboard = await kb.get_promotion_management(promo_id)
         if promotion.image_path:
             try:
-                photo = FSInputFile(promotion.image_path)
-                await callback.message.answer_photo(
-                    photo=photo,
+                await send_photo_asset(
+                    callback.bot,
+                    callback.message.chat.id,
+                    promotion.image_path,
                     caption=caption,
                     parse_mode='HTML',
                     reply_markup=keyboard
@@ -1,18 +1,19 @@
-import asyncio
+from datetime import datetime
+
 from aiogram import F
-from aiogram.exceptions import TelegramForbiddenError, TelegramBadRequest
 from aiogram.types import Message, CallbackQuery
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import StatesGroup, State
 
-from app.handlers.main import admin_router, user_router
+from app.handlers.main import admin_router, user_router, media_router
 import app.keyboards.admin.admin as kb
 import app.database.admin_requests as rq
 from app.handlers.admin.admin import back_to_main
+import app.database.broadcasts as broadcasts
+from app.utils.broadcast import start_broadcast, update_broadcast_status, build_album
 
 
 class Interaction(StatesGroup):
-    users_list = State()
     text = State()
     photo = State()
 
@@ -43,40 +44,111 @@ async def get_instruction(callback: CallbackQuery):
     )
 
 
+MAILING_SEGMENTS_TEXT = (
+    "👥 <b>Кому отправить рассылку?</b>\n"
+    "━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━\n"
+    "Выберите аудиторию — перед отправкой покажу, сколько человек в неё входит"
+)
+
+
+def describe_segment(segment: str, value) -> str:
+    if segment == "balance":
+        return {"1000": "баланс 1000–5000", "5000": "баланс 5001–10000", "10000": "баланс 10000+"}[value]
+    if segment == "purchase_days":
+        return f"покупали за последние {value} дней"
+    if segment == "vip":
+        return "VIP клиенты"
+    if segment == "cohort":
+        month = datetime.strptime(value, "%Y-%m")
+        return f"зарегистрировались: {kb.MONTHS[month.month - 1]} {month.year}"
+    if segment == "birthday_month":
+        return f"день рождения: {kb.MONTHS[int(value) - 1]}"
+    return "все пользователи"
+
+
 @user_router.callback_query(F.data == 'send_message')
 async def send_message(callback: CallbackQuery, state: FSMContext):
     await callback.answer()
-    users = await rq.get_tg_id_mailing()
+    await state.clear()
+
+    await callback.message.answer(MAILING_SEGMENTS_TEXT, parse_mode='HTML', reply_markup=kb.mailing_segments)
+
+
+@user_router.callback_query(F.data == 'mailingSegments')
+async def show_mailing_segments(callback: CallbackQuery):
+    await callback.answer()
+    await callback.message.edit_text(MAILING_SEGMENTS_TEXT, parse_mode='HTML', reply_markup=kb.mailing_segments)
+
+
+@user_router.callback_query(F.data.startswith('mailingSegmentMenu:'))
+async def show_mailing_segment_values(callback: CallbackQuery):
+    await callback.answer()
+    segment = callback.data.split(':')[1]
+
+    await callback.message.edit_reply_markup(reply_markup=await kb.mailing_segment_values(segment))
+
+
+@user_router.callback_query(F.data.startswith('mailingSegment:'))
+async def preview_mailing_audience(callback: CallbackQuery, state: FSMContext):
+    await callback.answer()
+    _, segment, *rest = callback.data.split(':', 2)
+    value = rest[0] if rest else None
+
+    # В состоянии — только описание аудитории и её размер; получатели выбираются из БД при отправке
+    audience = {"audience": "mailing", "segment": segment, "value": value}
+    users_count = await rq.count_mailing_audience(audience)
+    await state.update_data(audience=audience, users_count=users_count)
+
+    await callback.message.edit_text(
+        f"👥 <b>Аудитория:</b> {describe_segment(segment, value)}\n"
+        f"━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━\n"
+        f"📨 <b>Получателей:</b> {users_count}"
+        + ("" if users_count else "\n\n⚠️ В этот сегмент сейчас никто не входит"),
+        parse_mode='HTML',
+        reply_markup=await kb.mailing_audience_preview(users_count)
+    )
+
+
+@user_router.callback_query(F.data == 'mailingAudienceConfirm')
+async def ask_mailing_text(callback: CallbackQuery, state: FSMContext):
+    await callback.answer()
+
+    if not (await state.get_data()).get('audience'):
+        return await callback.message.edit_text(MAILING_SEGMENTS_TEXT, parse_mode='HTML', reply_markup=kb.mailing_segments)
+
     await callback.message.answer(
         f"✉️ <b>Напишите текст сообщения для рассылки</b>\n\n"
         f"📌 <i>Можно прикрепить фотографии, добавить к ним описание и отформатировать текст</i>\n",
         parse_mode='HTML',
         reply_markup=kb.send_message_keyboard
     )
-    await state.update_data(users_list = users)
     await state.set_state(Interaction.text)
 
-@user_router.message(Interaction.text)
-async def process_message(message: Message, state: FSMContext):
-    user_input = message.text or message.caption or ""
+@media_router.message(Interaction.text)
+async def process_message(message: Message, state: FSMContext, album: list[Message] = None):
+    messages = album or [message]
+    user_input = next((msg.text or msg.caption for msg in messages if msg.text or msg.caption), "")
     user_input = user_input.strip()
 
-    photo_file_id = None
-    if message.photo:
-        photo_file_id = message.photo[-1].file_id
+    # Альбом приходит отдельными сообщениями — middleware собирает их в album
+    photos = [msg.photo[-1].file_id for msg in messages if msg.photo]
+    photo_file_id = photos[0] if len(photos) == 1 else None
+    media = photos if len(photos) > 1 else None
 
     data = await state.get_data()
 
-    await state.update_data(text=user_input, photo=photo_file_id)
+    await state.update_data(text=user_input, photo=photo_file_id, media=media)
 
     await message.answer(
-        f"📢 <b>Вы собираетесь отправить сообщение {len(data['users_list'])} пользователям</b>\n"
+        f"📢 <b>Вы собираетесь отправить сообщение {data['users_count']} пользователям</b>\n"
         f"━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━\n"
         f"📄 <b>Содержание сообщения:</b>",
         parse_mode='HTML'
     )
 
-    if photo_file_id:
+    if media:
+        await message.answer_media_group(media=build_album(media, user_input))
+    elif photo_file_id:
         await message.answer_photo(
             photo=photo_file_id,
             caption=user_input,
@@ -100,53 +172,43 @@ async def confirm_send_message(callback: CallbackQuery, state: FSMContext):
 
     try:
         data = await state.get_data()
-        users_list = data['users_list']
-        text = data['text']
-        photo_file_id = data.get('photo')
-
-        success_count = 0
-        errors = []
-
-        for user_id in users_list:
-            try:
-                if photo_file_id:
-                    await callback.bot.send_photo(
-                        chat_id=user_id,
-                        photo=photo_file_id,
-                        caption=text,
-                        parse_mode='HTML'
-                    )
-                else:
-                    await callback.bot.send_message(
-                        chat_id=user_id,
-                        text=text,
-                        parse_mode='HTML'
-                    )
-                success_count += 1
-            except TelegramForbiddenError:
-                errors.append(f"Пользователь {user_id} заблокировал бота")
-            except TelegramBadRequest as e:
-                errors.append(f"Ошибка при отправке {user_id}: {e.message}")
-            except Exception as e:
-                errors.append(f"Неизвестная ошибка с {user_id}: {str(e)}")
-        report_message = (
-            f"📊 <b>Результаты рассылки</b>\n"
-            f"━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━\n"
-            f"✅ <b>Успешно отправлено:</b> {success_count}/{len(users_list)}\n"
-        )
-
-        if errors:
-            report_message += (
-                f"\n❌ <b>Ошибки ({len(errors)}):</b>\n"
-                f"━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━\n"
-                + "\n".join(f"• {error}" for error in errors[:10])
-            )
-            if len(errors) > 10:
-                report_message += f"\n... и ещё {len(errors) - 10} ошибок"
+        recipients = rq.mailing_audience_query(data['audience'])
 
-        await callback.message.answer(report_message, parse_mode='HTML', reply_markup=kb.delete_button_admin)
+        # Рассылка сохраняется в БД и идёт в фоне; прогресс, управление и итоги — в одном сообщении
+        job = await broadcasts.create_broadcast_job(callback.from_user.id, data['text'], data.get('photo'), recipients, media=data.get('media'))
+        status = await callback.message.answer(
+            f"⏳ <b>Рассылка #{job.id} запущена:</b> 0/{job.total}",
+            parse_mode='HTML',
+            reply_markup=await kb.broadcast_controls(job.id, job.status)
+        )
+        await broadcasts.set_broadcast_status_message(job.id, status.message_id)
+        start_broadcast(callback.bot, job.id)
     except Exception as e:
         await callback.message.answer(f"❌ Произошла критическая ошибка: {str(e)}")
     finally:
         await state.clear()
-        await back_to_main(callback)
\ No newline at end of file
+        await back_to_main(callback)
+
+
+@admin_router.callback_query(F.data.startswith('broadcast:'))
+async def control_broadcast(callback: CallbackQuery):
+    _, action, job_id = callback.data.split(':')
+    job_id = int(job_id)
+
+    if action == 'pause':
+        changed = await broadcasts.set_broadcast_job_status(job_id, 'paused', allowed_from=('running',))
+        await callback.answer("⏸ Рассылка будет приостановлена" if changed else "Рассылка уже не выполняется")
+    elif action == 'resume':
+        changed = await broadcasts.set_broadcast_job_status(job_id, 'running', allowed_from=('paused',))
+        if changed:
+            start_broadcast(callback.bot, job_id)
+        await callback.answer("▶️ Рассылка продолжена" if changed else "Рассылка не на паузе")
+    elif action == 'cancel':
+        changed = await broadcasts.set_broadcast_job_status(job_id, 'cancelled', allowed_from=('running', 'paused'))
+        await callback.answer("⏹ Рассылка отменена" if changed else "Рассылка уже завершена")
+    else:
+        return await callback.answer()
+
+    job = await broadcasts.get_broadcast_job(job_id)
+    if job:
+        await update_broadcast_status(callback.bot, job)
@@ -1,2 +1,2 @@
 from .storage_cells import *
-from . import catalog, catalog_edit, close_work_day, employee
\ No newline at end of file
+from . import catalog, catalog_edit, close_work_day, employee, batch_transactions
\ No newline at end of file
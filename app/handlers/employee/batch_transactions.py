@@ -0,0 +1,241 @@
+import csv
+import io
+from types import SimpleNamespace
+from uuid import uuid4
+
+from aiogram import F
+from aiogram.fsm.context import FSMContext
+from aiogram.types import CallbackQuery, Message
+
+from ..main import employee_router
+from app.utils.states import BatchTransactionStates
+from app.handlers.employee.employee import build_channel_report, build_customer_notifications, employee_display_name
+import app.keyboards.employee.employee as kb
+import app.database.requests as rq
+
+MAX_BATCH_LINES = 50
+MAX_CSV_SIZE = 64 * 1024
+ACTIONS = {"add": "add", "remove": "remove", "+": "add", "-": "remove"}
+HEADER_NAMES = (
+    {"suffix", "суффикс", "phone", "телефон"},
+    {"amount", "сумма"},
+    {"action", "действие"},
+)
+
+
+def is_header_row(cells: list[str]) -> bool:
+    """Строка — заголовок CSV, только если каждая ячейка совпадает с ожидаемым названием колонки."""
+    return 2 <= len(cells) <= len(HEADER_NAMES) and all(
+        cell.lower() in names for cell, names in zip(cells, HEADER_NAMES)
+    )
+
+
+def parse_batch_rows(rows: list[list[str]]) -> tuple[list[dict], list[str]]:
+    """Строки вида [суффикс, сумма, действие?] -> записи пакета и список ошибок по номерам строк."""
+    entries, errors = [], []
+
+    for line_no, cells in enumerate(rows, start=1):
+        cells = [cell.strip() for cell in cells if cell.strip()]
+        if not cells:
+            continue
+        # Заголовок CSV пропускаем; опечатка в первой строке проходит обычную проверку и попадает в ошибки
+        if line_no == 1 and is_header_row(cells):
+            continue
+
+        if len(cells) not in (2, 3):
+            errors.append(f"строка {line_no}: ожидается «суффикс сумма [add|remove]»")
+            continue
+
+        suffix, amount_text = cells[0], cells[1]
+        action = ACTIONS.get(cells[2].lower() if len(cells) == 3 else "add")
+
+        if not suffix.isdigit() or len(suffix) != 4:
+            errors.append(f"строка {line_no}: суффикс телефона — ровно 4 цифры")
+            continue
+        try:
+            amount = float(amount_text.replace(",", "."))
+        except ValueError:
+            amount = 0
+        if amount <= 0:
+            errors.append(f"строка {line_no}: сумма должна быть положительным числом")
+            continue
+        if action is None:
+            errors.append(f"строка {line_no}: действие — add или remove")
+            continue
+
+        entries.append({"line": line_no, "suffix": suffix, "amount": amount, "action": action})
+
+    return entries, errors
+
+
+async def read_batch_rows(message: Message) -> list[list[str]]:
+    if message.document:
+        buffer = await message.bot.download(message.document)
+        content = buffer.read().decode("utf-8-sig")
+        delimiter = ";" if ";" in content.split("\n", 1)[0] else ","
+        return list(csv.reader(io.StringIO(content), delimiter=delimiter))
+    return [line.split() for line in message.text.splitlines()]
+
+
+@employee_router.message(F.text == '📑 Пакетный ввод')
+async def start_batch(message: Message, state: FSMContext):
+    await state.clear()
+    await message.answer(
+        "📑 <b>Пакетный ввод транзакций</b>\n"
+        "━━━━━━━━━━━━━━━━\n"
+        "Отправьте строки в формате:\n"
+        "<code>суффикс сумма [add|remove]</code>\n\n"
+        "Например:\n"
+        "<code>1234 1500\n"
+        "5678 3200 remove</code>\n\n"
+        f"Или загрузите CSV-файл с теми же колонками (до {MAX_BATCH_LINES} строк).\n"
+        "<i>Для выхода нажмите <b>'отмена'</b></i>",
+        parse_mode='HTML'
+    )
+    await state.set_state(BatchTransactionStates.waiting_lines)
+
+
+@employee_router.message(BatchTransactionStates.waiting_lines, F.text | F.document)
+async def handle_batch_lines(message: Message, state: FSMContext):
+    if message.text and "отмена" in message.text.lower():
+        await state.clear()
+        return await message.answer("❌ <b>Пакетный ввод отменён</b>", parse_mode='HTML')
+
+    if message.document and (message.document.file_size or 0) > MAX_CSV_SIZE:
+        return await message.answer("⚠️ <b>Файл слишком большой</b>", parse_mode='HTML')
+
+    try:
+        entries, errors = parse_batch_rows(await read_batch_rows(message))
+    except (UnicodeDecodeError, csv.Error):
+        return await message.answer("⚠️ <b>Не удалось прочитать файл.</b> Нужен CSV в кодировке UTF-8.", parse_mode='HTML')
+
+    if len(entries) > MAX_BATCH_LINES:
+        return await message.answer(
+            f"⚠️ <b>Слишком много строк:</b> {len(entries)}. Максимум — {MAX_BATCH_LINES}.",
+            parse_mode='HTML'
+        )
+
+    # Все клиенты — одним запросом, настройки — из кэша
+    customers = await rq.get_batch_transaction_context([entry["suffix"] for entry in entries])
+    settings = await rq.get_bonus_system_settings()
+
+    batch = []
+    balances = {}
+    for entry in entries:
+        matches = customers.get(entry["suffix"], [])
+        if not matches:
+            errors.append(f"строка {entry['line']}: клиент с номером на {entry['suffix']} не найден")
+            continue
+        if len(matches) > 1:
+            errors.append(f"строка {entry['line']}: несколько клиентов с номером на {entry['suffix']}, проведите отдельно")
+            continue
+
+        customer = matches[0]
+        balance = balances.setdefault(customer["user_id"], customer["balance"])
+        if entry["action"] == "add":
+            cashback = settings["vip_cashback"] if customer["is_vip"] else settings["cashback"]
+            amount_bonus = entry["amount"] * cashback / 100
+            balances[customer["user_id"]] = balance + amount_bonus
+        else:
+            # Как и в обычном сценарии: не больше max_debit% от покупки и не больше остатка на балансе
+            amount_bonus = min(balance, entry["amount"] * settings["max_debit"] / 100)
+            balances[customer["user_id"]] = balance - amount_bonus
+
+        batch.append({
+            "user_id": customer["user_id"],
+            "name": customer["name"],
+            "mobile_phone": customer["mobile_phone"],
+            "can_vote": customer["can_vote"],
+            "action": entry["action"],
+            "amount": entry["amount"],
+            "amount_bonus": round(amount_bonus, 2),
+        })
+
+    text = "📑 <b>Предпросмотр пакета</b>\n━━━━━━━━━━━━━━━━\n"
+    for index, item in enumerate(batch, start=1):
+        if item["action"] == "add":
+            text += f"{index}. {item['name']} ({item['mobile_phone']}): покупка {item['amount']:.2f} руб., ❇️ +{item['amount_bonus']:.2f}\n"
+        else:
+            text += f"{index}. {item['name']} ({item['mobile_phone']}): покупка {item['amount']:.2f} руб., ⛔️ −{item['amount_bonus']:.2f}\n"
+    if errors:
+        text += "\n⚠️ <b>Пропущены строки:</b>\n" + "\n".join(f"▫️ {error}" for error in errors[:10])
+        if len(errors) > 10:
+            text += f"\n... и ещё {len(errors) - 10}"
+
+    if not batch:
+        return await message.answer(text + "\n\n❌ <b>Нет строк для проведения.</b> Исправьте ввод и отправьте снова.", parse_mode='HTML')
+
+    await state.update_data(batch=batch, batch_id=uuid4().hex)
+    await state.set_state(BatchTransactionStates.confirm)
+    await message.answer(text, parse_mode='HTML', reply_markup=kb.confirm_batch)
+
+
+@employee_router.callback_query(BatchTransactionStates.confirm, F.data.startswith("batch:"))
+async def confirm_batch(callback: CallbackQuery, state: FSMContext):
+    await callback.answer()
+
+    if callback.data == "batch:cancel":
+        await state.clear()
+        return await callback.message.edit_text("❌ <b>Пакет отменён</b>", parse_mode='HTML')
+
+    data = await state.get_data()
+    batch = data.get("batch") or []
+    employee = await rq.get_user_by_tg_id(callback.from_user.id)
+    employee_name = employee_display_name(employee.name if employee else None, callback.from_user)
+    settings = await rq.get_bonus_system_settings()
+
+    notifications = []
+    invited = set()
+    for item in batch:
+        customer = SimpleNamespace(user_id=item["user_id"], name=item["name"], mobile_phone=item["mobile_phone"])
+        is_add = item["action"] == "add"
+        notifications.append(build_channel_report(
+            transaction_type=item["action"],
+            user_data=customer,
+            employee_id=callback.from_user.id,
+            employee_name=employee_name,
+            amount=item["amount"] if is_add else item["amount"] - item["amount_bonus"],
+            bonus_amount=item["amount_bonus"]
+        ))
+        notifications.extend(build_customer_notifications(
+            chat_id=item["user_id"],
+            text=(
+                (f"<b>🎉 Вам начислено {item['amount_bonus']:.2f} бонусов!</b>\n" if is_add
+                 else f"<b>❌ У вас списано {item['amount_bonus']:.2f} бонусов!</b>\n")
+                + f"💰 За покупку на сумму <b>{item['amount']} руб.</b>\n\n"
+                f"👇 <b>Оцените работу нашего сотрудника прямо сейчас!</b> 👇"
+            ),
+            # Приглашение в акцию — не больше одного на клиента в пакете
+            voting_bonus=settings["voting_bonus"] if item["can_vote"] and item["user_id"] not in invited else None
+        ))
+        invited.add(item["user_id"])
+
+    try:
+        success = await rq.set_bonus_balances_batch(
+            batch, callback.from_user.id, notifications=notifications, idempotency_key=data.get("batch_id")
+        )
+    except Exception as e:
+        # Транзакция откатилась целиком; состояние сохраняем, чтобы пакет можно было подтвердить ещё раз
+        print(f"⚠️ Ошибка при проведении пакета {data.get('batch_id')}: {e}")
+        return await callback.message.answer(
+            "❗️ <b>Пакет не проведён</b> — ни одна транзакция не записана. Попробуйте подтвердить ещё раз.",
+            parse_mode='HTML'
+        )
+    if success is None:
+        await state.clear()
+        return await callback.message.edit_text("⏳ <b>Этот пакет уже проведён</b>", parse_mode='HTML')
+    if not success:
+        return await callback.message.answer(
+            "❗️ <b>Пакет не проведён</b> — ни одна транзакция не записана. Проверьте данные и попробуйте снова.",
+            parse_mode='HTML'
+        )
+
+    await state.clear()
+    added = sum(item["amount_bonus"] for item in batch if item["action"] == "add")
+    removed = sum(item["amount_bonus"] for item in batch if item["action"] == "remove")
+    await callback.message.edit_text(
+        f"✅ <b>Проведено транзакций: {len(batch)}</b>\n"
+        f"❇️ Начислено: {added:.2f}\n"
+        f"⛔️ Списано: {removed:.2f}",
+        parse_mode='HTML'
+    )
@@ -1,4 +1,7 @@
-from aiogram import F, Bot
+import html
+from uuid import uuid4
+
+from aiogram import F
 from aiogram.filters import Command
 from aiogram.fsm.context import FSMContext
 from aiogram.types import Message, CallbackQuery
@@ -6,6 +9,7 @@ from aiogram.fsm.state import StatesGroup, State
 
 from config import CHANNEL_ID
 from app.handlers.main import employee_router
+from app.database.outbox import notification
 import app.keyboards.employee.employee as kb
 import app.database.requests as rq
 
@@ -185,7 +189,8 @@ async def handle_action_selection(callback: CallbackQuery, state: FSMContext):
     data = await state.get_data()
     phone_number = data.get("phone_number")
 
-    await state.update_data(select_action=action)
+    # Один ключ на сценарий: повторное нажатие или повторная доставка апдейта не проведут транзакцию дважды
+    await state.update_data(select_action=action, transaction_id=uuid4().hex)
 
     if action == 'add':
         await callback.message.edit_text(
@@ -231,11 +236,18 @@ async def handle_amount_input(message: Message, state: FSMContext):
     data = await state.get_data()
     phone_number = data.get("phone_number")
     action = data.get("select_action")
-    bonus_balance = data.get("bonus_balance")
 
-    current_bonus_settings = await rq.get_bonus_system_settings()
-    check_vip_client = await rq.check_vip_client(phone_number)
-    if check_vip_client:
+    context = await rq.get_transaction_context(phone_number, message.from_user.id)
+
+    if not context:
+        await message.answer("⚠️ <b>Профиль пользователя не найден.</b>", parse_mode='HTML')
+        await state.clear()
+        return
+
+    user_data = context["user"]
+    bonus_balance = context["balance"]
+    current_bonus_settings = context["settings"]
+    if context["is_vip"]:
         cashback = current_bonus_settings["vip_cashback"]/100
     else:
         cashback = current_bonus_settings["cashback"]/100
@@ -243,56 +255,42 @@ async def handle_amount_input(message: Message, state: FSMContext):
 
     await state.update_data(amount=amount, cashback=cashback, max_debit=max_debit)
 
-    user_data = await rq.get_user_by_phone(phone_number)
-
-    if not user_data:
-        await message.answer("⚠️ <b>Профиль пользователя не найден.</b>", parse_mode='HTML')
-        await state.clear()
-        return
-
     if action == 'add':
         amount_bonus = amount * cashback
-        success = await rq.set_bonus_balance(user_data.user_id, "add", amount_bonus, amount, message.from_user.id)
-        if success:
-            await state.clear()
-
-            await send_report_to_channel(
-                bot=message.bot,
+        notifications = [
+            build_channel_report(
                 transaction_type=action,
                 user_data=user_data,
                 employee_id=message.from_user.id,
+                employee_name=employee_display_name(context["employee_name"], message.from_user),
                 amount=amount,
                 bonus_amount=amount_bonus
-            )
-
-            await message.answer(
-                f"🎉 <b>Начислено {amount_bonus:.2f} бонусов</b> пользователю {user_data.name} 🎁",
-                parse_mode='HTML',
-                reply_markup=kb.main_menu
-            )
-            await message.bot.send_message(
+            ),
+            *build_customer_notifications(
                 chat_id=user_data.user_id,
                 text=(
                     f"<b>🎉 Вам начислено {amount_bonus:.2f} бонусов!</b>\n"
                     f"💰 За покупку на сумму <b>{amount} руб.</b>\n\n"
                     f"👇 <b>Оцените работу нашего сотрудника прямо сейчас!</b> 👇"
                 ),
-                reply_markup=kb.assessment,
-                parse_mode='HTML'
+                voting_bonus=context["settings"]["voting_bonus"] if context["can_vote"] else None
+            )
+        ]
+        success = await rq.set_bonus_balance(
+            user_data.user_id, "add", amount_bonus, amount, message.from_user.id, notifications=notifications,
+            idempotency_key=data.get("transaction_id") or f"message:{message.chat.id}:{message.message_id}"
+        )
+        if success is None:
+            await state.clear()
+            await message.answer("⏳ <b>Эта транзакция уже проведена</b>", parse_mode='HTML', reply_markup=kb.main_menu)
+        elif success:
+            await state.clear()
+
+            await message.answer(
+                f"🎉 <b>Начислено {amount_bonus:.2f} бонусов</b> пользователю {user_data.name} 🎁",
+                parse_mode='HTML',
+                reply_markup=kb.main_menu
             )
-            check_vote_status = await rq.get_user_vote_history(user_data.user_id)
-            if check_vote_status:
-                bonus_system = await rq.get_bonus_system_settings()
-                await message.bot.send_message(
-                    chat_id=user_data.user_id,
-                    text=(
-                        "🎉 <b>У нас действует акция!</b> 🎉\n\n"
-                        f"💎 <b>За каждый положительный отзыв</b> мы начисляем <b>{bonus_system['voting_bonus']} бонусов</b> на ваш баланс!\n"
-                        "🔥 <b>Не упустите шанс получить больше!</b>"
-                    ),
-                    reply_markup=kb.approved_voting,
-                    parse_mode='HTML'
-                )
         else:
             await message.answer(
                 "⚠️ <b>Возникла ошибка при зачислении бонусов</b> 😞",
@@ -332,56 +330,52 @@ async def confirm_deduction(callback: CallbackQuery, state: FSMContext):
     bonus_deduction = data.get("bonus_deduction")
     amount = data.get("amount")
     cashback = data.get("cashback")
+    transaction_id = data.get("transaction_id") or f"callback:{callback.id}"
 
-    user_data = await rq.get_user_by_phone(phone_number)
+    context = await rq.get_transaction_context(phone_number, callback.from_user.id)
 
-    if not user_data:
+    if not context:
         await callback.message.answer("⚠️ <b>Профиль пользователя не найден.</b>", parse_mode='HTML')
         await state.clear()
         await callback.answer()
         return
 
+    user_data = context["user"]
+
     if action == 'no':
         amount_bonus = amount * cashback
-        success = await rq.set_bonus_balance(user_data.user_id, "add", amount_bonus, amount, callback.from_user.id)
-        if success:
-
-            await send_report_to_channel(
-                bot=callback.bot,
+        notifications = [
+            build_channel_report(
                 transaction_type="add",
                 user_data=user_data,
                 employee_id=callback.from_user.id,
+                employee_name=employee_display_name(context["employee_name"], callback.from_user),
                 amount=amount,
                 bonus_amount=amount_bonus
-            )
-
-            await callback.message.edit_text(
-                f"🎉 <b>Начислено {amount_bonus:.2f} бонусов</b> пользователю {user_data.name}",
-                parse_mode='HTML'
-            )
-            await callback.bot.send_message(
+            ),
+            *build_customer_notifications(
                 chat_id=user_data.user_id,
                 text=(
                     f"<b>🎉 Вам начислено {amount_bonus:.2f} бонусов!</b>\n"
                     f"💰 За покупку на сумму <b>{amount} руб.</b>\n\n"
                     f"👇 <b>Оцените работу нашего сотрудника прямо сейчас!</b> 👇"
                 ),
-                reply_markup=kb.assessment,
+                voting_bonus=context["settings"]["voting_bonus"] if context["can_vote"] else None
+            )
+        ]
+        success = await rq.set_bonus_balance(
+            user_data.user_id, "add", amount_bonus, amount, callback.from_user.id, notifications=notifications,
+            idempotency_key=transaction_id
+        )
+        if success is None:
+            await state.clear()
+            await callback.message.answer("⏳ <b>Эта транзакция уже проведена</b>", parse_mode='HTML')
+            return
+        if success:
+            await callback.message.edit_text(
+                f"🎉 <b>Начислено {amount_bonus:.2f} бонусов</b> пользователю {user_data.name}",
                 parse_mode='HTML'
             )
-            check_vote_status = await rq.get_user_vote_history(user_data.user_id)
-            if check_vote_status:
-                bonus_system = await rq.get_bonus_system_settings()
-                await callback.bot.send_message(
-                    chat_id=user_data.user_id,
-                    text=(
-                        "🎉 <b>У нас действует акция!</b> 🎉\n\n"
-                        f"💎 <b>За каждый положительный отзыв</b> мы начисляем <b>{bonus_system['voting_bonus']} бонусов</b> на ваш баланс!\n"
-                        "🔥 <b>Не упустите шанс получить больше!</b>"
-                    ),
-                    reply_markup=kb.approved_voting,
-                    parse_mode='HTML'
-                )
             await state.clear()
 
             await callback_employee(callback)
@@ -391,46 +385,39 @@ async def confirm_deduction(callback: CallbackQuery, state: FSMContext):
                 parse_mode='HTML'
             )
     else:
-        success = await rq.set_bonus_balance(user_data.user_id, "remove", bonus_deduction, amount, callback.from_user.id)
-        if success:
-            report_amount = amount-bonus_deduction
-            await send_report_to_channel(
-                bot=callback.bot,
+        notifications = [
+            build_channel_report(
                 transaction_type="remove",
                 user_data=user_data,
                 employee_id=callback.from_user.id,
-                amount=report_amount,
+                employee_name=employee_display_name(context["employee_name"], callback.from_user),
+                amount=amount - bonus_deduction,
                 bonus_amount=bonus_deduction
-            )
-
-            await callback.message.edit_text(
-                f"💳 <b>Списано {bonus_deduction:.2f} бонусов</b> с аккаунта пользователя {user_data.name}\n"
-                f"💰 <b>Итоговая цена для клиента:</b> {amount - bonus_deduction}",
-                parse_mode='HTML'
-            )
-            await callback.bot.send_message(
+            ),
+            *build_customer_notifications(
                 chat_id=user_data.user_id,
                 text=(
                     f"<b>❌ У вас списано {bonus_deduction:.2f} бонусов!</b>\n"
                     f"💳 За покупку на сумму <b>{amount} руб.</b>\n\n"
                     f"👇 <b>Оцените работу нашего сотрудника прямо сейчас!</b> 👇"
                 ),
-                reply_markup=kb.assessment,
+                voting_bonus=context["settings"]["voting_bonus"] if context["can_vote"] else None
+            )
+        ]
+        success = await rq.set_bonus_balance(
+            user_data.user_id, "remove", bonus_deduction, amount, callback.from_user.id, notifications=notifications,
+            idempotency_key=transaction_id
+        )
+        if success is None:
+            await state.clear()
+            await callback.message.answer("⏳ <b>Эта транзакция уже проведена</b>", parse_mode='HTML')
+            return
+        if success:
+            await callback.message.edit_text(
+                f"💳 <b>Списано {bonus_deduction:.2f} бонусов</b> с аккаунта пользователя {user_data.name}\n"
+                f"💰 <b>Итоговая цена для клиента:</b> {amount - bonus_deduction}",
                 parse_mode='HTML'
             )
-            check_vote_status = await rq.get_user_vote_history(user_data.user_id)
-            if check_vote_status:
-                bonus_system = await rq.get_bonus_system_settings()
-                await callback.bot.send_message(
-                    chat_id=user_data.user_id,
-                    text=(
-                        "🎉 <b>У нас действует акция!</b> 🎉\n\n"
-                        f"💎 <b>За каждый положительный отзыв</b> мы начисляем <b>{bonus_system['voting_bonus']} бонусов</b> на ваш баланс!\n"
-                        "🔥 <b>Не упустите шанс получить больше!</b>"
-                    ),
-                    reply_markup=kb.approved_voting,
-                    parse_mode='HTML'
-                )
             await state.clear()
 
             await callback_employee(callback)
@@ -440,18 +427,38 @@ async def confirm_deduction(callback: CallbackQuery, state: FSMContext):
                 parse_mode='HTML'
             )
 
-async def send_report_to_channel(
-        bot: Bot,
+def build_customer_notifications(chat_id, text: str, voting_bonus: int | None = None) -> list[dict]:
+    """Уведомление клиента о транзакции и, если он ещё не оставлял отзыв, приглашение в акцию."""
+    notifications = [notification(chat_id, text, reply_markup=kb.assessment, parse_mode='HTML')]
+    if voting_bonus is not None:
+        notifications.append(notification(
+            chat_id,
+            (
+                "🎉 <b>У нас действует акция!</b> 🎉\n\n"
+                f"💎 <b>За каждый положительный отзыв</b> мы начисляем <b>{voting_bonus} бонусов</b> на ваш баланс!\n"
+                "🔥 <b>Не упустите шанс получить больше!</b>"
+            ),
+            reply_markup=kb.approved_voting,
+            parse_mode='HTML'
+        ))
+    return notifications
+
+
+def employee_display_name(employee_name, from_user) -> str:
+    """Имя сотрудника для отчёта: из профиля, иначе имя в Telegram или id."""
+    return employee_name or html.escape(from_user.full_name) or str(from_user.id)
+
+
+def build_channel_report(
         transaction_type,
         user_data,
         employee_id,
+        employee_name,
         amount,
         bonus_amount
-):
-    employee_data = await rq.get_user_by_tg_id(employee_id)
-
+) -> dict:
     user_profile_link = f'<a href="tg://user?id={user_data.user_id}">{user_data.name}</a>'
-    employee_profile_link = f'<a href="tg://user?id={employee_id}">{employee_data.name}</a>'
+    employee_profile_link = f'<a href="tg://user?id={employee_id}">{employee_name}</a>'
 
     if transaction_type == "add":
         message_text = (
@@ -474,9 +481,4 @@ async def send_report_to_channel(
             f"🔹<b>Мастер:</b> {employee_profile_link}"
         )
 
-    await bot.send_message(
-        chat_id=CHANNEL_ID,
-        text=message_text,
-        parse_mode='HTML',
-        disable_web_page_preview=True
-    )
\ No newline at end of file
+    return notification(CHANNEL_ID, message_text, parse_mode='HTML', disable_web_page_preview=True)
\ No newline at end of file
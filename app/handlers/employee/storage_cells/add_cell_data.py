@@ -1,7 +1,7 @@
 import os
 
 from aiogram import F
-from aiogram.types import Message, CallbackQuery, FSInputFile
+from aiogram.types import Message, CallbackQuery, FSInputFile, InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.fsm.context import FSMContext
 from datetime import datetime, date
 
@@ -10,6 +10,7 @@ from app.utils.states import StorageCellStates
 import app.keyboards.employee.storage_cells.add_cell_data as kb
 import app.database.StorageCellsService as storage_service
 import app.database.requests as rq
+from app.database.outbox import notification
 from app.utils.func import update_message_ids_in_state, delete_message_in_state
 from app.utils.word import generate_storage_word_document
 
@@ -260,8 +261,33 @@ async def finish_photo_collection(callback: CallbackQuery, state: FSMContext):
 
     meta_data = {"photos": photos}
 
+    # Файл будет отправлен только после подтверждения клиента
+    # Запрос подтверждения пользователю пишется в outbox вместе с резервированием ячейки
+    cell_value = getattr(await storage_service.get_cell(cell_id), 'value', None) or cell_id
+    months_ru = ["Январь", "Февраль", "Март", "Апрель", "Май", "Июнь", "Июль", "Август", "Сентябрь", "Октябрь",
+                 "Ноябрь", "Декабрь"]
+    scheduled_date_ru = f"{months_ru[scheduled_month.month - 1]} {scheduled_month.year}"
+    confirmation_text = (
+        f"📦 <b>Подтверждение сдачи шин на хранение</b>\n\n"
+        f"Ячейка №{cell_value}\n"
+        f"Тип: {storage_type}\n"
+        f"Описание: {description or 'Отсутствует'}\n"
+        f"Цена: {int(price):,} ₽\n"
+        f"Срок хранения: до {scheduled_date_ru}\n\n"
+        f"Подтвердите сдачу шин на хранение:"
+    )
+
+    def confirmation_request(cell_storage) -> list[dict]:
+        confirmation_keyboard = InlineKeyboardMarkup(inline_keyboard=[
+            [
+                InlineKeyboardButton(text="✅ Подтвердить", callback_data=f"storage_confirm_handover:{cell_storage.id}:yes"),
+                InlineKeyboardButton(text="❌ Отклонить", callback_data=f"storage_confirm_handover:{cell_storage.id}:no")
+            ]
+        ])
+        return [notification(user_data.user_id, confirmation_text, parse_mode="HTML", reply_markup=confirmation_keyboard)]
+
     # Сохраняем в базу с резервированием (action_type="handover", confirmation_status="pending")
-    cell_storage = await storage_service.save_or_update_cell_storage(
+    await storage_service.save_or_update_cell_storage(
         cell_id=cell_id,
         worker_id=worker_data.id,
         user_id=user_data.id,
@@ -271,42 +297,10 @@ async def finish_photo_collection(callback: CallbackQuery, state: FSMContext):
         scheduled_month=scheduled_month,
         meta_data=meta_data,
         action_type="handover",
-        confirmation_status="pending"
+        confirmation_status="pending",
+        notifications=confirmation_request
     )
 
-    # Файл будет отправлен только после подтверждения клиента
-    # Отправляем запрос подтверждения пользователю
-    try:
-        user_tg_id = int(user_data.user_id)
-        cell_value = getattr(await storage_service.get_cell(cell_id), 'value', None) or cell_id
-        months_ru = ["Январь", "Февраль", "Март", "Апрель", "Май", "Июнь", "Июль", "Август", "Сентябрь", "Октябрь",
-                     "Ноябрь", "Декабрь"]
-        scheduled_date_ru = f"{months_ru[scheduled_month.month - 1]} {scheduled_month.year}"
-        confirmation_text = (
-            f"📦 <b>Подтверждение сдачи шин на хранение</b>\n\n"
-            f"Ячейка №{cell_value}\n"
-            f"Тип: {storage_type}\n"
-            f"Описание: {description or 'Отсутствует'}\n"
-            f"Цена: {int(price):,} ₽\n"
-            f"Срок хранения: до {scheduled_date_ru}\n\n"
-            f"Подтвердите сдачу шин на хранение:"
-        )
-        from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
-        confirmation_keyboard = InlineKeyboardMarkup(inline_keyboard=[
-            [
-                InlineKeyboardButton(text="✅ Подтвердить", callback_data=f"storage_confirm_handover:{cell_storage.id}:yes"),
-                InlineKeyboardButton(text="❌ Отклонить", callback_data=f"storage_confirm_handover:{cell_storage.id}:no")
-            ]
-        ])
-        await callback.bot.send_message(
-            chat_id=user_tg_id,
-            text=confirmation_text,
-            parse_mode="HTML",
-            reply_markup=confirmation_keyboard
-        )
-    except Exception as e:
-        print(f"⚠️ Ошибка при отправке запроса подтверждения пользователю: {e}")
-
     await delete_message_in_state(callback.bot, state, callback.from_user.id)
     await state.clear()
 
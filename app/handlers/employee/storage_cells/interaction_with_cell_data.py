@@ -1,7 +1,7 @@
 import os
 
 from aiogram import F
-from aiogram.types import CallbackQuery, FSInputFile
+from aiogram.types import CallbackQuery, FSInputFile, InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.fsm.context import FSMContext
 from datetime import datetime, date
 
@@ -10,6 +10,7 @@ from app.utils.states import StorageCellStates
 import app.keyboards.employee.storage_cells.interaction_with_cell_data as kb
 import app.database.StorageCellsService as storage_service
 import app.database.requests as rq
+from app.database.outbox import notification
 from app.utils.word import generate_storage_word_document
 from app.utils.func import delete_message_in_state
 
@@ -175,7 +176,34 @@ async def pickup_storage_cell(callback: CallbackQuery, state: FSMContext):
     
     storage = cell.cell_storage
     
+    user_data = await rq.get_user_by_id(storage.user_id)
+    cell_value = getattr(cell, 'value', None) or cell_id
+    months_ru = ["Январь", "Февраль", "Март", "Апрель", "Май", "Июнь", "Июль", "Август", "Сентябрь", "Октябрь",
+                 "Ноябрь", "Декабрь"]
+    scheduled_date = f"{months_ru[storage.scheduled_month.month - 1]} {storage.scheduled_month.year}"
+    price_str = f"{int(storage.price):,}".replace(",", " ")
+
+    confirmation_text = (
+        f"📤 <b>Подтверждение получения шин</b>\n\n"
+        f"Ячейка №{cell_value}\n"
+        f"Тип: {storage.storage_type}\n"
+        f"Описание: {storage.description or 'Отсутствует'}\n"
+        f"Цена: {price_str} ₽\n"
+        f"Срок хранения: до {scheduled_date}\n\n"
+        f"Подтвердите получение шин:"
+    )
+
+    def confirmation_request(cell_storage) -> list[dict]:
+        confirmation_keyboard = InlineKeyboardMarkup(inline_keyboard=[
+            [
+                InlineKeyboardButton(text="✅ Подтвердить", callback_data=f"storage_confirm_pickup:{cell_storage.id}:yes"),
+                InlineKeyboardButton(text="❌ Отклонить", callback_data=f"storage_confirm_pickup:{cell_storage.id}:no")
+            ]
+        ])
+        return [notification(user_data.user_id, confirmation_text, parse_mode="HTML", reply_markup=confirmation_keyboard)]
+
     # Обновляем статус на pending для получения
+    # Запрос подтверждения пользователю пишется в outbox той же транзакцией
     await storage_service.save_or_update_cell_storage(
         cell_id=cell_id,
         worker_id=storage.worker_id,
@@ -186,50 +214,16 @@ async def pickup_storage_cell(callback: CallbackQuery, state: FSMContext):
         scheduled_month=storage.scheduled_month,
         meta_data=storage.meta_data,
         action_type="pickup",
-        confirmation_status="pending"
+        confirmation_status="pending",
+        notifications=confirmation_request
+    )
+
+    await callback.message.edit_text(
+        f"✅ <b>Запрос на получение шин отправлен клиенту</b>\n\n"
+        f"Ожидается подтверждение от клиента.",
+        parse_mode="HTML",
+        reply_markup=kb.generate_simple_keyboard("Назад", f"storage_cell:{cell_id}")
     )
-    
-    # Отправляем запрос подтверждения пользователю
-    try:
-        user_data = await rq.get_user_by_id(storage.user_id)
-        user_tg_id = int(user_data.user_id)
-        cell_value = getattr(cell, 'value', None) or cell_id
-        months_ru = ["Январь", "Февраль", "Март", "Апрель", "Май", "Июнь", "Июль", "Август", "Сентябрь", "Октябрь",
-                     "Ноябрь", "Декабрь"]
-        scheduled_date = f"{months_ru[storage.scheduled_month.month - 1]} {storage.scheduled_month.year}"
-        price_str = f"{int(storage.price):,}".replace(",", " ")
-        
-        confirmation_text = (
-            f"📤 <b>Подтверждение получения шин</b>\n\n"
-            f"Ячейка №{cell_value}\n"
-            f"Тип: {storage.storage_type}\n"
-            f"Описание: {storage.description or 'Отсутствует'}\n"
-            f"Цена: {price_str} ₽\n"
-            f"Срок хранения: до {scheduled_date}\n\n"
-            f"Подтвердите получение шин:"
-        )
-        from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
-        confirmation_keyboard = InlineKeyboardMarkup(inline_keyboard=[
-            [
-                InlineKeyboardButton(text="✅ Подтвердить", callback_data=f"storage_confirm_pickup:{storage.id}:yes"),
-                InlineKeyboardButton(text="❌ Отклонить", callback_data=f"storage_confirm_pickup:{storage.id}:no")
-            ]
-        ])
-        await callback.bot.send_message(
-            chat_id=user_tg_id,
-            text=confirmation_text,
-            parse_mode="HTML",
-            reply_markup=confirmation_keyboard
-        )
-        await callback.message.edit_text(
-            f"✅ <b>Запрос на получение шин отправлен клиенту</b>\n\n"
-            f"Ожидается подтверждение от клиента.",
-            parse_mode="HTML",
-            reply_markup=kb.generate_simple_keyboard("Назад", f"storage_cell:{cell_id}")
-        )
-    except Exception as e:
-        print(f"⚠️ Ошибка при отправке запроса подтверждения пользователю: {e}")
-        await callback.answer("❌ Не удалось отправить запрос подтверждения!", show_alert=True)
 
 
 # ==================== Освобождение ячейки ====================
@@ -247,7 +241,34 @@ async def free_storage_cell(callback: CallbackQuery, state: FSMContext):
     
     storage = cell.cell_storage
     
+    user_data = await rq.get_user_by_id(storage.user_id)
+    cell_value = getattr(cell, 'value', None) or cell_id
+    months_ru = ["Январь", "Февраль", "Март", "Апрель", "Май", "Июнь", "Июль", "Август", "Сентябрь", "Октябрь",
+                 "Ноябрь", "Декабрь"]
+    scheduled_date = f"{months_ru[storage.scheduled_month.month - 1]} {storage.scheduled_month.year}"
+    price_str = f"{int(storage.price):,}".replace(",", " ")
+
+    confirmation_text = (
+        f"🔓 <b>Подтверждение освобождения ячейки</b>\n\n"
+        f"Ячейка №{cell_value}\n"
+        f"Тип: {storage.storage_type}\n"
+        f"Описание: {storage.description or 'Отсутствует'}\n"
+        f"Цена: {price_str} ₽\n"
+        f"Срок хранения: до {scheduled_date}\n\n"
+        f"Подтвердите освобождение ячейки:"
+    )
+
+    def confirmation_request(cell_storage) -> list[dict]:
+        confirmation_keyboard = InlineKeyboardMarkup(inline_keyboard=[
+            [
+                InlineKeyboardButton(text="✅ Подтвердить", callback_data=f"storage_confirm_free:{cell_storage.id}:yes"),
+                InlineKeyboardButton(text="❌ Отклонить", callback_data=f"storage_confirm_free:{cell_storage.id}:no")
+            ]
+        ])
+        return [notification(user_data.user_id, confirmation_text, parse_mode="HTML", reply_markup=confirmation_keyboard)]
+
     # Обновляем статус на pending для освобождения
+    # Запрос подтверждения пользователю пишется в outbox той же транзакцией
     await storage_service.save_or_update_cell_storage(
         cell_id=cell_id,
         worker_id=storage.worker_id,
@@ -258,50 +279,16 @@ async def free_storage_cell(callback: CallbackQuery, state: FSMContext):
         scheduled_month=storage.scheduled_month,
         meta_data=storage.meta_data,
         action_type="free",
-        confirmation_status="pending"
+        confirmation_status="pending",
+        notifications=confirmation_request
+    )
+
+    await callback.message.edit_text(
+        f"✅ <b>Запрос на освобождение ячейки отправлен клиенту</b>\n\n"
+        f"Ожидается подтверждение от клиента.",
+        parse_mode="HTML",
+        reply_markup=kb.generate_simple_keyboard("Назад", f"storage_cell:{cell_id}")
     )
-    
-    # Отправляем запрос подтверждения пользователю
-    try:
-        user_data = await rq.get_user_by_id(storage.user_id)
-        user_tg_id = int(user_data.user_id)
-        cell_value = getattr(cell, 'value', None) or cell_id
-        months_ru = ["Январь", "Февраль", "Март", "Апрель", "Май", "Июнь", "Июль", "Август", "Сентябрь", "Октябрь",
-                     "Ноябрь", "Декабрь"]
-        scheduled_date = f"{months_ru[storage.scheduled_month.month - 1]} {storage.scheduled_month.year}"
-        price_str = f"{int(storage.price):,}".replace(",", " ")
-        
-        confirmation_text = (
-            f"🔓 <b>Подтверждение освобождения ячейки</b>\n\n"
-            f"Ячейка №{cell_value}\n"
-            f"Тип: {storage.storage_type}\n"
-            f"Описание: {storage.description or 'Отсутствует'}\n"
-            f"Цена: {price_str} ₽\n"
-            f"Срок хранения: до {scheduled_date}\n\n"
-            f"Подтвердите освобождение ячейки:"
-        )
-        from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
-        confirmation_keyboard = InlineKeyboardMarkup(inline_keyboard=[
-            [
-                InlineKeyboardButton(text="✅ Подтвердить", callback_data=f"storage_confirm_free:{storage.id}:yes"),
-                InlineKeyboardButton(text="❌ Отклонить", callback_data=f"storage_confirm_free:{storage.id}:no")
-            ]
-        ])
-        await callback.bot.send_message(
-            chat_id=user_tg_id,
-            text=confirmation_text,
-            parse_mode="HTML",
-            reply_markup=confirmation_keyboard
-        )
-        await callback.message.edit_text(
-            f"✅ <b>Запрос на освобождение ячейки отправлен клиенту</b>\n\n"
-            f"Ожидается подтверждение от клиента.",
-            parse_mode="HTML",
-            reply_markup=kb.generate_simple_keyboard("Назад", f"storage_cell:{cell_id}")
-        )
-    except Exception as e:
-        print(f"⚠️ Ошибка при отправке запроса подтверждения пользователю: {e}")
-        await callback.answer("❌ Не удалось отправить запрос подтверждения!", show_alert=True)
 
 
 # ==================== Удаление ячейки ====================
@@ -1,5 +1,5 @@
 from aiogram import Router
-from app.middlewares.middleware import AdminMiddleware, EmployeeMiddleware, CancelMiddleware, MediaGroupMiddleware
+from app.middlewares.middleware import AdminMiddleware, EmployeeMiddleware, CancelMiddleware, MediaGroupMiddleware, ReachabilityMiddleware
 
 
 priority_router = Router(name='priority_router')
@@ -16,6 +16,9 @@ async def setup_mw_to_routers(routers: list[Router]):
 
 
 async def setup_custom_middleware():
+    # priority_router первым получает каждое сообщение, поэтому внешний middleware видит их все
+    priority_router.message.outer_middleware(ReachabilityMiddleware())
+
     admin_router.message.middleware(AdminMiddleware())
     admin_router.callback_query.middleware(AdminMiddleware())
 
@@ -1,13 +1,9 @@
-import qrcode
-import pytz
-from datetime import datetime, timedelta
-from io import BytesIO
 from aiogram import F, types
 from aiogram.types import CallbackQuery
 from app.handlers.main import user_router
 import app.database.requests as rq
-
-EKATERINBURG_TZ = pytz.timezone('Asia/Yekaterinburg')
+from app.utils.qr_tokens import get_or_issue_qr_token, qr_token_remaining
+from app.utils.qr_render import get_qr_image, remember_qr_file_id
 
 @user_router.callback_query(F.data == "get_qrcode")
 async def generate_qr(callback: CallbackQuery):
@@ -16,32 +12,27 @@ async def generate_qr(callback: CallbackQuery):
         await callback.answer("Ошибка: твой номер телефона не указан в профиле!", show_alert=True)
         return
 
-    last_qr = await rq.get_last_qr_code(user.id)
-    if last_qr and last_qr.created_at:
-        now_utc = datetime.now(EKATERINBURG_TZ).astimezone(pytz.UTC)
-        created_at_utc = last_qr.created_at.replace(tzinfo=pytz.UTC) if last_qr.created_at.tzinfo is None else last_qr.created_at
-        if (now_utc - created_at_utc) < timedelta(minutes=30):
-            await callback.answer("Ты можешь генерировать QR-код только раз в 30 минут!", show_alert=True)
-            return
-
-    qr_link = f"https://t.me/ShinomartBOT?start={user.mobile_phone}"
-    qr = qrcode.QRCode(version=1, box_size=10, border=5)
-    qr.add_data(qr_link)
-    qr.make(fit=True)
-    qr_img = qr.make_image(fill_color="black", back_color="white")
-
-    buffer = BytesIO()
-    qr_img.save(buffer, format="PNG")
-    buffer.seek(0)
+    # Пока действует выданный QR, повторно отправляем его же вместо нового
+    token, is_new = await get_or_issue_qr_token(callback.from_user.id, user.id)
+    qr_link = f"https://t.me/ShinomartBOT?start={token}"
+    image = await get_qr_image(qr_link)
 
-    await rq.create_qr_code(user.id, user.mobile_phone)
-
-    await callback.message.answer_photo(
-        photo=types.BufferedInputFile(buffer.getvalue(), filename="qr_code.png"),
-        caption=(
+    if is_new:
+        caption = (
             "🎉 <b>Твой QR-код готов!</b> 🔒\n"
             "⏳ Действует 30 минут — успей использовать! ✨"
-        ),
+        )
+    else:
+        caption = (
+            "♻️ <b>Твой QR-код ещё действует</b> 🔒\n"
+            f"⏳ Осталось примерно {qr_token_remaining(token) // 60} мин."
+        )
+
+    sent = await callback.message.answer_photo(
+        photo=image["file_id"] or types.BufferedInputFile(image["png"], filename="qr_code.png"),
+        caption=caption,
         parse_mode="HTML"
     )
-    await callback.answer()
\ No newline at end of file
+    if not image["file_id"] and sent.photo:
+        remember_qr_file_id(qr_link, sent.photo[-1].file_id)
+    await callback.answer()
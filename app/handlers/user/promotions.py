@@ -1,8 +1,9 @@
 from aiogram import F
-from aiogram.types import CallbackQuery, FSInputFile
+from aiogram.types import CallbackQuery
 from app.handlers.main import user_router
 import app.keyboards.user.user as kb
 import app.database.requests as rq
+from app.utils.media import send_photo_asset
 
 @user_router.callback_query(F.data.startswith("viewPromotion"))
 async def view_promotion(callback: CallbackQuery):
@@ -20,9 +21,10 @@ async def view_promotion(callback: CallbackQuery):
 
     if promotion.image_path:
         try:
-            photo = FSInputFile(promotion.image_path)
-            await callback.message.answer_photo(
-                photo=photo,
+            await send_photo_asset(
+                callback.bot,
+                callback.message.chat.id,
+                promotion.image_path,
                 caption=caption,
                 parse_mode='HTML',
                 reply_markup=kb.back_to_all_promotions
@@ -1,11 +1,12 @@
 from aiogram import F
-from aiogram.types import CallbackQuery, FSInputFile
+from aiogram.types import CallbackQuery
 from aiogram.fsm.context import FSMContext
 import os
 
 from app.handlers.main import user_router
 import app.database.StorageCellsService as storage_service
 import app.database.requests as rq
+from app.database.outbox import notification
 from app.utils.word import generate_storage_word_document
 
 
@@ -23,41 +24,38 @@ async def handle_storage_confirmation(callback: CallbackQuery):
         return await callback.message.edit_text("❌ Запись не найдена!")
     
     if action == "yes":
-        # Подтверждаем сдачу
-        await storage_service.update_confirmation_status(cell_storage_id, "confirmed")
-        
-        # Получаем данные для генерации файла
+        # Документ генерируется до подтверждения, чтобы отправка файлов попала в outbox вместе со сменой статуса
         user_data = await rq.get_user_by_id(cell_storage.user_id)
         worker_data = await rq.get_user_by_id(cell_storage.worker_id)
-        
-        # Генерируем Word документ
         word_file = await generate_storage_word_document(cell_storage, user_data, worker_data)
-        
-        # Отправляем файл клиенту
+
+        notifications = []
         if word_file and os.path.exists(word_file):
-            document = FSInputFile(word_file)
-            await callback.message.answer_document(
-                document=document,
-                caption="📄 <b>Документ о сдаче шин на хранение</b>",
-                parse_mode="HTML"
-            )
-        
-        # Отправляем файл работнику
-        try:
-            worker_tg_id = int(worker_data.user_id)
-            if word_file and os.path.exists(word_file):
-                document = FSInputFile(word_file)
-                await callback.bot.send_document(
-                    chat_id=worker_tg_id,
-                    document=document,
+            cell_value = getattr(await storage_service.get_cell(cell_storage.cell_id), 'value', None) or cell_storage.cell_id
+            notifications = [
+                # Файл клиенту
+                notification(
+                    callback.from_user.id,
+                    method="send_document",
+                    document=word_file,
+                    caption="📄 <b>Документ о сдаче шин на хранение</b>",
+                    parse_mode="HTML"
+                ),
+                # Файл работнику
+                notification(
+                    worker_data.user_id,
+                    method="send_document",
+                    document=word_file,
                     caption=f"📄 <b>Документ о сдаче шин на хранение</b>\n\n"
-                           f"Ячейка №{getattr(await storage_service.get_cell(cell_storage.cell_id), 'value', None) or cell_storage.cell_id}\n"
-                           f"Клиент: {user_data.name}",
+                            f"Ячейка №{cell_value}\n"
+                            f"Клиент: {user_data.name}",
                     parse_mode="HTML"
-                )
-        except Exception as e:
-            print(f"⚠️ Ошибка при отправке файла работнику: {e}")
-        
+                ),
+            ]
+
+        # Подтверждаем сдачу
+        await storage_service.update_confirmation_status(cell_storage_id, "confirmed", notifications=notifications)
+
         await callback.message.edit_text(
             "✅ <b>Сдача шин на хранение подтверждена!</b>\n\n"
             "Ваши шины приняты на хранение.",
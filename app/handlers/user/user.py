@@ -1,12 +1,14 @@
 from aiogram import F
 from aiogram.filters import CommandStart
 from aiogram.fsm.context import FSMContext
-from aiogram.types import Message, CallbackQuery
+from aiogram.types import Message, CallbackQuery, ChatMemberUpdated
 from app.handlers.employee.employee import handle_phone_selection_by_qr
 from app.handlers.main import user_router, priority_router
 from config import PHONE_NUMBER
 import app.keyboards.user.user as kb
 import app.database.requests as rq
+from app.database.suppression import mark_chat_blocked, unsuppress_chat
+from app.utils.qr_tokens import verify_qr_token
 
 
 @priority_router.message(CommandStart())
@@ -18,21 +20,23 @@ async def cmd_start(message: Message, state: FSMContext):
         pass
 
     if message.text:
-        phone_number = message.text.split(' ')[1] if len(message.text.split(' ')) > 1 else None
+        start_payload = message.text.split(' ')[1] if len(message.text.split(' ')) > 1 else None
     else:
-        phone_number = None
+        start_payload = None
 
-    if phone_number:
+    if start_payload:
         user_role = await rq.get_user_role(message.from_user.id)
         if not user_role or user_role not in ["Работник", "Администратор"]:
             pass
         else:
-            qr = await rq.check_qr_code(phone_number)
-            if not qr:
+            # Подпись и срок действия проверяются без БД; запрос нужен только чтобы найти клиента
+            qr_user_id = verify_qr_token(start_payload)
+            qr_user = await rq.get_user_by_id(qr_user_id) if qr_user_id else None
+            if not qr_user:
                 await message.answer("⛔ <b>QR-код недействителен</b>\nИстёк срок действия 😔", parse_mode="HTML")
                 return
 
-            await handle_phone_selection_by_qr(message, phone_number, state)
+            await handle_phone_selection_by_qr(message, qr_user.mobile_phone, state)
             return
 
     if await rq.check_user_by_id(message.from_user.id):
@@ -205,4 +209,14 @@ async def show_feedback(callback: CallbackQuery):
         "Выберите нужный пункт на клавиатуре ниже 👇",
         parse_mode="HTML",
         reply_markup=kb.feedback_keyboard
-    )
\ No newline at end of file
+    )
+
+@user_router.my_chat_member()
+async def track_bot_blocked(update: ChatMemberUpdated):
+    # Telegram сам сообщает о блокировке и разблокировке бота в личном чате
+    if update.chat.type != "private":
+        return
+    if update.new_chat_member.status == "kicked":
+        await mark_chat_blocked(update.chat.id)
+    elif update.new_chat_member.status == "member":
+        await unsuppress_chat(update.chat.id)
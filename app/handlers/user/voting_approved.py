@@ -5,6 +5,7 @@ from aiogram.fsm.state import State, StatesGroup
 from app.handlers.main import user_router, admin_router
 import app.keyboards.user.user as kb
 import app.database.requests as rq
+from app.database.outbox import notification
 
 from config import OWNER
 
@@ -83,7 +84,21 @@ async def process_approved(callback: CallbackQuery):
 
     if confirm == "yes":
         bonus_system = await rq.get_bonus_system_settings()
-        await rq.set_bonus_balance(user_id, "add", bonus_system['voting_bonus'], 0, "Администратор")
+        success = await rq.set_bonus_balance(
+            user_id, "add", bonus_system['voting_bonus'], 0, "Администратор", reason="voting",
+            idempotency_key=f"voting:{callback.message.chat.id}:{callback.message.message_id}",
+            notifications=[notification(
+                user_id,
+                (
+                    "✅ <b>Ваш отзыв принят!</b>\n"
+                    f"💰 <b>На ваш баланс начислено {bonus_system['voting_bonus']} бонусов</b>\n\n"
+                    "🙏 <b>Спасибо за поддержку!</b>"
+                ),
+                parse_mode='HTML'
+            )]
+        )
+        if success is None:
+            return
         await rq.create_voting_history(user_id)
         user_link = f"<a href='tg://user?id={user_id}'> (профиль)</a>"
 
@@ -91,16 +106,6 @@ async def process_approved(callback: CallbackQuery):
             f"🎉 <b>Бонусы за отзыв успешно начислены пользователю {user_link}!</b>",
             parse_mode='HTML'
         )
-
-        await callback.bot.send_message(
-            chat_id=user_id,
-            text=(
-                "✅ <b>Ваш отзыв принят!</b>\n"
-                f"💰 <b>На ваш баланс начислено {bonus_system['voting_bonus']} бонусов</b>\n\n"
-                "🙏 <b>Спасибо за поддержку!</b>"
-            ),
-            parse_mode='HTML'
-        )
     elif confirm == 'no':
         keyboard = await kb.admin_voting_comment(user_id)
         await callback.message.answer(
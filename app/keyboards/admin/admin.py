@@ -1,5 +1,6 @@
 from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup, InlineQueryResultLocation
 from aiogram.utils.keyboard import InlineKeyboardBuilder
+from datetime import datetime, timedelta
 
 # Главное меню
 main_menu = InlineKeyboardMarkup(inline_keyboard=[
@@ -251,3 +252,69 @@ async def confirm_delete_promotion(promo_id):
     builder.row(InlineKeyboardButton(text="❌ Нет, отменить", callback_data=f"editPromo:{promo_id}"))
 
     return builder.as_markup()
+
+async def broadcast_controls(job_id, status):
+    builder = InlineKeyboardBuilder()
+
+    if status == "running":
+        builder.row(InlineKeyboardButton(text="⏸ Пауза", callback_data=f"broadcast:pause:{job_id}"))
+    elif status == "paused":
+        builder.row(InlineKeyboardButton(text="▶️ Продолжить", callback_data=f"broadcast:resume:{job_id}"))
+    if status in ("running", "paused"):
+        builder.row(InlineKeyboardButton(text="⏹ Отменить рассылку", callback_data=f"broadcast:cancel:{job_id}"))
+    builder.row(InlineKeyboardButton(text="🗑️ Удалить сообщение", callback_data="delete_button_admin"))
+
+    return builder.as_markup()
+
+# Сегменты аудитории рассылки
+MONTHS = ["Январь", "Февраль", "Март", "Апрель", "Май", "Июнь",
+          "Июль", "Август", "Сентябрь", "Октябрь", "Ноябрь", "Декабрь"]
+
+mailing_segments = InlineKeyboardMarkup(inline_keyboard=[
+    [InlineKeyboardButton(text="👥 Все пользователи", callback_data='mailingSegment:all')],
+    [InlineKeyboardButton(text="💰 По балансу бонусов", callback_data='mailingSegmentMenu:balance')],
+    [InlineKeyboardButton(text="🛒 По последней покупке", callback_data='mailingSegmentMenu:purchase_days')],
+    [InlineKeyboardButton(text="👑 VIP клиенты", callback_data='mailingSegment:vip')],
+    [InlineKeyboardButton(text="📅 По месяцу регистрации", callback_data='mailingSegmentMenu:cohort')],
+    [InlineKeyboardButton(text="🎂 По месяцу рождения", callback_data='mailingSegmentMenu:birthday_month')],
+    [InlineKeyboardButton(text='❌ Отмена', callback_data='cancelAction')]
+])
+
+async def mailing_segment_values(segment):
+    builder = InlineKeyboardBuilder()
+
+    if segment == "balance":
+        builder.row(InlineKeyboardButton(text="👤 1000–5000", callback_data='mailingSegment:balance:1000'))
+        builder.row(InlineKeyboardButton(text="👥 5001–10000", callback_data='mailingSegment:balance:5000'))
+        builder.row(InlineKeyboardButton(text="🧑 10000+", callback_data='mailingSegment:balance:10000'))
+    elif segment == "purchase_days":
+        for days in (7, 30, 90):
+            builder.row(InlineKeyboardButton(text=f"🛒 Покупали за {days} дней", callback_data=f'mailingSegment:purchase_days:{days}'))
+    elif segment == "cohort":
+        month = datetime.now().replace(day=1)
+        for _ in range(6):
+            builder.row(InlineKeyboardButton(
+                text=f"📅 {MONTHS[month.month - 1]} {month.year}",
+                callback_data=f'mailingSegment:cohort:{month.strftime("%Y-%m")}'
+            ))
+            month = (month - timedelta(days=1)).replace(day=1)
+    elif segment == "birthday_month":
+        for row_start in range(0, 12, 3):
+            builder.row(*[
+                InlineKeyboardButton(text=MONTHS[index], callback_data=f'mailingSegment:birthday_month:{index + 1}')
+                for index in range(row_start, row_start + 3)
+            ])
+
+    builder.row(InlineKeyboardButton(text="◀️ Назад", callback_data='mailingSegments'))
+
+    return builder.as_markup()
+
+async def mailing_audience_preview(users_count):
+    builder = InlineKeyboardBuilder()
+
+    if users_count:
+        builder.row(InlineKeyboardButton(text="✍️ Написать сообщение", callback_data='mailingAudienceConfirm'))
+    builder.row(InlineKeyboardButton(text="◀️ Выбрать другую аудиторию", callback_data='mailingSegments'))
+    builder.row(InlineKeyboardButton(text='❌ Отмена', callback_data='cancelAction'))
+
+    return builder.as_markup()
@@ -4,6 +4,7 @@ from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup, KeyboardBu
 main_menu = ReplyKeyboardMarkup(
     keyboard=[
         [KeyboardButton(text='💳 Новая транзакция')],
+        [KeyboardButton(text='📑 Пакетный ввод')],
         [KeyboardButton(text='➕ Добавить Б/У шины или диски')],
         [KeyboardButton(text='✅ Завершить смену')],
         [KeyboardButton(text='📦 Хранение шин')],
@@ -76,6 +77,11 @@ confirm_transaction = InlineKeyboardMarkup(inline_keyboard=[
     [InlineKeyboardButton(text='❌ Отмена', callback_data='confirm:cancel')]
 ])
 
+confirm_batch = InlineKeyboardMarkup(inline_keyboard=[
+    [InlineKeyboardButton(text='✅ Провести все', callback_data='batch:confirm')],
+    [InlineKeyboardButton(text='❌ Отмена', callback_data='batch:cancel')]
+])
+
 assessment = InlineKeyboardMarkup(inline_keyboard=[
     [InlineKeyboardButton(text='⭐ Поставить оценку работнику ⭐', callback_data='start_assessment')]
 ])
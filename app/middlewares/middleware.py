@@ -1,6 +1,4 @@
-import asyncio
 from sqlalchemy import select
-from collections import defaultdict
 from typing import Callable, Dict, Any, Awaitable
 
 from aiogram import BaseMiddleware
@@ -9,6 +7,24 @@ from aiogram.fsm.context import FSMContext
 
 from app.database.models import async_session
 from app.database.models import User
+from app.database.suppression import unsuppress_chat
+from app.utils.cache import role_cache, MISSING
+from app.utils.albums import AlbumCollector
+
+
+async def get_user_role_cached(user_tg_id) -> str | None:
+    key = str(user_tg_id)
+    role = role_cache.get(key)
+    if role is not MISSING:
+        return role
+
+    async with async_session() as session:
+        query = select(User.role).where(User.user_id == key)
+        result = await session.execute(query)
+        role = result.scalar()
+
+    role_cache.set(key, role)
+    return role
 
 
 class AdminMiddleware(BaseMiddleware):
@@ -18,14 +34,11 @@ class AdminMiddleware(BaseMiddleware):
             event: Message,
             data: Dict[str, Any]
     ) -> Any:
-        async with async_session() as session:
-            query = select(User.role).where(User.user_id == str(event.from_user.id))
-            result = await session.execute(query)
-            role = result.scalar()
+        role = await get_user_role_cached(event.from_user.id)
 
-            if role != "Администратор":
-                await event.answer("❌ У вас нет доступа к этой команде")
-                return
+        if role != "Администратор":
+            await event.answer("❌ У вас нет доступа к этой команде")
+            return
 
         return await handler(event, data)
 
@@ -37,14 +50,11 @@ class EmployeeMiddleware(BaseMiddleware):
             event: Message,
             data: Dict[str, Any]
     ) -> Any:
-        async with async_session() as session:
-            query = select(User.role).where(User.user_id == str(event.from_user.id))
-            result = await session.execute(query)
-            role = result.scalar()
+        role = await get_user_role_cached(event.from_user.id)
 
-            if role not in ["Работник", "Администратор"]:
-                await event.answer("❌ У вас нет доступа к этой команде")
-                return
+        if role not in ["Работник", "Администратор"]:
+            await event.answer("❌ У вас нет доступа к этой команде")
+            return
 
         return await handler(event, data)
 
@@ -62,18 +72,29 @@ class CancelMiddleware(BaseMiddleware):
         return await handler(event, data)
 
 
+class ReachabilityMiddleware(BaseMiddleware):
+    """Снимает пометку «бот заблокирован», как только пользователь снова пишет боту."""
+    async def __call__(self, handler, event: Message, data):
+        if event.from_user:
+            await unsuppress_chat(event.from_user.id)
+        return await handler(event, data)
+
+
 class MediaGroupMiddleware(BaseMiddleware):
+    """
+    Части альбома собираются в одну пачку: обработчик вызывается один раз с data["album"].
+    Ожидание остальных частей не держит обработку обновления: в режиме webhook воркеры, занятые
+    ожиданием, не смогли бы принять сами эти части. Поэтому альбом обрабатывается отдельной задачей,
+    а её ошибки AlbumCollector пишет в лог.
+    """
     def __init__(self):
-        self._album_data = defaultdict(list)
+        self._collector = AlbumCollector()
 
     async def __call__(self, handler, event: Message, data):
-        if event.media_group_id:
-            self._album_data[event.media_group_id].append(event)
-            await asyncio.sleep(0.4)
-
-            if len(self._album_data[event.media_group_id]) > 1:
-                album = self._album_data.pop(event.media_group_id)
-                data["album"] = album
-                await handler(album[-1], data)
+        if isinstance(event, Message) and event.media_group_id:
+            async def handle_album(album: list[Message]):
+                await handler(album[-1], {**data, "album": album})
+
+            self._collector.add(event, handle_album)
             return
-        await handler(event, data)
\ No newline at end of file
+        return await handler(event, data)
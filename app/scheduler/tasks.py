@@ -1,10 +1,12 @@
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
+from apscheduler.triggers.interval import IntervalTrigger
 from aiogram import Bot
 import pytz
-from app.database.models import async_session, QRCode
-from sqlalchemy import delete
 import app.database.requests as rq
+from app.database.ledger import take_balance_snapshots, reconcile_balances
+from app.database.outbox import purge_sent_notifications
+from app.utils.notifications import outbox_dispatcher
 from config import CHANNEL_ID_DAILY
 from datetime import datetime
 
@@ -31,19 +33,37 @@ async def send_monthly_report(bot: Bot):
     except Exception as e:
         print(f"Ошибка отправки отчёта: {e}")
 
-async def clear_qr_codes():
-    async with async_session() as session:
-        try:
-            await session.execute(delete(QRCode))
-            await session.commit()
-        except Exception as e:
-            print(f"Ошибка при удалении QR-кодов: {e}")
-            await session.rollback()
+async def snapshot_and_reconcile_balances():
+    try:
+        count = await take_balance_snapshots()
+        mismatches = await reconcile_balances()
+        print(f"Снимки балансов: {count}, расхождений с журналом: {len(mismatches)}")
+        if not mismatches.empty:
+            print(mismatches.head(20).to_string())
+    except Exception as e:
+        print(f"Ошибка сверки балансов: {e}")
+
+async def report_outbox_metrics():
+    try:
+        stats = await outbox_dispatcher.stats()
+        if stats["pending"] or stats["failed"] or stats["retried"]:
+            print(f"Очередь уведомлений: {stats}")
+    except Exception as e:
+        print(f"Ошибка чтения метрик очереди уведомлений: {e}")
+
+async def purge_outbox():
+    try:
+        count = await purge_sent_notifications()
+        print(f"Удалено отправленных уведомлений из очереди: {count}")
+    except Exception as e:
+        print(f"Ошибка очистки очереди уведомлений: {e}")
 
 async def setup_scheduler(bot: Bot):
     scheduler = AsyncIOScheduler(timezone=EKATERINBURG_TZ)
     scheduler.add_job(send_monthly_report, trigger=CronTrigger(day="last", hour=18, minute=0), args=[bot], max_instances=1)
-    scheduler.add_job(clear_qr_codes, trigger=CronTrigger(hour=00, minute=00), max_instances=1)
+    scheduler.add_job(snapshot_and_reconcile_balances, trigger=CronTrigger(hour=3, minute=0), max_instances=1)
+    scheduler.add_job(purge_outbox, trigger=CronTrigger(hour=3, minute=30), max_instances=1)
+    scheduler.add_job(report_outbox_metrics, trigger=IntervalTrigger(minutes=5), max_instances=1)
     scheduler.start()
 
     return scheduler
\ No newline at end of file
@@ -0,0 +1,89 @@
+import asyncio
+import time
+import traceback
+from typing import Awaitable, Callable
+
+from aiogram.types import Message
+
+from app.utils.cache import TTLCache
+
+AlbumHandler = Callable[[list[Message]], Awaitable]
+
+
+class AlbumCollector:
+    """
+    Собирает части альбома (сообщения с общим media_group_id) и передаёт их обработчику один раз.
+    На каждый альбом — один таймер, который сдвигается с каждой новой частью; альбом уходит после
+    quiet секунд тишины. Ограничения: не больше max_size частей, не дольше max_age секунд
+    от первой части и не больше max_groups незавершённых альбомов одновременно.
+    Альбом никогда не делится на два вызова: части, пришедшие после отправки альбома, и альбомы
+    сверх max_groups отбрасываются с записью в лог.
+    """
+
+    def __init__(self, quiet: float = 0.6, max_age: float = 5.0, max_size: int = 10, max_groups: int = 256):
+        self.quiet = quiet
+        self.max_age = max_age
+        self.max_size = max_size
+        self.max_groups = max_groups
+        self.flushed = 0
+        self.rejected = 0
+        self._groups: dict[str, dict] = {}
+        # Отправленные и отклонённые альбомы: их поздние части не должны открыть новый альбом
+        self._closed = TTLCache(maxsize=max_groups * 4, ttl=60)
+        self._tasks: set[asyncio.Task] = set()
+
+    def add(self, message: Message, handler: AlbumHandler) -> None:
+        group_id = message.media_group_id
+        group = self._groups.get(group_id)
+        if group is None:
+            closed = self._closed.get(group_id, None)
+            if closed == "flushed":
+                print(f"⚠️ Часть {message.message_id} альбома {group_id} пришла после его обработки — пропущена")
+            if closed is not None:
+                return
+            if len(self._groups) >= self.max_groups:
+                self.rejected += 1
+                self._closed.set(group_id, "rejected")
+                print(f"⚠️ Незавершённых альбомов уже {self.max_groups}, альбом {group_id} отклонён целиком")
+                return
+            group = self._groups[group_id] = {"messages": {}, "started": time.monotonic(), "timer": None}
+
+        # Повторная доставка той же части не дублирует её в альбоме
+        group["messages"][message.message_id] = message
+        group["handler"] = handler
+
+        if group["timer"]:
+            group["timer"].cancel()
+
+        if len(group["messages"]) >= self.max_size or time.monotonic() - group["started"] >= self.max_age:
+            self.flush(group_id)
+        else:
+            group["timer"] = asyncio.get_running_loop().call_later(self.quiet, self.flush, group_id)
+
+    def flush(self, group_id: str) -> None:
+        group = self._groups.pop(group_id, None)
+        if group is None:
+            return
+        if group["timer"]:
+            group["timer"].cancel()
+        self._closed.set(group_id, "flushed")
+
+        # Части могут прийти не по порядку — восстанавливаем порядок по message_id
+        album = [group["messages"][message_id] for message_id in sorted(group["messages"])]
+        self.flushed += 1
+
+        task = asyncio.create_task(group["handler"](album))
+        self._tasks.add(task)
+        task.add_done_callback(lambda finished: self._finished(finished, group_id))
+
+    def _finished(self, task: asyncio.Task, group_id: str) -> None:
+        self._tasks.discard(task)
+        if task.cancelled():
+            return
+        error = task.exception()
+        if error is not None:
+            print(f"⚠️ Ошибка при обработке альбома {group_id}: {error!r}")
+            traceback.print_exception(error)
+
+    def __len__(self) -> int:
+        return len(self._groups)
@@ -0,0 +1,265 @@
+import asyncio
+import html
+import time
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramRetryAfter, TelegramForbiddenError, TelegramBadRequest
+from aiogram.types import InputMediaPhoto
+
+from app.database.models import BroadcastJob
+from app.database.broadcasts import (
+    get_broadcast_job, get_broadcast_job_ids, get_pending_recipients, save_recipient_results,
+    set_broadcast_job_status, get_broadcast_errors
+)
+import app.keyboards.admin.admin as kb
+
+BROADCAST_RATE = 25  # сообщений в секунду на весь бот, с запасом от лимита Telegram ~30/с
+BROADCAST_BURST = 5
+BROADCAST_CONCURRENCY = 10
+BROADCAST_CHUNK = 50  # получателей между сохранениями прогресса в БД
+PROGRESS_INTERVAL = 3.0
+MAX_RETRIES = 3
+
+
+class TokenBucket:
+    """Глобальный ограничитель скорости: rate токенов в секунду, не больше capacity подряд."""
+
+    def __init__(self, rate: float, capacity: float = 1):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, cost: float = 1) -> None:
+        """Ждёт хотя бы один токен и списывает cost; недостачу отрабатывают следующие вызовы."""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= cost
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    def pause(self, seconds: float) -> None:
+        """Останавливает выдачу токенов всем отправителям — ответ на TelegramRetryAfter."""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        self._tokens = 0
+
+
+broadcast_bucket = TokenBucket(rate=BROADCAST_RATE, capacity=BROADCAST_BURST)
+
+# Задачи запущенных рассылок по id — заодно не даём их собрать сборщику мусора
+_running_broadcasts: dict[int, asyncio.Task] = {}
+
+
+def start_broadcast(bot: Bot, job_id: int) -> asyncio.Task:
+    """
+    Запускает отправку сохранённой рассылки в фоне. Если по ней ещё работает прежняя задача
+    (например, пауза не успела вступить в силу), новая запустится сразу после её завершения.
+    """
+    task = _running_broadcasts.get(job_id)
+    if task and not task.done():
+        task.add_done_callback(lambda _: start_broadcast(bot, job_id))
+        return task
+
+    task = asyncio.create_task(run_broadcast_job(bot, job_id))
+    _running_broadcasts[job_id] = task
+
+    def forget(finished: asyncio.Task) -> None:
+        if _running_broadcasts.get(job_id) is finished:
+            del _running_broadcasts[job_id]
+
+    task.add_done_callback(forget)
+    return task
+
+
+async def resume_broadcasts(bot: Bot) -> None:
+    """Продолжает рассылки, прерванные перезапуском бота, с первого недоставленного получателя."""
+    job_ids = await get_broadcast_job_ids("running")
+    for job_id in job_ids:
+        start_broadcast(bot, job_id)
+    if job_ids:
+        print(f"✅ Возобновлены рассылки: {', '.join(map(str, job_ids))}")
+
+
+async def run_broadcast_job(
+    bot: Bot,
+    job_id: int,
+    concurrency: int = BROADCAST_CONCURRENCY,
+    bucket: TokenBucket = broadcast_bucket
+) -> None:
+    """
+    Рассылает сообщение pending-получателям рассылки пачками по BROADCAST_CHUNK.
+    Исходы пачки сохраняются в БД сразу после неё, статус рассылки проверяется между пачками —
+    так пауза и отмена срабатывают за пару секунд, а после перезапуска повторно уйдёт не больше одной пачки.
+    """
+    job = await get_broadcast_job(job_id)
+    if not job or job.status != "running":
+        return
+
+    cursor = 0
+    last_progress = time.monotonic()
+    while True:
+        try:
+            recipients = await get_pending_recipients(job_id, after_id=cursor, limit=BROADCAST_CHUNK)
+            if not recipients:
+                break
+
+            results = await send_broadcast_chunk(bot, job, recipients, concurrency, bucket)
+            await save_recipient_results(job_id, results)
+            cursor = recipients[-1][0]
+
+            job = await get_broadcast_job(job_id)
+        except Exception as e:
+            # Несохранённая пачка осталась pending и уйдёт снова, когда рассылку продолжат
+            return await pause_broadcast_on_error(bot, job, e)
+
+        if job.status != "running":
+            # Пауза или отмена из панели управления
+            return await update_broadcast_status(bot, job)
+
+        if time.monotonic() - last_progress >= PROGRESS_INTERVAL:
+            last_progress = time.monotonic()
+            await update_broadcast_status(bot, job)
+
+    try:
+        await set_broadcast_job_status(job_id, "done", allowed_from=("running",))
+        job = await get_broadcast_job(job_id)
+    except Exception as e:
+        return await pause_broadcast_on_error(bot, job, e)
+    await update_broadcast_status(bot, job)
+
+
+async def pause_broadcast_on_error(bot: Bot, job: BroadcastJob, error: Exception) -> None:
+    """Ставит рассылку на паузу с причиной, чтобы администратор увидел её и продолжил рассылку кнопкой."""
+    print(f"⚠️ Рассылка #{job.id} приостановлена из-за ошибки: {error!r}")
+    job.status, job.last_error = "paused", str(error)[:500] or type(error).__name__
+    try:
+        await set_broadcast_job_status(job.id, "paused", allowed_from=("running",), last_error=job.last_error)
+        job = await get_broadcast_job(job.id) or job
+    except Exception as e:
+        print(f"⚠️ Не удалось сохранить паузу рассылки #{job.id}: {e}")
+    await update_broadcast_status(bot, job)
+
+
+async def send_broadcast_chunk(
+    bot: Bot,
+    job: BroadcastJob,
+    recipients: list[tuple[int, str]],
+    concurrency: int,
+    bucket: TokenBucket
+) -> list[dict]:
+    """Отправляет пачку: не больше concurrency запросов одновременно и не быстрее bucket."""
+    queue: asyncio.Queue = asyncio.Queue()
+    for recipient_id, chat_id in recipients:
+        queue.put_nowait((recipient_id, chat_id, 0))
+
+    results = []
+
+    async def send(chat_id) -> None:
+        if job.media:
+            await bot.send_media_group(chat_id=chat_id, media=build_album(job.media, job.text))
+        elif job.photo:
+            await bot.send_photo(chat_id=chat_id, photo=job.photo, caption=job.text, parse_mode='HTML')
+        else:
+            await bot.send_message(chat_id=chat_id, text=job.text, parse_mode='HTML')
+
+    async def worker() -> None:
+        while True:
+            try:
+                recipient_id, chat_id, attempt = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+
+            # Альбом — это несколько сообщений и для лимитов Telegram
+            await bucket.acquire(len(job.media) if job.media else 1)
+            try:
+                await send(chat_id)
+                results.append({"id": recipient_id, "chat_id": chat_id, "status": "sent", "error": None})
+            except TelegramRetryAfter as e:
+                bucket.pause(e.retry_after)
+                if attempt < MAX_RETRIES:
+                    queue.put_nowait((recipient_id, chat_id, attempt + 1))
+                else:
+                    results.append({"id": recipient_id, "chat_id": chat_id, "status": "failed", "error": f"Превышен лимит Telegram для {chat_id}"})
+            except TelegramForbiddenError:
+                results.append({"id": recipient_id, "chat_id": chat_id, "status": "blocked", "error": f"Пользователь {chat_id} заблокировал бота"})
+            except TelegramBadRequest as e:
+                results.append({"id": recipient_id, "chat_id": chat_id, "status": "failed", "error": f"Ошибка при отправке {chat_id}: {e.message}"})
+            except Exception as e:
+                results.append({"id": recipient_id, "chat_id": chat_id, "status": "failed", "error": f"Неизвестная ошибка с {chat_id}: {str(e)}"})
+
+    await asyncio.gather(*(worker() for _ in range(min(concurrency, len(recipients)))))
+    return results
+
+
+def build_album(file_ids: list[str], caption: str) -> list[InputMediaPhoto]:
+    """Альбом из фотографий; подпись — у первой, как её показывает Telegram."""
+    return [
+        InputMediaPhoto(media=file_id, caption=caption if index == 0 else None, parse_mode='HTML')
+        for index, file_id in enumerate(file_ids)
+    ]
+
+
+async def update_broadcast_status(bot: Bot, job: BroadcastJob) -> None:
+    """Переписывает сообщение с прогрессом рассылки и кнопками управления под её текущий статус."""
+    if not job.status_message_id:
+        return
+
+    try:
+        await bot.edit_message_text(
+            chat_id=job.admin_chat_id,
+            message_id=job.status_message_id,
+            text=await format_broadcast_status(job),
+            parse_mode='HTML',
+            reply_markup=await kb.broadcast_controls(job.id, job.status)
+        )
+    except TelegramBadRequest as e:
+        if "message is not modified" not in e.message:
+            print(f"⚠️ Не удалось обновить статус рассылки #{job.id}: {e.message}")
+    except Exception as e:
+        print(f"⚠️ Не удалось обновить статус рассылки #{job.id}: {e}")
+
+
+async def format_broadcast_status(job: BroadcastJob) -> str:
+    done = job.sent + job.blocked + job.failed
+
+    if job.status in ("running", "paused"):
+        title = "⏳ <b>Рассылка #{}</b>" if job.status == "running" else "⏸ <b>Рассылка #{} приостановлена</b>"
+        status = (
+            f"{title.format(job.id)}\n"
+            f"━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━\n"
+            f"📨 <b>Обработано:</b> {done}/{job.total}\n"
+            f"✅ {job.sent}  🚫 {job.blocked}  ❌ {job.failed}"
+        )
+        if job.status == "paused" and job.last_error:
+            status += f"\n\n⚠️ <b>Остановлена из-за ошибки:</b> {html.escape(job.last_error)}"
+        return status
+
+    report = (
+        f"📊 <b>Результаты рассылки #{job.id}</b>"
+        + (" <i>(отменена)</i>" if job.status == "cancelled" else "")
+        + f"\n━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━\n"
+        f"✅ <b>Успешно отправлено:</b> {job.sent}/{job.total}\n"
+    )
+    if job.finished_at:
+        report += f"⏱ <b>Время:</b> {round((job.finished_at - job.created_at).total_seconds(), 1)} с\n"
+
+    errors, errors_count = await get_broadcast_errors(job.id, limit=10)
+    if errors:
+        report += (
+            f"\n❌ <b>Ошибки ({errors_count}):</b>\n"
+            f"━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━\n"
+            + "\n".join(f"• {error}" for error in errors)
+        )
+        if errors_count > len(errors):
+            report += f"\n... и ещё {errors_count - len(errors)} ошибок"
+    return report
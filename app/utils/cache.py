@@ -0,0 +1,135 @@
+import time
+import asyncio
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable
+
+from config import redis_client
+
+ROLE_INVALIDATION_CHANNEL = "cache:role:invalidate"
+BONUS_SETTINGS_VERSION_KEY = "cache:bonus_settings:version"
+
+MISSING = object()
+
+
+class TTLCache:
+    """In-memory LRU-кэш с ограничением по размеру и времени жизни записей."""
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+
+    def get(self, key: Hashable, default: Any = MISSING) -> Any:
+        item = self._data.get(key)
+        if item is None or item[0] < time.monotonic():
+            if item is not None:
+                del self._data[key]
+            self.misses += 1
+            return default
+
+        self._data.move_to_end(key)
+        self.hits += 1
+        return item[1]
+
+    def set(self, key: Hashable, value: Any) -> None:
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key: Hashable) -> None:
+        self._data.pop(key, None)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
+
+
+class VersionedCache:
+    """
+    Одно значение в памяти процесса, актуальность которого сверяется с номером версии в Redis
+    не чаще раза в check_interval секунд. Изменивший данные процесс увеличивает версию через bump().
+    """
+
+    def __init__(self, version_key: str, check_interval: float = 5.0):
+        self.version_key = version_key
+        self.check_interval = check_interval
+        self.hits = 0
+        self.misses = 0
+        self._value: Any = MISSING
+        self._version: str | None = None
+        self._checked_at = 0.0
+
+    async def get(self, loader: Callable[[], Awaitable[Any]]) -> Any:
+        now = time.monotonic()
+        if self._value is not MISSING and now - self._checked_at < self.check_interval:
+            self.hits += 1
+            return self._value
+
+        try:
+            version = await redis_client.get(self.version_key)
+        except Exception as e:
+            print(f"⚠️ Не удалось проверить версию {self.version_key}: {e}")
+            version = self._version
+        self._checked_at = now
+
+        if self._value is MISSING or version != self._version:
+            self.misses += 1
+            self._value = await loader()
+            self._version = version
+        else:
+            self.hits += 1
+        return self._value
+
+    async def bump(self) -> None:
+        self._value = MISSING
+        try:
+            await redis_client.incr(self.version_key)
+        except Exception as e:
+            print(f"⚠️ Не удалось обновить версию {self.version_key}: {e}")
+
+    def stats(self) -> dict:
+        return {"version": self._version, "hits": self.hits, "misses": self.misses}
+
+
+role_cache = TTLCache(maxsize=2048, ttl=300)
+bonus_settings_cache = VersionedCache(BONUS_SETTINGS_VERSION_KEY)
+
+
+async def invalidate_role(user_tg_id) -> None:
+    """Сбрасывает роль в локальном кэше и рассылает сброс остальным процессам бота."""
+    role_cache.pop(str(user_tg_id))
+    try:
+        await redis_client.publish(ROLE_INVALIDATION_CHANNEL, str(user_tg_id))
+    except Exception as e:
+        print(f"⚠️ Не удалось отправить сброс кэша ролей: {e}")
+
+
+async def listen_role_invalidation() -> None:
+    """Слушает канал Redis и сбрасывает роли, изменённые в других процессах."""
+    while True:
+        pubsub = redis_client.pubsub()
+        try:
+            await pubsub.subscribe(ROLE_INVALIDATION_CHANNEL)
+            # После (пере)подключения могли пропустить сообщения — начинаем с чистого кэша
+            role_cache.clear()
+            async for message in pubsub.listen():
+                if message.get("type") == "message":
+                    role_cache.pop(str(message["data"]))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"⚠️ Подписка на сброс кэша ролей прервана: {e}")
+            await asyncio.sleep(5)
+        finally:
+            await pubsub.aclose()
@@ -0,0 +1,62 @@
+import os
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import FSInputFile, Message
+
+from app.database.media import get_media_asset, save_media_asset, delete_media_asset
+from app.utils.cache import TTLCache, MISSING
+
+# path -> (fingerprint, file_id); None — файл ещё не загружался
+media_cache = TTLCache(maxsize=256, ttl=3600)
+
+
+def file_fingerprint(path: str) -> str | None:
+    """Отпечаток файла: при замене файла по тому же пути сохранённый file_id перестаёт подходить."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return f"{stat.st_mtime_ns}:{stat.st_size}"
+
+
+async def get_asset_file_id(path: str, fingerprint: str) -> str | None:
+    cached = media_cache.get(path)
+    if cached is MISSING:
+        asset = await get_media_asset(path)
+        cached = (asset.fingerprint, asset.file_id) if asset else None
+        media_cache.set(path, cached)
+
+    if cached and cached[0] == fingerprint:
+        return cached[1]
+    return None
+
+
+async def forget_media_asset(path: str) -> None:
+    media_cache.pop(path)
+    await delete_media_asset(path)
+
+
+async def send_photo_asset(bot: Bot, chat_id, path: str, **params) -> Message:
+    """
+    Отправляет фото с диска. Файл загружается в Telegram один раз, дальше отправляется по сохранённому file_id.
+    Если Telegram перестал узнавать file_id, файл загружается заново.
+    """
+    fingerprint = file_fingerprint(path)
+    if fingerprint is None:
+        raise FileNotFoundError(path)
+
+    file_id = await get_asset_file_id(path, fingerprint)
+    if file_id:
+        try:
+            return await bot.send_photo(chat_id=chat_id, photo=file_id, **params)
+        except TelegramBadRequest as e:
+            if "file" not in e.message.lower():
+                raise
+            await forget_media_asset(path)
+
+    message = await bot.send_photo(chat_id=chat_id, photo=FSInputFile(path), **params)
+    photo = message.photo[-1]
+    await save_media_asset(path, fingerprint, photo.file_id, photo.file_unique_id)
+    media_cache.set(path, (fingerprint, photo.file_id))
+    return message
@@ -0,0 +1,189 @@
+import asyncio
+import random
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramRetryAfter, TelegramForbiddenError, TelegramBadRequest
+from aiogram.types import InlineKeyboardMarkup, FSInputFile
+
+from app.database.models import NotificationOutbox
+from app.database.outbox import outbox_wakeup, claim_due_notifications, save_delivery_results, get_outbox_depth
+from config import bot
+
+
+class OutboxDispatcher:
+    """
+    Фоновая доставка уведомлений из notification_outbox.
+    Сообщения одного чата уходят строго по порядку, разные чаты — параллельно (не больше concurrency).
+    При TelegramRetryAfter вся отправка приостанавливается на указанное Telegram время.
+    Чаты, заблокировавшие бота, помечаются так же, как при рассылке, — в транзакции с итогами отправки.
+    """
+
+    METHODS = ("send_message", "send_document")
+
+    def __init__(
+        self,
+        bot: Bot,
+        batch_size: int = 50,
+        concurrency: int = 8,
+        poll_interval: float = 2.0,
+        max_attempts: int = 8,
+        base_delay: float = 5.0,
+        max_delay: float = 3600.0,
+    ):
+        self.bot = bot
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.sent = 0
+        self.retried = 0
+        self.dropped = 0
+        self.last_lag = 0.0
+        self._lag_total = 0.0
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._paused_until = 0.0
+
+    async def run(self) -> None:
+        while True:
+            try:
+                batch = await claim_due_notifications(self.batch_size)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"⚠️ Не удалось прочитать очередь уведомлений: {e}")
+                await asyncio.sleep(self.poll_interval)
+                continue
+
+            if not batch:
+                outbox_wakeup.clear()
+                try:
+                    await asyncio.wait_for(outbox_wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            results, blocked_chats = await self.deliver(batch)
+            try:
+                await save_delivery_results(results, blocked_chats)
+            except Exception as e:
+                # Записи вернутся в очередь по истечении аренды; возможна повторная доставка
+                print(f"⚠️ Не удалось сохранить результаты отправки уведомлений: {e}")
+
+    async def deliver(self, batch: list[NotificationOutbox]) -> tuple[list[dict], set[str]]:
+        """Итоги отправки для save_delivery_results и чаты, заблокировавшие бота."""
+        by_chat: dict[str, list[NotificationOutbox]] = defaultdict(list)
+        for row in batch:
+            by_chat[row.chat_id].append(row)
+
+        results: list[dict] = []
+        blocked_chats: set[str] = set()
+        await asyncio.gather(*(self.deliver_chat(rows, results, blocked_chats) for rows in by_chat.values()))
+        return results, blocked_chats
+
+    async def deliver_chat(self, rows: list[NotificationOutbox], results: list[dict], blocked_chats: set[str]) -> None:
+        for index, row in enumerate(rows):
+            async with self._semaphore:
+                await self.wait_if_paused()
+                result = await self.send(row)
+            results.append(result)
+
+            if result.pop("chat_blocked", False):
+                # Остальные сообщения этого чата не отправляем — Telegram ответит тем же
+                blocked_chats.add(row.chat_id)
+                self.dropped += len(rows) - index - 1
+                results.extend(
+                    {"id": rest.id, "status": "failed", "attempts": rest.attempts, "last_error": result["last_error"]}
+                    for rest in rows[index + 1:]
+                )
+                return
+
+            if result["status"] == "pending":
+                # Следующие сообщения этого чата откладываем на то же время, чтобы не нарушить порядок
+                results.extend(
+                    {"id": rest.id, "next_attempt_at": result["next_attempt_at"]}
+                    for rest in rows[index + 1:]
+                )
+                return
+
+    async def wait_if_paused(self) -> None:
+        delay = self._paused_until - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    async def send(self, row: NotificationOutbox) -> dict:
+        if row.method not in self.METHODS:
+            self.dropped += 1
+            return {"id": row.id, "status": "failed", "last_error": f"Неизвестный метод {row.method}"}
+
+        params = dict(row.payload)
+        if "reply_markup" in params:
+            params["reply_markup"] = InlineKeyboardMarkup.model_validate(params["reply_markup"])
+        if row.method == "send_document":
+            params["document"] = FSInputFile(params["document"])
+
+        try:
+            await getattr(self.bot, row.method)(chat_id=row.chat_id, **params)
+        except TelegramRetryAfter as e:
+            self._paused_until = max(self._paused_until, time.monotonic() + e.retry_after)
+            self.retried += 1
+            return {
+                "id": row.id,
+                "status": "pending",
+                "next_attempt_at": datetime.now() + timedelta(seconds=e.retry_after),
+                "last_error": str(e),
+            }
+        except TelegramForbiddenError as e:
+            # Бот заблокирован — повтор не поможет, чат попадёт в список подавления
+            self.dropped += 1
+            return {
+                "id": row.id,
+                "status": "failed",
+                "attempts": row.attempts + 1,
+                "last_error": str(e),
+                "chat_blocked": True,
+            }
+        except TelegramBadRequest as e:
+            # Запрос некорректен — повтор не поможет
+            self.dropped += 1
+            return {"id": row.id, "status": "failed", "attempts": row.attempts + 1, "last_error": str(e)}
+        except Exception as e:
+            attempts = row.attempts + 1
+            if attempts >= self.max_attempts:
+                self.dropped += 1
+                print(f"⚠️ Уведомление {row.id} не доставлено после {attempts} попыток: {e}")
+                return {"id": row.id, "status": "failed", "attempts": attempts, "last_error": str(e)}
+
+            self.retried += 1
+            delay = min(self.base_delay * 2 ** (attempts - 1), self.max_delay) * random.uniform(0.8, 1.2)
+            return {
+                "id": row.id,
+                "status": "pending",
+                "attempts": attempts,
+                "next_attempt_at": datetime.now() + timedelta(seconds=delay),
+                "last_error": str(e),
+            }
+
+        sent_at = datetime.now()
+        self.sent += 1
+        self.last_lag = (sent_at - row.created_at).total_seconds()
+        self._lag_total += self.last_lag
+        return {"id": row.id, "status": "sent", "attempts": row.attempts + 1, "sent_at": sent_at, "last_error": None}
+
+    async def stats(self) -> dict:
+        """Метрики очереди: глубина и возраст из БД, счётчики и задержка доставки этого процесса."""
+        return {
+            **await get_outbox_depth(),
+            "sent": self.sent,
+            "retried": self.retried,
+            "dropped": self.dropped,
+            "last_lag": round(self.last_lag, 3),
+            "avg_lag": round(self._lag_total / self.sent, 3) if self.sent else 0.0,
+            "paused_for": round(max(self._paused_until - time.monotonic(), 0.0), 1),
+        }
+
+
+outbox_dispatcher = OutboxDispatcher(bot)
@@ -0,0 +1,44 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+import qrcode
+
+from app.utils.cache import TTLCache, MISSING
+from app.utils.qr_tokens import QR_TOKEN_TTL
+
+# Общий пул для отрисовки: построение матрицы и PNG-кодирование не блокируют цикл событий
+_render_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="qr-render")
+
+# Содержимое QR -> {"png": bytes, "file_id": str | None}; живёт не дольше самого токена
+qr_image_cache = TTLCache(maxsize=512, ttl=QR_TOKEN_TTL)
+
+
+def render_qr_png(data: str) -> bytes:
+    qr = qrcode.QRCode(version=1, box_size=10, border=5)
+    qr.add_data(data)
+    qr.make(fit=True)
+    qr_img = qr.make_image(fill_color="black", back_color="white")
+
+    buffer = BytesIO()
+    qr_img.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+async def get_qr_image(data: str) -> dict:
+    """Готовое изображение из кэша или новая отрисовка в пуле потоков."""
+    cached = qr_image_cache.get(data)
+    if cached is not MISSING:
+        return cached
+
+    loop = asyncio.get_running_loop()
+    image = {"png": await loop.run_in_executor(_render_executor, render_qr_png, data), "file_id": None}
+    qr_image_cache.set(data, image)
+    return image
+
+
+def remember_qr_file_id(data: str, file_id: str) -> None:
+    """После первой отправки Telegram хранит фото у себя — повторно шлём только file_id."""
+    cached = qr_image_cache.get(data)
+    if cached is not MISSING:
+        cached["file_id"] = file_id
@@ -0,0 +1,79 @@
+import base64
+import hashlib
+import hmac
+import struct
+import time
+
+from config import QR_SECRET, redis_client
+
+QR_TOKEN_PREFIX = "qr_"
+QR_TOKEN_TTL = 30 * 60  # Токен действует 30 минут
+QR_REISSUE_INTERVAL = 30 * 60  # Новый QR — не чаще раза в 30 минут
+QR_MIN_REMAINING = 5 * 60  # Почти истёкший токен не отдаём повторно — у кассы он может не успеть
+SIGNATURE_SIZE = 10
+
+# id пользователя (uint32) + момент истечения (uint32, unix-время) + усечённый HMAC-SHA256:
+# 18 байт -> 24 символа base64url, вместе с префиксом 27 символов при лимите /start в 64
+_PAYLOAD = struct.Struct(">II")
+
+
+def _sign(payload: bytes) -> bytes:
+    return hmac.new(QR_SECRET.encode(), payload, hashlib.sha256).digest()[:SIGNATURE_SIZE]
+
+
+def issue_qr_token(user_id: int, ttl: int = QR_TOKEN_TTL) -> str:
+    payload = _PAYLOAD.pack(user_id, int(time.time()) + ttl)
+    token = base64.urlsafe_b64encode(payload + _sign(payload)).decode().rstrip("=")
+    return QR_TOKEN_PREFIX + token
+
+
+def decode_qr_token(token: str) -> tuple[int, int] | None:
+    """Проверяет подпись без обращения к БД. Возвращает (id пользователя, момент истечения) или None."""
+    if not token.startswith(QR_TOKEN_PREFIX):
+        return None
+
+    try:
+        raw = base64.urlsafe_b64decode(token[len(QR_TOKEN_PREFIX):] + "==")
+    except ValueError:
+        return None
+    if len(raw) != _PAYLOAD.size + SIGNATURE_SIZE:
+        return None
+
+    payload, signature = raw[:_PAYLOAD.size], raw[_PAYLOAD.size:]
+    if not hmac.compare_digest(signature, _sign(payload)):
+        return None
+    return _PAYLOAD.unpack(payload)
+
+
+def verify_qr_token(token: str) -> int | None:
+    """Проверяет подпись и срок действия без обращения к БД. Возвращает id пользователя или None."""
+    decoded = decode_qr_token(token)
+    if decoded is None or decoded[1] < time.time():
+        return None
+    return decoded[0]
+
+
+def qr_token_remaining(token: str) -> int:
+    """Сколько секунд токен ещё действует; 0 — истёк или недействителен."""
+    decoded = decode_qr_token(token)
+    return max(0, int(decoded[1] - time.time())) if decoded else 0
+
+
+async def get_or_issue_qr_token(user_tg_id, user_id: int) -> tuple[str, bool]:
+    """
+    Новый токен не чаще раза в 30 минут: ключ с TTL в Redis хранит действующий токен.
+    Если выданному токену осталось меньше QR_MIN_REMAINING, выпускается новый.
+    Возвращает (токен, выпущен_ли_сейчас). Без Redis выпускает новый токен без ограничения.
+    """
+    token = issue_qr_token(user_id)
+    key = f"qr:issued:{user_tg_id}"
+    try:
+        if await redis_client.set(key, token, nx=True, ex=QR_REISSUE_INTERVAL):
+            return token, True
+        current = await redis_client.get(key)
+        if current and verify_qr_token(current) == user_id and qr_token_remaining(current) >= QR_MIN_REMAINING:
+            return current, False
+        await redis_client.set(key, token, ex=QR_REISSUE_INTERVAL)
+    except Exception as e:
+        print(f"⚠️ Не удалось проверить лимит выдачи QR: {e}")
+    return token, True
@@ -42,4 +42,9 @@ class StorageCellStates(StatesGroup):
     waiting_description = State()
     waiting_scheduled_month = State()
     waiting_photos = State()
-    waiting_extend_month = State()
\ No newline at end of file
+    waiting_extend_month = State()
+
+
+class BatchTransactionStates(StatesGroup):
+    waiting_lines = State()
+    confirm = State()
@@ -0,0 +1,157 @@
+import asyncio
+import hmac
+import time
+from collections import deque
+
+from aiohttp import web
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update
+
+from app.utils.cache import role_cache, bonus_settings_cache
+from app.utils.notifications import outbox_dispatcher
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+def percentile(values, fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class WebhookServer:
+    """
+    Приём обновлений от Telegram по HTTP. Запрос проверяется по секретному заголовку и сразу
+    получает ответ 200, а само обновление встаёт в ограниченную очередь, которую разбирают
+    workers обработчиков. Если очередь полна — ответ 503, и Telegram повторит доставку позже.
+    """
+
+    def __init__(self, bot: Bot, dp: Dispatcher, path: str, secret: str, workers: int = 8, queue_size: int = 1000):
+        self.bot = bot
+        self.dp = dp
+        self.path = path
+        self.secret = secret
+        self.workers = workers
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.received = 0
+        self.processed = 0
+        self.rejected = 0
+        self.unauthorized = 0
+        self.errors = 0
+        self.started_at = time.monotonic()
+        self._latencies: deque[float] = deque(maxlen=2000)
+        self._tasks: list[asyncio.Task] = []
+        self._runner: web.AppRunner | None = None
+
+    def build_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post(self.path, self.handle_update)
+        app.router.add_get("/health", self.health)
+        app.router.add_get("/metrics", self.metrics)
+        return app
+
+    async def handle_update(self, request: web.Request) -> web.Response:
+        if not hmac.compare_digest(request.headers.get(SECRET_HEADER, ""), self.secret):
+            self.unauthorized += 1
+            return web.Response(status=401)
+
+        try:
+            update = Update.model_validate(await request.json(), context={"bot": self.bot})
+        except Exception:
+            return web.Response(status=400)
+
+        try:
+            self.queue.put_nowait((update, time.monotonic()))
+        except asyncio.QueueFull:
+            self.rejected += 1
+            return web.Response(status=503)
+
+        self.received += 1
+        return web.Response()
+
+    async def worker(self) -> None:
+        while True:
+            update, received_at = await self.queue.get()
+            try:
+                await self.dp.feed_update(self.bot, update)
+            except Exception as e:
+                self.errors += 1
+                print(f"⚠️ Ошибка при обработке обновления {update.update_id}: {e}")
+            finally:
+                self.processed += 1
+                self._latencies.append(time.monotonic() - received_at)
+                self.queue.task_done()
+
+    async def health(self, request: web.Request) -> web.Response:
+        alive = sum(not task.done() for task in self._tasks)
+        return web.json_response(
+            {"status": "ok" if alive == self.workers else "degraded", "workers": alive, "queue": self.queue.qsize()},
+            status=200 if alive else 503
+        )
+
+    async def metrics(self, request: web.Request) -> web.Response:
+        try:
+            outbox = await outbox_dispatcher.stats()
+        except Exception as e:
+            outbox = {"error": str(e)}
+
+        return web.json_response({
+            "webhook": self.stats(),
+            "role_cache": role_cache.stats(),
+            "bonus_settings_cache": bonus_settings_cache.stats(),
+            "outbox": outbox,
+        })
+
+    def stats(self) -> dict:
+        """Счётчики приёма и обработки, глубина очереди и задержка от приёма до конца обработки."""
+        return {
+            "received": self.received,
+            "processed": self.processed,
+            "rejected": self.rejected,
+            "unauthorized": self.unauthorized,
+            "errors": self.errors,
+            "queue": self.queue.qsize(),
+            "queue_max": self.queue.maxsize,
+            "latency_p50": round(percentile(self._latencies, 0.5), 4),
+            "latency_p95": round(percentile(self._latencies, 0.95), 4),
+            "uptime": round(time.monotonic() - self.started_at, 1),
+        }
+
+    async def start(self, host: str, port: int, webhook_url: str | None = None) -> None:
+        self._tasks = [asyncio.create_task(self.worker()) for _ in range(self.workers)]
+
+        self._runner = web.AppRunner(self.build_app(), access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+
+        if webhook_url:
+            await self.bot.set_webhook(
+                url=webhook_url.rstrip("/") + self.path,
+                secret_token=self.secret,
+                allowed_updates=self.dp.resolve_used_update_types(),
+            )
+        print(f"✅ Webhook-сервер слушает {host}:{port}{self.path}")
+
+    async def stop(self, drain_timeout: float = 10.0) -> None:
+        """Перестаёт принимать запросы и даёт обработчикам дообработать очередь."""
+        if self._runner:
+            await self._runner.cleanup()
+        try:
+            await asyncio.wait_for(self.queue.join(), timeout=drain_timeout)
+        except asyncio.TimeoutError:
+            print(f"⚠️ Не дообработано обновлений: {self.queue.qsize()}")
+        for task in self._tasks:
+            task.cancel()
+
+
+async def run_webhook(bot: Bot, dp: Dispatcher, webhook_url: str | None, path: str, secret: str,
+                      host: str, port: int, workers: int, queue_size: int) -> None:
+    server = WebhookServer(bot, dp, path, secret, workers=workers, queue_size=queue_size)
+    await dp.emit_startup(bot=bot)
+    await server.start(host, port, webhook_url)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.stop()
+        await dp.emit_shutdown(bot=bot)
@@ -1,3 +1,4 @@
+import hashlib
 import os
 from dotenv import load_dotenv
 from redis.asyncio import Redis
@@ -10,6 +11,7 @@ load_dotenv()
 # === Основные токены и параметры ===
 BOT_TOKEN: str = os.getenv("BOT_TOKEN")
 AI_TOKEN: str = os.getenv("AI_TOKEN")
+QR_SECRET: str = os.getenv("QR_SECRET") or BOT_TOKEN or ""  # Ключ подписи QR-токенов
 
 # === Каналы ===
 CHANNEL_ID_DAILY: str = os.getenv("CHANNEL_ID_DAILY")
@@ -21,6 +23,20 @@ PHONE_NUMBER: str = os.getenv("MOBILE_PHONE")
 OWNER: str = os.getenv("OWNER")
 ADMIN_ID: list[int] = [int(i.strip()) for i in os.getenv("ADMIN_ID", "").split(",") if i.strip().isdigit()]
 
+# === База данных ===
+DATABASE_URL: str = os.getenv("DATABASE_URL", "sqlite+aiosqlite:///db.sqlite3")
+SQLITE_PROFILE: str = os.getenv("SQLITE_PROFILE", "tuned")  # tuned / default
+
+# === Режим получения обновлений: polling / webhook ===
+BOT_MODE: str = os.getenv("BOT_MODE", "polling")
+WEBHOOK_URL: str | None = os.getenv("WEBHOOK_URL")  # Публичный https-адрес бота, например https://bot.example.com
+WEBHOOK_PATH: str = os.getenv("WEBHOOK_PATH", "/webhook")
+WEBHOOK_SECRET: str = os.getenv("WEBHOOK_SECRET") or hashlib.sha256((BOT_TOKEN or "").encode()).hexdigest()
+WEBHOOK_HOST: str = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT: int = int(os.getenv("WEBHOOK_PORT", "8080"))
+WEBHOOK_WORKERS: int = int(os.getenv("WEBHOOK_WORKERS", "8"))  # Сколько обновлений обрабатывается параллельно
+WEBHOOK_QUEUE_SIZE: int = int(os.getenv("WEBHOOK_QUEUE_SIZE", "1000"))  # При переполнении Telegram получает 503 и повторит доставку
+
 # === Redis настройки ===
 REDIS_PASSWORD: str | None = os.getenv("REDIS_PASSWORD")
 REDIS_PORT: int | None = os.getenv("REDIS_PORT")
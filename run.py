@@ -1,15 +1,24 @@
 import asyncio
 
-from config import bot, dp
+from config import (
+    bot, dp, BOT_MODE, WEBHOOK_URL, WEBHOOK_PATH, WEBHOOK_SECRET, WEBHOOK_HOST, WEBHOOK_PORT,
+    WEBHOOK_WORKERS, WEBHOOK_QUEUE_SIZE
+)
 from app.database.models import async_main
+from app.database.migrations import run_migrations
 from app.handlers.main import setup_middleware
 from app.scheduler.tasks import setup_scheduler
+from app.utils.cache import listen_role_invalidation
+from app.utils.notifications import outbox_dispatcher
+from app.utils.broadcast import resume_broadcasts
+from app.utils.webhook import run_webhook
 
 from app.database.seed import seed
 
 
 async def main():
-    await async_main()
+    fresh_schema = await async_main()
+    await run_migrations(fresh_schema)
     await seed()
 
     routers = await setup_middleware()
@@ -17,10 +26,23 @@ async def main():
         dp.include_router(router)
 
     scheduler = await setup_scheduler(bot)
+    role_listener = asyncio.create_task(listen_role_invalidation())
+    outbox_task = asyncio.create_task(outbox_dispatcher.run())
+    await resume_broadcasts(bot)
 
     try:
-        await dp.start_polling(bot)
+        if BOT_MODE == "webhook":
+            await run_webhook(
+                bot, dp, WEBHOOK_URL, WEBHOOK_PATH, WEBHOOK_SECRET, WEBHOOK_HOST, WEBHOOK_PORT,
+                workers=WEBHOOK_WORKERS, queue_size=WEBHOOK_QUEUE_SIZE
+            )
+        else:
+            # После работы через webhook Telegram не отдаёт обновления через getUpdates, пока webhook не снят
+            await bot.delete_webhook()
+            await dp.start_polling(bot)
     finally:
+        role_listener.cancel()
+        outbox_task.cancel()
         await bot.session.close()
         scheduler.shutdown()
 
@@ -0,0 +1 @@
+"""Проверки и бенчмарки. Запуск из корня проекта: python -m scripts.<имя>."""
@@ -0,0 +1,122 @@
+"""
+Сравнение рассылки прежним последовательным циклом и движком на локальном фиктивном Bot API.
+Сервер отвечает с задержкой LATENCY, возвращает 429 при превышении 30 сообщений в секунду
+и 403 для каждого двадцатого чата. Рассылка движком идёт через временную базу.
+
+    python -m scripts.bench_broadcast [получателей]    # по умолчанию 500
+"""
+import asyncio
+import sys
+import time
+from collections import deque
+
+from aiohttp import web
+from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+
+from scripts.common import use_temporary_database, prepare_database
+
+RECIPIENTS = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+LATENCY, FLOOD_LIMIT, API_PORT = 0.1, 30, 18083
+
+
+class FakeBotAPI:
+    def __init__(self):
+        self.recent: deque[float] = deque()
+        self.delivered: set[str] = set()
+        self.flood = 0
+
+    async def method(self, request: web.Request) -> web.Response:
+        data = await request.post()
+        await asyncio.sleep(LATENCY)
+        now = time.monotonic()
+        while self.recent and now - self.recent[0] > 1:
+            self.recent.popleft()
+        if len(self.recent) >= FLOOD_LIMIT:
+            self.flood += 1
+            return web.json_response({
+                "ok": False, "error_code": 429, "description": "Too Many Requests: retry after 1",
+                "parameters": {"retry_after": 1}
+            }, status=429)
+        self.recent.append(now)
+
+        chat_id = data["chat_id"]
+        if int(chat_id) % 20 == 0:
+            return web.json_response(
+                {"ok": False, "error_code": 403, "description": "Forbidden: bot was blocked by the user"}, status=403
+            )
+        self.delivered.add(chat_id)
+        return web.json_response({"ok": True, "result": {
+            "message_id": 1, "date": int(time.time()), "text": data.get("text", ""),
+            "chat": {"id": int(chat_id), "type": "private"},
+        }})
+
+
+async def serial_broadcast(bot: Bot, chat_ids: list[str]) -> tuple[int, int]:
+    """Прежняя отправка: по одному сообщению, без учёта TelegramRetryAfter."""
+    sent = errors = 0
+    for chat_id in chat_ids:
+        try:
+            await bot.send_message(chat_id=chat_id, text="bench", parse_mode='HTML')
+            sent += 1
+        except Exception:
+            errors += 1
+    return sent, errors
+
+
+async def engine_broadcast(bot: Bot, rate: float, capacity: float, concurrency: int) -> tuple[int, int]:
+    from sqlalchemy import select
+
+    from app.database.models import User
+    from app.database.broadcasts import create_broadcast_job, get_broadcast_job
+    from app.utils.broadcast import TokenBucket, run_broadcast_job
+
+    job = await create_broadcast_job(0, "bench", None, select(User.user_id))
+    await run_broadcast_job(bot, job.id, concurrency=concurrency, bucket=TokenBucket(rate=rate, capacity=capacity))
+    job = await get_broadcast_job(job.id)
+    return job.sent, job.blocked + job.failed
+
+
+async def main() -> None:
+    from app.database.models import engine
+    from app.utils.broadcast import BROADCAST_RATE, BROADCAST_BURST, BROADCAST_CONCURRENCY
+
+    await prepare_database()
+    chat_ids = [str(1000 + index) for index in range(RECIPIENTS)]
+    async with engine.begin() as conn:
+        await conn.exec_driver_sql(
+            "INSERT INTO users (user_id, registration_date, name, role) VALUES (?, CURRENT_TIMESTAMP, ?, ?)",
+            [(chat_id, f"user{chat_id}", "Пользователь") for chat_id in chat_ids]
+        )
+
+    session = AiohttpSession(api=TelegramAPIServer.from_base(f"http://127.0.0.1:{API_PORT}"))
+    bench_bot = Bot(token="1:bench", session=session)
+    print(f"{RECIPIENTS} получателей, ответ API {LATENCY * 1000:.0f} мс, лимит {FLOOD_LIMIT} сообщений/с")
+
+    variants = (
+        ("последовательно", lambda: serial_broadcast(bench_bot, chat_ids)),
+        ("без ограничителя", lambda: engine_broadcast(bench_bot, 10_000, 10_000, 50)),
+        ("движок", lambda: engine_broadcast(bench_bot, BROADCAST_RATE, BROADCAST_BURST, BROADCAST_CONCURRENCY)),
+    )
+    for name, run in variants:
+        api = FakeBotAPI()
+        app = web.Application()
+        app.router.add_post("/bot{token}/{method}", api.method)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, "127.0.0.1", API_PORT).start()
+
+        started = time.monotonic()
+        sent, errors = await run()
+        elapsed = time.monotonic() - started
+        await runner.cleanup()
+        print(f"{name:17} {elapsed:6.1f} с   {sent / elapsed:5.1f} сообщ./с   доставлено {len(api.delivered)}   "
+              f"ошибок {errors}   ответов 429: {api.flood}")
+
+    await session.close()
+
+
+if __name__ == "__main__":
+    use_temporary_database()
+    asyncio.run(main())
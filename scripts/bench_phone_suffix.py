@@ -0,0 +1,89 @@
+"""
+Поиск клиента по последним 4 цифрам: прежний LIKE '%1234' по mobile_phone против
+индексированного phone_suffix с ранжированием по свежести покупок. Данные синтетические,
+во временной базе, которая дорастает до каждого следующего размера.
+
+    python -m scripts.bench_phone_suffix [размер ...]    # по умолчанию 100000 1000000
+"""
+import asyncio
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+from scripts.common import use_temporary_database, prepare_database, percentile
+
+SIZES = sorted(int(size) for size in sys.argv[1:]) or [100_000, 1_000_000]
+LOOKUPS, CHUNK = 200, 100_000
+
+
+async def get_phone_numbers_by_suffix_like(suffix: str) -> list[str]:
+    """Прежняя реализация: LIKE '%1234' не может использовать индекс и просматривает всю таблицу."""
+    from sqlalchemy import select
+
+    from app.database.models import async_session, User
+
+    async with async_session() as session:
+        result = await session.execute(select(User.mobile_phone).where(User.mobile_phone.endswith(suffix)))
+        return result.scalars().all()
+
+
+async def fill(start: int, end: int) -> None:
+    """Клиенты с номерами start..end; у каждого двадцатого — покупка для ранжирования по свежести."""
+    from app.database.models import engine
+
+    now = datetime.now()
+    async with engine.begin() as conn:
+        for offset in range(start, end, CHUNK):
+            users = [
+                (str(index), now.isoformat(" "), f"user{index}", f"89{index:09d}", f"{index:04d}"[-4:], "Пользователь")
+                for index in range(offset, min(end, offset + CHUNK))
+            ]
+            await conn.exec_driver_sql(
+                "INSERT INTO users (user_id, registration_date, name, mobile_phone, phone_suffix, role) "
+                "VALUES (?, ?, ?, ?, ?, ?)", users
+            )
+            await conn.exec_driver_sql(
+                "INSERT INTO purchase_history (user_id, worker_id, transaction_date, transaction_type, amount, bonus_amount) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    (user[0], "bench", (now - timedelta(minutes=int(user[0]) % 10_000)).isoformat(" "), "add", 100.0, 5.0)
+                    for user in users[::20]
+                ]
+            )
+
+
+async def measure(lookup, suffixes: list[str]) -> tuple[float, float]:
+    latencies = []
+    for suffix in suffixes:
+        started = time.perf_counter()
+        await lookup(suffix)
+        latencies.append(time.perf_counter() - started)
+    return percentile(latencies, 0.5) * 1000, percentile(latencies, 0.99) * 1000
+
+
+async def main() -> None:
+    from app.database.requests import get_phone_numbers_by_suffix
+
+    await prepare_database()
+    rnd = random.Random(4)
+    filled = 0
+    for size in SIZES:
+        started = time.perf_counter()
+        await fill(filled, size)
+        filled = size
+        print(f"{size} клиентов, база заполнена за {time.perf_counter() - started:.1f} с")
+
+        suffixes = [f"{rnd.randrange(10_000):04d}" for _ in range(LOOKUPS)]
+        for suffix in suffixes[:10]:
+            assert sorted(await get_phone_numbers_by_suffix(suffix)) == sorted(await get_phone_numbers_by_suffix_like(suffix))
+
+        for name, lookup in (("LIKE '%1234'", get_phone_numbers_by_suffix_like),
+                             ("phone_suffix", get_phone_numbers_by_suffix)):
+            p50, p99 = await measure(lookup, suffixes)
+            print(f"  {name:13} p50 {p50:8.2f} мс   p99 {p99:8.2f} мс")
+
+
+if __name__ == "__main__":
+    use_temporary_database()
+    asyncio.run(main())
@@ -0,0 +1,19 @@
+"""
+Сколько QR в секунду отрисовывается в одном потоке.
+
+    python -m scripts.bench_qr_render
+"""
+import time
+
+from app.utils.qr_render import render_qr_png
+
+SAMPLE = "https://t.me/ShinomartBOT?start=qr_AAHiQGrUkdjOPH4nqd-BJKTU"
+COUNT = 200
+
+
+if __name__ == "__main__":
+    started = time.perf_counter()
+    for _ in range(COUNT):
+        render_qr_png(SAMPLE)
+    elapsed = time.perf_counter() - started
+    print(f"✅ {COUNT} QR за {elapsed:.2f} с — {COUNT / elapsed:.1f} в секунду, {elapsed / COUNT * 1000:.1f} мс на QR")
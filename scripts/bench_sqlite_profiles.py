@@ -0,0 +1,91 @@
+"""
+Сравнение профилей PRAGMA под конкурентной нагрузкой: писатели проводят начисления через
+set_bonus_balance, читатели строят статистику get_statistics. Профиль читается при импорте
+config, поэтому каждый запускается в отдельном процессе на своей временной базе.
+
+    python -m scripts.bench_sqlite_profiles
+"""
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+
+from scripts.common import use_temporary_database, prepare_database, percentile
+
+USERS, WRITERS, READERS, DURATION = 200, 8, 4, 5.0
+PROFILES = ("default", "tuned")
+
+
+async def run_load() -> dict:
+    from datetime import datetime
+
+    from app.database.models import engine
+    from app.database.requests import set_user, set_bonus_balance
+    from app.database.admin_requests import get_statistics
+
+    await prepare_database()
+    now = datetime.now()
+    for index in range(USERS):
+        await set_user(str(10_000 + index), now, f"bench{index}", f"8900{index:07d}", now, 0)
+
+    latencies = {"write": [], "read": []}
+    errors = {"write": 0, "read": 0}
+    deadline = time.monotonic() + DURATION
+
+    async def writer():
+        rnd = random.Random()
+        while time.monotonic() < deadline:
+            started = time.monotonic()
+            try:
+                ok = await set_bonus_balance(str(10_000 + rnd.randrange(USERS)), "add", 1, 10, "bench")
+            except Exception:
+                ok = False  # "database is locked" и прочие ошибки блокировок
+            latencies["write"].append(time.monotonic() - started)
+            errors["write"] += not ok
+
+    async def reader():
+        while time.monotonic() < deadline:
+            started = time.monotonic()
+            try:
+                await get_statistics("month")
+            except Exception:
+                errors["read"] += 1
+            latencies["read"].append(time.monotonic() - started)
+
+    await asyncio.gather(*(writer() for _ in range(WRITERS)), *(reader() for _ in range(READERS)))
+    await engine.dispose()
+    return {
+        kind: {
+            "ops": round(len(values) / DURATION, 1),
+            "p50": round(percentile(values, 0.5) * 1000, 1),
+            "p99": round(percentile(values, 0.99) * 1000, 1),
+            "errors": errors[kind],
+        }
+        for kind, values in latencies.items()
+    }
+
+
+def main() -> None:
+    print(f"{WRITERS} писателей, {READERS} читателей, {DURATION:.0f} с на профиль")
+    for profile in PROFILES:
+        child = subprocess.run(
+            [sys.executable, "-m", "scripts.bench_sqlite_profiles", profile], capture_output=True, text=True
+        )
+        if child.returncode:
+            sys.exit(f"⚠️ Профиль {profile} завершился с ошибкой:\n{child.stderr[-2000:]}")
+        result = json.loads(child.stdout.strip().splitlines()[-1])
+        for kind in ("write", "read"):
+            stats = result[kind]
+            print(f"{profile:8} {kind:5} {stats['ops']:8.1f} оп/с   p50 {stats['p50']:7.1f} мс   "
+                  f"p99 {stats['p99']:7.1f} мс   ошибок {stats['errors']}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] in PROFILES:
+        use_temporary_database(profile=sys.argv[1])
+        print(json.dumps(asyncio.run(run_load())))
+    else:
+        main()
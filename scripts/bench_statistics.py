@@ -0,0 +1,118 @@
+"""
+Сравнение get_statistics: прежние семь последовательных запросов против текущей сборки
+из daily_rollup. История синтетическая, во временной базе.
+
+    python -m scripts.bench_statistics [строк]    # по умолчанию 1000000
+"""
+import asyncio
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+from scripts.common import use_temporary_database, prepare_database
+
+ROWS = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+USERS, DAYS, CHUNK, REPEATS = 50_000, 365, 100_000, 5
+PERIODS = {"day": timedelta(days=1), "week": timedelta(weeks=1), "month": timedelta(days=30)}
+
+
+def period_filter(period: str):
+    from sqlalchemy import true
+
+    from app.database.models import PurchaseHistory
+
+    delta = PERIODS.get(period)
+    return PurchaseHistory.transaction_date >= datetime.now() - delta if delta else true()
+
+
+async def get_statistics_sequential(period: str = "all") -> dict:
+    """Прежняя реализация: семь запросов, шесть из них — отдельные проходы по purchase_history."""
+    from sqlalchemy import select, func, distinct
+
+    from app.database.models import async_session, User, UserBonusBalance, PurchaseHistory
+
+    where = period_filter(period)
+    async with async_session() as session:
+        async def scalar(query):
+            return (await session.execute(query)).scalar()
+
+        return {
+            "total_users": await scalar(select(func.count(User.user_id))) or 0,
+            "total_amount": await scalar(select(func.sum(PurchaseHistory.amount)).where(where)) or 0.0,
+            "total_bonus_amount": await scalar(select(func.sum(PurchaseHistory.bonus_amount)).where(
+                PurchaseHistory.transaction_type == "Пополнение", where)) or 0.0,
+            "total_transactions": await scalar(select(func.count(PurchaseHistory.id)).where(where)) or 0,
+            "average_purchase_amount": await scalar(select(func.avg(PurchaseHistory.amount)).where(where)) or 0.0,
+            "active_users": await scalar(select(func.count(distinct(PurchaseHistory.user_id))).where(where)) or 0,
+            "total_bonus_balance": await scalar(select(func.sum(UserBonusBalance.balance))) or 0.0,
+        }
+
+
+async def fill() -> None:
+    from app.database.models import engine
+    from app.database.rollup import rebuild_daily_rollup_on
+
+    rnd = random.Random(5)
+    now = datetime.now()
+    async with engine.begin() as conn:
+        await conn.exec_driver_sql(
+            "INSERT INTO users (user_id, registration_date, name, role) VALUES (?, ?, ?, ?)",
+            [(str(index), now.isoformat(" "), f"user{index}", "Пользователь") for index in range(USERS)]
+        )
+        await conn.exec_driver_sql(
+            "INSERT INTO user_bonus_balance (user_id, balance) VALUES (?, ?)",
+            [(str(index), float(rnd.randrange(0, 5000))) for index in range(USERS)]
+        )
+        for start in range(0, ROWS, CHUNK):
+            await conn.exec_driver_sql(
+                "INSERT INTO purchase_history (user_id, worker_id, transaction_date, transaction_type, amount, bonus_amount) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    (
+                        str(rnd.randrange(USERS)), f"worker{rnd.randrange(10)}",
+                        (now - timedelta(seconds=rnd.randrange(DAYS * 86400))).isoformat(" "),
+                        "Пополнение" if rnd.random() < 0.8 else "Списание",
+                        float(rnd.randrange(500, 20000)), float(rnd.randrange(0, 1000)),
+                    )
+                    for _ in range(start, min(ROWS, start + CHUNK))
+                ]
+            )
+        await rebuild_daily_rollup_on(conn)
+
+
+async def measure(func_, period: str) -> tuple[float, dict]:
+    timings, result = [], None
+    for _ in range(REPEATS):
+        started = time.perf_counter()
+        result = await func_(period)
+        timings.append(time.perf_counter() - started)
+    return min(timings) * 1000, result
+
+
+async def main() -> None:
+    from app.database.admin_requests import get_statistics
+
+    await prepare_database()
+    started = time.perf_counter()
+    await fill()
+    print(f"{ROWS} покупок, {USERS} клиентов, база заполнена за {time.perf_counter() - started:.1f} с")
+
+    for period in ("month", "all"):
+        print(f"период {period}:")
+        baseline = None
+        for name, func_ in (("7 запросов", get_statistics_sequential),
+                            ("daily_rollup", get_statistics)):
+            elapsed, result = await measure(func_, period)
+            baseline = baseline or result
+            # Суммы и количества должны совпадать; active_users в daily_rollup — оценка HyperLogLog
+            for key in ("total_users", "total_transactions", "total_bonus_balance"):
+                assert result[key] == baseline[key], (name, key, result[key], baseline[key])
+            for key in ("total_amount", "total_bonus_amount"):
+                assert abs(result[key] - baseline[key]) <= 1e-6 * max(1.0, baseline[key]), (name, key)
+            print(f"  {name:13} {elapsed:9.1f} мс   активных клиентов {result['active_users']}")
+
+
+if __name__ == "__main__":
+    use_temporary_database()
+    asyncio.run(main())
@@ -0,0 +1,115 @@
+"""
+Сравнение загрузки контекста покупки: прежняя цепочка запросов из handle_amount_input
+(настройки, VIP, клиент, отзыв, снова настройки, сотрудник) против get_transaction_context.
+Временная база с синтетическими клиентами.
+
+    python -m scripts.bench_transaction_context [клиентов]    # по умолчанию 50000
+"""
+import asyncio
+import random
+import sys
+import time
+from datetime import datetime
+
+from scripts.common import use_temporary_database, prepare_database, count_statements, percentile
+
+USERS = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+EMPLOYEE_ID = "employee"
+LOOKUPS = 2000
+
+
+def phone(index: int) -> str:
+    return f"89{index:09d}"
+
+
+async def get_transaction_context_sequential(phone_number: str, employee_id) -> dict | None:
+    """Прежний путь: шесть запросов подряд, настройки читаются из базы дважды."""
+    from app.database import requests as rq
+
+    settings = await rq.load_bonus_system_settings()
+    is_vip = bool(await rq.check_vip_client(phone_number))
+    user = await rq.get_user_by_phone(phone_number)
+    if not user:
+        return None
+    can_vote = await rq.get_user_vote_history(user.user_id)
+    settings = await rq.load_bonus_system_settings()
+    employee = await rq.get_user_by_tg_id(employee_id)
+    return {
+        "user": user,
+        "balance": user.bonus_balance.balance if user.bonus_balance else 0.0,
+        "is_vip": is_vip,
+        "can_vote": can_vote,
+        "employee_name": employee.name if employee else None,
+        "settings": settings
+    }
+
+
+async def fill() -> None:
+    from app.database.models import engine
+
+    rnd = random.Random(11)
+    now = datetime.now().isoformat(" ")
+    async with engine.begin() as conn:
+        await conn.exec_driver_sql(
+            "INSERT INTO users (id, user_id, registration_date, name, mobile_phone, phone_suffix, role) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [(index, str(index), now, f"user{index}", phone(index), phone(index)[-4:], "Пользователь")
+             for index in range(1, USERS + 1)]
+        )
+        await conn.exec_driver_sql(
+            "INSERT INTO users (user_id, registration_date, name, role) VALUES (?, ?, ?, ?)",
+            (EMPLOYEE_ID, now, "Сотрудник", "Работник")
+        )
+        await conn.exec_driver_sql(
+            "INSERT INTO user_bonus_balance (user_id, balance) VALUES (?, ?)",
+            [(str(index), float(rnd.randrange(0, 5000))) for index in range(1, USERS + 1)]
+        )
+        await conn.exec_driver_sql(
+            "INSERT INTO vip_clients (user_id) VALUES (?)",
+            [(index,) for index in range(1, USERS + 1) if rnd.random() < 0.05]
+        )
+        await conn.exec_driver_sql(
+            "INSERT INTO vote_history (user_id, data) VALUES (?, ?)",
+            [(index, now) for index in range(1, USERS + 1) if rnd.random() < 0.3]
+        )
+
+
+async def measure(func_, phones: list[str]) -> tuple[list[float], int]:
+    from app.database.models import engine
+
+    timings = []
+    with count_statements(engine) as statements:
+        for phone_number in phones:
+            started = time.perf_counter()
+            await func_(phone_number, EMPLOYEE_ID)
+            timings.append((time.perf_counter() - started) * 1000)
+    return timings, len(statements)
+
+
+async def main() -> None:
+    from app.database.requests import get_transaction_context, get_bonus_system_settings
+
+    await prepare_database()
+    await fill()
+    await get_bonus_system_settings()  # прогрев кэша настроек, как в работающем боте
+
+    rnd = random.Random(42)
+    phones = [phone(rnd.randint(1, USERS)) for _ in range(LOOKUPS)]
+    for phone_number in phones[:50]:
+        old = await get_transaction_context_sequential(phone_number, EMPLOYEE_ID)
+        new = await get_transaction_context(phone_number, EMPLOYEE_ID)
+        for key in ("balance", "is_vip", "can_vote", "employee_name", "settings"):
+            assert old[key] == new[key], (phone_number, key, old[key], new[key])
+        assert old["user"].user_id == new["user"].user_id
+
+    print(f"{USERS} клиентов, {LOOKUPS} покупок:")
+    for name, func_ in (("цепочка запросов", get_transaction_context_sequential),
+                        ("один запрос", get_transaction_context)):
+        timings, statements = await measure(func_, phones)
+        print(f"  {name:17} p50 {percentile(timings, 0.5):6.2f} мс   p95 {percentile(timings, 0.95):6.2f} мс   "
+              f"запросов на покупку {statements / LOOKUPS:.1f}")
+
+
+if __name__ == "__main__":
+    use_temporary_database()
+    asyncio.run(main())
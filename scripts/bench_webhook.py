@@ -0,0 +1,140 @@
+"""
+Сравнение polling и webhook на локальном генераторе обновлений и фиктивном Bot API.
+Обработчик имитирует ввод-вывод (5 мс); задержка — от появления обновления до конца обработки.
+
+    python -m scripts.bench_webhook
+"""
+import asyncio
+import time
+from collections import deque
+
+from aiohttp import web, ClientSession
+from aiogram import Bot, Dispatcher
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+
+from app.utils.webhook import WebhookServer, SECRET_HEADER
+from scripts.common import percentile
+
+TOTAL, RATE, API_PORT, HOOK_PORT = 3000, 1000, 18081, 18082
+
+
+def make_update(update_id: int) -> dict:
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id, "date": int(time.time()), "text": "ping",
+            "chat": {"id": 1000 + update_id % 50, "type": "private"},
+            "from": {"id": 1000 + update_id % 50, "is_bot": False, "first_name": "bench"},
+        },
+    }
+
+
+async def fake_api(pending: deque, arrived: asyncio.Event) -> web.AppRunner:
+    async def method(request: web.Request) -> web.Response:
+        name = request.match_info["method"]
+        if name == "getMe":
+            return web.json_response({"ok": True, "result": {"id": 1, "is_bot": True, "first_name": "bench", "username": "bench_bot"}})
+        if name == "getUpdates":
+            if not pending:
+                arrived.clear()
+                try:
+                    await asyncio.wait_for(arrived.wait(), timeout=1)
+                except asyncio.TimeoutError:
+                    pass
+            batch = [pending.popleft() for _ in range(min(100, len(pending)))]
+            return web.json_response({"ok": True, "result": batch})
+        return web.json_response({"ok": True, "result": True})
+
+    app = web.Application()
+    app.router.add_post("/bot{token}/{method}", method)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", API_PORT).start()
+    return runner
+
+
+def make_dispatcher(generated: dict, latencies: list, done: asyncio.Event) -> Dispatcher:
+    dispatcher = Dispatcher()
+
+    @dispatcher.message()
+    async def handle(message):
+        await asyncio.sleep(0.005)
+        latencies.append(time.monotonic() - generated[message.message_id])
+        if len(latencies) == TOTAL:
+            done.set()
+
+    return dispatcher
+
+
+async def generate(emit) -> None:
+    started = time.monotonic()
+    for update_id in range(1, TOTAL + 1):
+        await asyncio.sleep(max(0.0, update_id / RATE - (time.monotonic() - started)))
+        emit(update_id)
+
+
+async def bench_polling(bench_bot: Bot) -> tuple[float, list]:
+    generated, latencies, done = {}, [], asyncio.Event()
+    pending, arrived = deque(), asyncio.Event()
+    api = await fake_api(pending, arrived)
+    dispatcher = make_dispatcher(generated, latencies, done)
+    polling = asyncio.create_task(dispatcher.start_polling(bench_bot, handle_signals=False, close_bot_session=False, polling_timeout=1))
+
+    def emit(update_id):
+        generated[update_id] = time.monotonic()
+        pending.append(make_update(update_id))
+        arrived.set()
+
+    started = time.monotonic()
+    await generate(emit)
+    await done.wait()
+    elapsed = time.monotonic() - started
+    await dispatcher.stop_polling()
+    await polling
+    await api.cleanup()
+    return elapsed, latencies
+
+
+async def bench_webhook(bench_bot: Bot) -> tuple[float, list]:
+    generated, latencies, done = {}, [], asyncio.Event()
+    dispatcher = make_dispatcher(generated, latencies, done)
+    server = WebhookServer(bench_bot, dispatcher, "/webhook", "bench", workers=32, queue_size=1000)
+    await server.start("127.0.0.1", HOOK_PORT)
+
+    async with ClientSession() as client:
+        limit = asyncio.Semaphore(64)
+        requests = set()
+
+        async def post(update_id):
+            async with limit:
+                generated[update_id] = time.monotonic()
+                async with client.post(f"http://127.0.0.1:{HOOK_PORT}/webhook", json=make_update(update_id),
+                                       headers={SECRET_HEADER: "bench"}) as response:
+                    assert response.status == 200, response.status
+
+        def emit(update_id):
+            task = asyncio.create_task(post(update_id))
+            requests.add(task)
+            task.add_done_callback(requests.discard)
+
+        started = time.monotonic()
+        await generate(emit)
+        await done.wait()
+        elapsed = time.monotonic() - started
+    await server.stop()
+    return elapsed, latencies
+
+
+async def main():
+    session = AiohttpSession(api=TelegramAPIServer.from_base(f"http://127.0.0.1:{API_PORT}"))
+    bench_bot = Bot(token="1:bench", session=session)
+    print(f"{TOTAL} обновлений, генератор {RATE}/с, обработчик 5 мс")
+    for name, bench in (("polling", bench_polling), ("webhook", bench_webhook)):
+        elapsed, latencies = await bench(bench_bot)
+        print(f"{name:8} {TOTAL / elapsed:7.0f} обн/с   p50 {percentile(latencies, 0.5) * 1000:6.1f} мс   "
+              f"p95 {percentile(latencies, 0.95) * 1000:6.1f} мс")
+    await session.close()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,86 @@
+"""
+Синтетическая проверка AlbumCollector: части альбомов приходят вразнобой и с паузами
+дольше прежних 0.4 с; каждому альбому — ровно один вызов обработчика. Ни переполнение,
+ни max_age не делят альбом на два вызова, ошибки обработчика попадают в лог.
+
+    python -m scripts.check_albums
+"""
+import asyncio
+import random
+import time
+from types import SimpleNamespace
+
+from app.utils.albums import AlbumCollector
+
+
+async def simulate():
+    calls = []
+
+    async def handler(album):
+        calls.append((album[0].media_group_id, [message.message_id for message in album]))
+
+    collector = AlbumCollector(quiet=0.6, max_age=5.0, max_size=10, max_groups=4)
+    rnd = random.Random(7)
+
+    # Три альбома идут одновременно; внутри альбома части перемешаны и приходят с паузами до 0.5 с
+    arrivals = []
+    for group in range(3):
+        ids = [group * 100 + index for index in range(rnd.randint(2, 10))]
+        rnd.shuffle(ids)
+        ids.append(ids[0])  # повторная доставка одной из частей
+        moment = rnd.uniform(0, 0.3)
+        for message_id in ids:
+            arrivals.append((moment, SimpleNamespace(media_group_id=f"g{group}", message_id=message_id)))
+            moment += rnd.uniform(0, 0.5)
+    arrivals.sort(key=lambda item: item[0])
+    parts = [part for _, part in arrivals]
+
+    started = time.monotonic()
+    for moment, part in arrivals:
+        await asyncio.sleep(max(0.0, moment - (time.monotonic() - started)))
+        collector.add(part, handler)
+    await asyncio.sleep(1)
+
+    expected = {}
+    for part in parts:
+        expected.setdefault(part.media_group_id, set()).add(part.message_id)
+    for group_id, ids in calls:
+        assert ids == sorted(expected[group_id]), (group_id, ids)
+    assert sorted(group_id for group_id, _ in calls) == sorted(expected), calls
+    assert len(collector) == 0
+    print(f"✅ {len(parts)} частей, {len(calls)} альбомов, по одному вызову обработчика на альбом")
+
+    # Переполнение: альбомов больше max_groups — лишние отклоняются целиком, принятые не делятся
+    calls.clear()
+    for group in range(10):
+        collector.add(SimpleNamespace(media_group_id=f"o{group}", message_id=1), handler)
+    for group in range(10):
+        collector.add(SimpleNamespace(media_group_id=f"o{group}", message_id=2), handler)
+    assert len(collector) == collector.max_groups
+    await asyncio.sleep(1)
+    assert sorted(calls) == [(f"o{group}", [1, 2]) for group in range(collector.max_groups)], calls
+    assert collector.rejected == 10 - collector.max_groups
+    print(f"✅ При переполнении принято {len(calls)} альбомов целиком, отклонено {collector.rejected}")
+
+    # max_age: части идут дольше max_age — альбом уходит одним вызовом, опоздавшие части отбрасываются
+    calls.clear()
+    slow = AlbumCollector(quiet=0.6, max_age=1.0, max_size=10)
+    for message_id in range(5):
+        slow.add(SimpleNamespace(media_group_id="slow", message_id=message_id), handler)
+        await asyncio.sleep(0.4)
+    await asyncio.sleep(1)
+    # Часть 3 приходит на 1.2 с и закрывает альбом, часть 4 опаздывает
+    assert len(calls) == 1 and calls[0][1] == [0, 1, 2, 3], calls
+    print(f"✅ Медленный альбом обработан одним вызовом: части {calls[0][1]}, опоздавшие пропущены")
+
+    # Ошибка обработчика не теряется: её пишет done-callback задачи
+    async def failing(album):
+        raise RuntimeError("сбой обработчика")
+
+    slow.add(SimpleNamespace(media_group_id="broken", message_id=1), failing)
+    await asyncio.sleep(1)
+    assert not slow._tasks
+    print("✅ Ошибка обработчика альбома записана в лог")
+
+if __name__ == "__main__":
+    asyncio.run(simulate())
@@ -0,0 +1,80 @@
+"""
+Стресс-проверка атомарности set_bonus_balance: 1000 одновременных начислений и списаний
+по одному клиенту во временной базе. Итоговый баланс должен совпасть с суммой журнала,
+а при достаточном балансе — и с суммой всех операций. Ни одна операция не должна
+упасть на блокировке базы.
+
+    python -m scripts.check_balance_stress
+"""
+import asyncio
+import random
+from datetime import datetime
+
+from scripts.common import use_temporary_database, prepare_database
+
+OPERATIONS = 1000
+
+
+async def ledger_sum(user_id: str) -> float:
+    from sqlalchemy import select, func
+
+    from app.database.models import async_session, BonusLedger
+
+    async with async_session() as session:
+        return await session.scalar(
+            select(func.coalesce(func.sum(BonusLedger.delta), 0.0)).where(BonusLedger.user_id == user_id)
+        )
+
+
+async def count_rows(model, user_id: str) -> int:
+    from sqlalchemy import select, func
+
+    from app.database.models import async_session
+
+    async with async_session() as session:
+        return await session.scalar(select(func.count(model.id)).where(model.user_id == user_id))
+
+
+async def stress(user_id: str, initial: float, operations: list[tuple[str, int]]) -> float:
+    from app.database.models import BonusLedger, PurchaseHistory
+    from app.database.requests import set_user, set_bonus_balance, get_bonus_balance
+
+    await set_user(user_id, datetime.now(), "stress", f"8{user_id:0>10}", None, initial)
+    results = await asyncio.gather(
+        *(set_bonus_balance(user_id, action, amount, amount * 10, "stress") for action, amount in operations),
+        return_exceptions=True
+    )
+    failed = [result for result in results if result is not True]
+    assert not failed, f"не проведено {len(failed)} операций: {failed[0]!r}"
+
+    balance = await get_bonus_balance(user_id)
+    assert abs(balance - await ledger_sum(user_id)) < 1e-6, (balance, await ledger_sum(user_id))
+    # Открывающая запись журнала плюс по одной на каждую проведённую операцию — ни одна не потеряна
+    assert await count_rows(BonusLedger, user_id) == len(operations) + 1
+    assert await count_rows(PurchaseHistory, user_id) == len(operations)
+    assert balance >= 0
+    return balance
+
+
+async def main() -> None:
+    await prepare_database()
+    rnd = random.Random(8)
+
+    # Баланса хватает на все списания — итог обязан сойтись арифметически
+    operations = [(rnd.choice(("add", "remove")), rnd.randint(1, 100)) for _ in range(OPERATIONS)]
+    balance = await stress("1", 1_000_000, operations)
+    expected = 1_000_000 + sum(amount if action == "add" else -amount for action, amount in operations)
+    assert abs(balance - expected) < 1e-6, (balance, expected)
+    print(f"✅ {OPERATIONS} операций, баланс {balance:.2f} равен сумме журнала "
+          f"и сумме всех операций — потерянных обновлений нет")
+
+    # Баланса не хватает — списания упираются в ноль, журнал хранит фактически списанное
+    operations = [("remove" if rnd.random() < 0.7 else "add", rnd.randint(1, 100)) for _ in range(OPERATIONS)]
+    balance = await stress("2", 100, operations)
+    print(f"✅ {OPERATIONS} операций при нехватке баланса, баланс {balance:.2f} "
+          f"равен сумме журнала и не ушёл в минус")
+
+
+if __name__ == "__main__":
+    use_temporary_database()
+    asyncio.run(main())
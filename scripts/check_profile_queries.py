@@ -0,0 +1,38 @@
+"""
+Проверка числа запросов: отрисовка профиля (get_user_profile) должна обходиться одним SELECT.
+Запросы считаются слушателем before_cursor_execute на движке приложения, база временная.
+
+    python -m scripts.check_profile_queries
+"""
+import asyncio
+import sys
+from datetime import datetime
+
+from scripts.common import use_temporary_database, prepare_database, count_statements
+
+
+async def main() -> bool:
+    from app.database.models import engine
+    from app.database.requests import set_user, get_user_profile
+
+    await prepare_database()
+    await set_user("1001", datetime.now(), "Профиль", "89001234567", datetime(1990, 5, 17), 250)
+
+    ok = True
+    for user_id, expected in (("1001", 250), ("404", None)):
+        with count_statements(engine) as statements:
+            profile = await get_user_profile(user_id)
+
+        balance = profile["bonus_balance"] if profile else None
+        single_select = len(statements) == 1 and statements[0].lstrip().upper().startswith("SELECT")
+        ok = ok and single_select and balance == expected
+        print(f"{'✅' if single_select and balance == expected else '⚠️'} профиль {user_id}: "
+              f"запросов {len(statements)}, баланс {balance}")
+        for statement in statements:
+            print(f"   {' '.join(statement.split())[:150]}")
+    return ok
+
+
+if __name__ == "__main__":
+    use_temporary_database()
+    sys.exit(0 if asyncio.run(main()) else 1)
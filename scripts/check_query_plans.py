@@ -0,0 +1,147 @@
+"""
+Проверка планов частых запросов: применяет миграции и падает, если EXPLAIN QUERY PLAN
+хоть одного запроса не использует ожидаемые для него индексы или показывает полный просмотр
+таблицы. По умолчанию проверяется база из DATABASE_URL, с --temporary — новая временная.
+
+    python -m scripts.check_query_plans [--temporary]
+"""
+import asyncio
+import re
+import sys
+from datetime import datetime, timedelta
+
+from scripts.common import use_temporary_database, prepare_database
+
+FULL_SCAN = re.compile(r"^SCAN (TABLE )?(\w+)$")
+USED_INDEX = re.compile(r"USING (?:COVERING )?INDEX (\w+)")
+
+
+def hot_queries() -> dict:
+    """
+    Запрос и индексы, которые обязан использовать его план. Запросы строятся после выбора базы:
+    импорт app.* читает DATABASE_URL.
+    """
+    from sqlalchemy import select, desc
+
+    from app.database.models import (
+        User, PurchaseHistory, Review, Appointment, CellStorage, BonusLedger, NotificationOutbox, BroadcastRecipient,
+    )
+    from app.database.admin_requests import mailing_audience_query
+
+    now = datetime.now()
+    return {
+        "get_last_10_transactions": (
+            select(PurchaseHistory)
+            .where(PurchaseHistory.user_id == "1").order_by(desc(PurchaseHistory.transaction_date)).limit(10),
+            {"ix_purchase_history_user_id_transaction_date"}
+        ),
+        "транзакция по ключу идемпотентности": (
+            select(PurchaseHistory.id)
+            .where(PurchaseHistory.idempotency_key == "key"),
+            {"ix_purchase_history_idempotency_key"}
+        ),
+        "статистика за период": (
+            select(PurchaseHistory.amount)
+            .where(PurchaseHistory.transaction_date >= now - timedelta(days=30)),
+            {"ix_purchase_history_transaction_date"}
+        ),
+        "get_worker_reviews": (
+            select(Review)
+            .where(Review.worker_id == "1", Review.review_date >= now - timedelta(days=30)),
+            {"ix_reviews_worker_id_review_date"}
+        ),
+        "записи на день": (
+            select(Appointment)
+            .where(Appointment.date_time.between(now, now + timedelta(days=1))).order_by(Appointment.date_time),
+            {"ix_appointments_date_time"}
+        ),
+        "ячейка хранения": (
+            select(CellStorage).where(CellStorage.cell_id == 1),
+            {"ix_cell_storages_cell_id"}
+        ),
+        "хранение клиента": (
+            select(CellStorage).where(CellStorage.user_id == 1),
+            {"ix_cell_storages_user_id"}
+        ),
+        "поиск по суффиксу телефона": (
+            select(User).where(User.phone_suffix == "1234"),
+            {"ix_users_phone_suffix"}
+        ),
+        "леджер клиента": (
+            select(BonusLedger).where(BonusLedger.user_id == "1").order_by(desc(BonusLedger.id)).limit(1),
+            {"ix_bonus_ledger_user_id_id"}
+        ),
+        "очередь уведомлений": (
+            select(NotificationOutbox)
+            .where(NotificationOutbox.status == "pending", NotificationOutbox.next_attempt_at <= now)
+            .order_by(NotificationOutbox.next_attempt_at).limit(50),
+            {"ix_notification_outbox_status_next_attempt_at"}
+        ),
+        "пачка получателей рассылки": (
+            select(BroadcastRecipient.id, BroadcastRecipient.chat_id)
+            .where(BroadcastRecipient.job_id == 1, BroadcastRecipient.status == "pending", BroadcastRecipient.id > 0)
+            .order_by(BroadcastRecipient.id).limit(50),
+            {"ix_broadcast_recipients_job_status_id"}
+        ),
+        "аудитория рассылки": (
+            mailing_audience_query({"audience": "mailing"}),
+            {"ix_users_role_registration_reachable"}
+        ),
+        "сегмент по балансу": (
+            mailing_audience_query({"segment": "balance", "value": 1000}),
+            {"ix_users_role_registration_reachable", "ix_user_bonus_balance_balance_user_id"}
+        ),
+        "сегмент по покупкам": (
+            mailing_audience_query({"segment": "purchase_days", "value": 30}),
+            {"ix_users_role_registration_reachable", "ix_purchase_history_transaction_date"}
+        ),
+        "сегмент VIP": (
+            mailing_audience_query({"segment": "vip"}),
+            {"ix_users_role_registration_reachable"}
+        ),
+        "сегмент когорты": (
+            mailing_audience_query({"segment": "cohort", "value": now.strftime("%Y-%m")}),
+            {"ix_users_role_registration_reachable"}
+        ),
+        "сегмент дня рождения": (
+            mailing_audience_query({"segment": "birthday_month", "value": now.month}),
+            {"ix_users_birthday_month"}
+        ),
+    }
+
+# Сегмент VIP по определению читает весь список VIP-клиентов — это небольшая таблица,
+# а сама выборка пользователей идёт по индексу
+EXPECTED_SCANS = {"сегмент VIP": {"vip_clients"}}
+
+
+async def check_query_plans() -> bool:
+    from app.database.models import engine
+
+    await prepare_database()
+
+    ok = True
+    async with engine.connect() as conn:
+        for name, (stmt, indexes) in hot_queries().items():
+            compiled = stmt.compile(dialect=conn.dialect, compile_kwargs={"render_postcompile": True})
+            params = tuple(
+                str(value) if isinstance(value, datetime) else value
+                for value in (compiled.params[key] for key in compiled.positiontup)
+            )
+            result = await conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}", params)
+            plan = [row[3] for row in result.fetchall()]
+            scans = [
+                detail for detail in plan
+                if (match := FULL_SCAN.match(detail)) and match.group(2) not in EXPECTED_SCANS.get(name, ())
+            ]
+            missing = indexes - {match.group(1) for detail in plan if (match := USED_INDEX.search(detail))}
+            ok = ok and not scans and not missing
+            print(f"{'⚠️' if scans or missing else '✅'} {name}: {'; '.join(plan)}")
+            if missing:
+                print(f"   не использованы индексы: {', '.join(sorted(missing))}")
+    return ok
+
+
+if __name__ == "__main__":
+    if "--temporary" in sys.argv:
+        use_temporary_database()
+    sys.exit(0 if asyncio.run(check_query_plans()) else 1)
\ No newline at end of file
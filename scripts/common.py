@@ -0,0 +1,52 @@
+import atexit
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+
+
+def use_temporary_database(profile: str | None = None) -> str:
+    """
+    Направляет приложение во временную базу SQLite, которая удаляется при выходе.
+    Вызывать до импорта app.*: адрес базы и профиль PRAGMA читаются из окружения один раз,
+    при импорте config. Возвращает каталог базы.
+    """
+    directory = tempfile.mkdtemp(prefix="shinomart-")
+    atexit.register(shutil.rmtree, directory, ignore_errors=True)
+    os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{directory}/db.sqlite3"
+    if profile:
+        os.environ["SQLITE_PROFILE"] = profile
+    return directory
+
+
+async def prepare_database() -> None:
+    """Схема и все миграции — так же, как при запуске бота."""
+    from app.database.models import async_main
+    from app.database.migrations import run_migrations
+
+    fresh_schema = await async_main()
+    await run_migrations(fresh_schema)
+
+
+def percentile(values, fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+@contextmanager
+def count_statements(engine):
+    """Собирает SQL всех запросов к движку внутри блока — слушатель before_cursor_execute."""
+    from sqlalchemy import event
+
+    statements: list[str] = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", before_cursor_execute)